@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Open-loop load generator for north.
+
+Drives /ingest with phone telemetry shaped like south-ui (device, network,
+battery, locale, badge scans, sensor reads), the _emit-backed demo
+endpoints (/shopfloor/defect, /ot/anomaly) and /telemetry polls at a fixed
+arrival rate, independent of how fast north answers. Latency is measured
+from each request's *scheduled* send time, so a stalled server shows up as
+latency instead of silently lowering the offered load.
+
+Usage:
+  python bench/loadgen.py --url http://localhost:8080 --rate 200 --duration 30
+  python bench/loadgen.py --mix ingest=90,telemetry=10 --out run.json
+
+Prints a JSON report (throughput, p50/p95/p99 latency, error rates per
+endpoint) so runs can be diffed across commits.
+"""
+
+import sys, json, time, uuid, random, argparse, threading, subprocess
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+try:
+    import requests
+except ImportError:
+    print("pip install requests --break-system-packages")
+    sys.exit(1)
+
+DEFAULT_MIX = "ingest=85,defect=4,anomaly=3,telemetry=8"
+
+ROOMS = ["Lobby", "Server Room North", "MDF", "Loading Dock", "Wellness", "Lab 2"]
+DEVICE_CLASSES = ["phone", "phone", "phone", "tablet", "desktop"]
+OS_FAMILIES = ["iOS", "iOS", "Android", "Android", "macOS", "Windows"]
+BROWSERS = ["Safari", "Chrome", "Chrome", "Firefox", "Edge"]
+NETWORKS = ["4g", "4g", "4g", "3g", "wifi"]
+LANGS = ["en-US,en", "en-GB,en", "de-DE,de,en", "fr-FR,fr", "es-ES,es"]
+
+
+# ═══ PAYLOADS ═══
+
+def cloudevent(evt_type, cls, source, data):
+    return {
+        "specversion": "1.0",
+        "type": "ohc.demo." + evt_type,
+        "source": "south/" + source,
+        "id": str(uuid.uuid4()),
+        "time": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+        "eventclass": cls,
+        "data": {**data, "room": random.choice(ROOMS)},
+    }
+
+
+def phone_event():
+    """One event drawn from the mix a phone produces during a game session."""
+    roll = random.random()
+    if roll < 0.12:
+        return cloudevent("telemetry.device", "telem", "device-profile", {
+            "metric": "device", "deviceClass": random.choice(DEVICE_CLASSES),
+            "os": random.choice(OS_FAMILIES), "browser": random.choice(BROWSERS),
+            "tier": random.choice(["high", "mid", "low"]), "cores": random.choice([4, 6, 8]),
+            "memoryGB": random.choice([3, 4, 6, 8]), "timezone": "America/New_York",
+            "languages": random.choice(LANGS)})
+    if roll < 0.22:
+        return cloudevent("telemetry.network", "telem", "device-profile", {
+            "metric": "network", "effectiveType": random.choice(NETWORKS),
+            "downlink": round(random.uniform(0.5, 20), 1), "rtt": random.choice([50, 100, 250])})
+    if roll < 0.32:
+        return cloudevent("telemetry.battery", "telem", "device-profile", {
+            "metric": "battery", "batteryPct": random.randint(5, 100),
+            "charging": random.random() < 0.2})
+    if roll < 0.38:
+        lang = random.choice(LANGS)
+        return cloudevent("telemetry.locale", "telem", "device-profile", {
+            "metric": "locale", "value": lang.split(",")[0], "languages": lang})
+    if roll < 0.75:
+        return cloudevent("access.onguard.badge_scan", "access", "lenel-reader-lobby", {
+            "action": "badge_scan", "result": random.choice(["granted"] * 9 + ["denied"])})
+    if roll < 0.92:
+        return cloudevent("sensor.environmental", "sensor", "env-lobby", {
+            "metric": "temperature", "value": round(random.uniform(19, 27), 1)})
+    return cloudevent("access.onguard.door_state", "status", "lenel-door", {
+        "action": random.choice(["open", "close", "relock"])})
+
+
+# Endpoint name → (method, path, body factory)
+ENDPOINTS = {
+    "ingest":    ("POST", "/ingest", phone_event),
+    "defect":    ("POST", "/shopfloor/defect", lambda: {
+        "defect_type": random.choice(["surface_scratch", "dent", "misalignment"]),
+        "severity": random.choice(["minor", "major"])}),
+    "anomaly":   ("POST", "/ot/anomaly", lambda: {
+        "sensor_reading": random.randint(13000, 15000)}),
+    "telemetry": ("GET", "/telemetry", None),
+}
+
+
+# ═══ STATS ═══
+
+def percentile(sorted_vals, q):
+    if not sorted_vals:
+        return None
+    return sorted_vals[min(len(sorted_vals) - 1, int(q * len(sorted_vals)))]
+
+
+def summarize(samples, elapsed):
+    """samples: list of (latency_s, ok, status)."""
+    lat = sorted(s[0] for s in samples)
+    errors = sum(1 for s in samples if not s[1])
+    statuses = {}
+    for s in samples:
+        statuses[str(s[2])] = statuses.get(str(s[2]), 0) + 1
+    ms = lambda v: None if v is None else round(v * 1000, 2)
+    return {
+        "requests": len(samples),
+        "throughput_rps": round(len(samples) / elapsed, 1) if elapsed else 0,
+        "errors": errors,
+        "error_rate": round(errors / max(1, len(samples)), 4),
+        "p50_ms": ms(percentile(lat, 0.50)),
+        "p95_ms": ms(percentile(lat, 0.95)),
+        "p99_ms": ms(percentile(lat, 0.99)),
+        "max_ms": ms(lat[-1] if lat else None),
+        "status": statuses,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except Exception:
+        return None
+
+
+# ═══ RUN ═══
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            sys.exit(f"Unknown endpoint in mix: {name} (choose from {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def run(url, rate, duration, workers, mix, timeout, poisson):
+    local = threading.local()
+    results = {name: [] for name in mix}
+    results_lock = threading.Lock()
+    names, weights = zip(*mix.items())
+
+    def session():
+        if not hasattr(local, "s"):
+            local.s = requests.Session()
+        return local.s
+
+    def fire(name, scheduled):
+        method, path, body = ENDPOINTS[name]
+        status, ok = None, False
+        try:
+            if method == "POST":
+                r = session().post(url + path, json=body(), timeout=timeout)
+            else:
+                r = session().get(url + path, timeout=timeout)
+            status, ok = r.status_code, r.status_code < 400
+        except requests.RequestException as e:
+            status = type(e).__name__
+        latency = time.perf_counter() - scheduled
+        with results_lock:
+            results[name].append((latency, ok, status))
+
+    pool = ThreadPoolExecutor(max_workers=workers)
+    start = time.perf_counter()
+    next_at = start
+    end = start + duration
+    while next_at < end:
+        now = time.perf_counter()
+        if next_at > now:
+            time.sleep(next_at - now)
+        pool.submit(fire, random.choices(names, weights)[0], next_at)
+        next_at += random.expovariate(rate) if poisson else 1.0 / rate
+    pool.shutdown(wait=True)
+    elapsed = time.perf_counter() - start
+
+    every = [s for v in results.values() for s in v]
+    return {
+        "url": url,
+        "commit": git_commit(),
+        "target_rps": rate,
+        "duration_s": duration,
+        "elapsed_s": round(elapsed, 2),
+        "workers": workers,
+        "mix": mix,
+        "overall": summarize(every, elapsed),
+        "endpoints": {name: summarize(v, elapsed) for name, v in results.items()},
+    }
+
+
+def main():
+    p = argparse.ArgumentParser(description="Open-loop load generator for north")
+    p.add_argument("--url", default="http://localhost:8080", help="north base URL")
+    p.add_argument("--rate", type=float, default=100, help="offered requests/sec")
+    p.add_argument("--duration", type=float, default=30, help="seconds to run")
+    p.add_argument("--workers", type=int, default=64, help="concurrent connections")
+    p.add_argument("--mix", default=DEFAULT_MIX, help=f"endpoint weights (default {DEFAULT_MIX})")
+    p.add_argument("--timeout", type=float, default=10, help="per-request timeout")
+    p.add_argument("--poisson", action="store_true", help="exponential inter-arrival times")
+    p.add_argument("--out", help="also write the JSON report here")
+    a = p.parse_args()
+
+    report = run(a.url.rstrip("/"), a.rate, a.duration, a.workers,
+                 parse_mix(a.mix), a.timeout, a.poisson)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if a.out:
+        with open(a.out, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for north/app.py hot paths, with a regression gate.
+
+Imports north/app.py in-process (state file redirected to a temp dir) and
+times the functions every event goes through: the ingest() request handler
+and the aggregator's _apply_batch() for each telemetry family, _emit(),
+publish() fanning out to 0/10/1000 subscribers, flush_state(), snapshot
+loading (counters-only and full) and _restore() at a few state sizes, and
+the blackjack helpers. Each benchmark is auto-calibrated, run for several rounds, and
+reported as ns per operation. The gate compares the fastest round (least
+sensitive to scheduler noise); the median is kept alongside for context.
+
+Usage:
+  python bench/microbench.py                  # run, compare to bench/baseline.json
+  python bench/microbench.py -k publish       # only benchmarks whose name contains "publish"
+  python bench/microbench.py --save           # record a new baseline
+  python bench/microbench.py --threshold 15   # fail on >15% slowdown
+
+Exits 1 if any benchmark is slower than its baseline by more than the
+threshold (baseline "threshold_pct", default 30%). Baselines are machine
+specific — record one on the box you compare on before gating a change.
+
+Requires: pip install flask
+"""
+
+import os, sys, json, time, queue, tempfile, argparse, statistics, platform
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+NORTH = HERE.parent / "north"
+BASELINE_FILE = HERE / "baseline.json"
+
+os.environ.setdefault("INGEST_QUEUE_MAX", "0")  # unbounded: time the handler, not the 429 path
+os.environ.setdefault("STATE_FILE", str(Path(tempfile.mkdtemp(prefix="ohc-bench-")) / "state.json"))
+sys.path.insert(0, str(NORTH))
+
+try:
+    import app as north
+except ImportError as e:
+    print(f"pip install flask --break-system-packages  ({e})")
+    sys.exit(1)
+
+BENCHMARKS = []
+
+
+def bench(name):
+    """Register fn(setup_result) → callable timed per iteration; fn itself does the setup."""
+    def wrap(fn):
+        BENCHMARKS.append((name, fn))
+        return fn
+    return wrap
+
+
+def reset():
+    # Let the aggregator finish what the ingest benchmarks queued so it
+    # isn't competing for the GIL with whatever is timed next.
+    while north._ingest_q.qsize():
+        time.sleep(0.01)
+    north.reset_all()
+    with north.lock:
+        north.subscribers.clear()
+
+
+# ═══ FIXTURES ═══
+
+def event(evt_type, cls, data):
+    return {"specversion": "1.0", "type": "ohc.demo." + evt_type, "source": "south/bench",
+            "id": "bench-1", "time": "2026-01-01T00:00:00Z", "eventclass": cls, "data": data}
+
+
+FAMILIES = {
+    "device": event("telemetry.device", "telem", {
+        "metric": "device", "deviceClass": "phone", "os": "iOS", "browser": "Safari", "tier": "high",
+        "gpuRenderer": "Apple GPU", "cores": 6, "memoryGB": 4, "timezone": "America/New_York",
+        "languages": "en-US,en"}),
+    "battery": event("telemetry.battery", "telem", {"metric": "battery", "batteryPct": 73, "charging": False}),
+    "network": event("telemetry.network", "telem", {"metric": "network", "effectiveType": "4g", "rtt": 100}),
+    "badge": event("access.onguard.badge_scan", "access", {"action": "badge_scan", "result": "granted"}),
+}
+
+
+def fill_state(log_size, batteries, profiles=50):
+    reset()
+    entry = {"ts": "2026-01-01T00:00:00Z", "payload": FAMILIES["device"], "count": 1}
+    north.event_log.extend(dict(entry, count=i) for i in range(log_size))
+    north.telemetry["batteries"].extend(i % 100 for i in range(batteries))
+    north.telemetry["profiles"].extend({"deviceClass": "phone", "os": "iOS"} for _ in range(profiles))
+    for i in range(40):
+        north.telemetry["event_classes"][f"class-{i}"] = i
+        north.telemetry["networks"][f"net-{i % 5}"] = i
+    north.count = log_size
+    north._battery_total = sum(north.telemetry["batteries"])
+
+
+# ═══ BENCHMARKS ═══
+
+for _family, _evt in FAMILIES.items():
+    @bench(f"ingest[{_family}]")
+    def _ingest(evt=_evt):
+        reset()
+        ctx = north.app.test_request_context("/ingest", method="POST", json=evt)
+        ctx.push()
+        north.request.get_json()  # parse once; ingest() re-reads the cached body
+        return north.ingest
+
+
+for _family, _evt in FAMILIES.items():
+    @bench(f"aggregate[{_family}]")
+    def _aggregate(evt=_evt):
+        reset()
+        batch = [(north._epoch, time.monotonic(), {"ts": "2026-01-01T00:00:00Z", "payload": evt, "count": 1})]
+        return lambda: north._apply_batch(batch)
+
+
+@bench("emit")
+def _emit():
+    reset()
+    return lambda: north._emit("ohc.demo.ot.anomaly_detected", "ohc.demo.ot", "bench", {"asset_id": "XFMR-1"})
+
+
+for _n in (0, 10, 1000):
+    @bench(f"publish[{_n} subscribers]")
+    def _publish(n=_n):
+        reset()
+        north.subscribers.extend(queue.Queue() for _ in range(n))
+        evt = {"ts": "2026-01-01T00:00:00Z", "payload": FAMILIES["badge"], "count": 1}
+        return lambda: north.publish(evt)
+
+
+for _log, _batt in ((0, 0), (200, 1000), (200, 100000)):
+    @bench(f"flush_state[log={_log},batteries={_batt}]")
+    def _flush(log=_log, batt=_batt):
+        fill_state(log, batt)
+        return north.flush_state
+
+    @bench(f"snapshot_counters[log={_log},batteries={_batt}]")
+    def _snap_counters(log=_log, batt=_batt):
+        fill_state(log, batt)
+        north.flush_state()
+
+        def first_section():
+            with open(north.SNAPSHOT_FILE, "rb") as f:
+                return next(north.read_snapshot(f))
+        return first_section
+
+    @bench(f"snapshot_full[log={_log},batteries={_batt}]")
+    def _snap_full(log=_log, batt=_batt):
+        fill_state(log, batt)
+        north.flush_state()
+
+        def all_sections():
+            with open(north.SNAPSHOT_FILE, "rb") as f:
+                return [north._decode_section(n, raw) for n, raw in north.read_snapshot(f)]
+        return all_sections
+
+    @bench(f"restore[log={_log},batteries={_batt}]")
+    def _restore(log=_log, batt=_batt):
+        fill_state(log, batt)
+        snap = json.loads(json.dumps(north._snapshot()))
+        return lambda: north._restore(snap)
+
+
+@bench("publish_view[log=200]")
+def _publish_view():
+    fill_state(200, 1000)
+    return north._publish_view
+
+
+for _path in ("/state", "/telemetry", "/log"):
+    @bench(f"read[{_path}]")
+    def _read(path=_path):
+        fill_state(200, 1000)
+        north._publish_view()
+        client = north.app.test_client()
+        return lambda: client.get(path)
+
+
+@bench("bj_total")
+def _bj_total():
+    hands = [["10H", "6S"], ["AS", "AD", "9C"], ["KH", "QS", "AC"], ["2C", "3D", "4H", "5S", "6C"]]
+    return lambda: [north._bj_total(h) for h in hands]
+
+
+@bench("bj_strategy")
+def _bj_strategy():
+    return lambda: [north._bj_strategy(t, d) for t in range(4, 22) for d in range(2, 12)]
+
+
+# ═══ HARNESS ═══
+
+def calibrate(fn, target=0.02):
+    n = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(n):
+            fn()
+        if time.perf_counter() - t0 >= target or n >= 1 << 20:
+            return n
+        n *= 2
+
+
+def measure(setup, rounds):
+    fn = setup()
+    n = calibrate(fn)
+    samples = []
+    for _ in range(rounds):
+        t0 = time.perf_counter_ns()
+        for _ in range(n):
+            fn()
+        samples.append((time.perf_counter_ns() - t0) / n)
+    return {"median_ns": round(statistics.median(samples), 1), "min_ns": round(min(samples), 1),
+            "stdev_ns": round(statistics.pstdev(samples), 1), "iterations": n, "rounds": rounds}
+
+
+def main():
+    p = argparse.ArgumentParser(description="north hot-path microbenchmarks")
+    p.add_argument("-k", dest="filter", help="only run benchmarks whose name contains this")
+    p.add_argument("--rounds", type=int, default=9)
+    p.add_argument("--baseline", default=str(BASELINE_FILE))
+    p.add_argument("--threshold", type=float, help="max allowed slowdown in percent")
+    p.add_argument("--retries", type=int, default=2, help="re-measure an apparent regression this many times")
+    p.add_argument("--save", action="store_true", help="write results as the new baseline")
+    p.add_argument("--json", action="store_true", help="print results as JSON")
+    a = p.parse_args()
+
+    try:
+        baseline = json.loads(Path(a.baseline).read_text())
+    except FileNotFoundError:
+        baseline = {}
+    threshold = a.threshold if a.threshold is not None else baseline.get("threshold_pct", 30)
+    base_results = baseline.get("results", {})
+
+    results, regressions = {}, []
+    for name, setup in BENCHMARKS:
+        if a.filter and a.filter not in name:
+            continue
+        base = base_results.get(name, {}).get("min_ns")
+        r = measure(setup, a.rounds)
+        # Confirm an apparent regression before reporting it: a noisy
+        # neighbour can slow every round of a single pass.
+        for _ in range(a.retries if base else 0):
+            if (r["min_ns"] - base) / base * 100 <= threshold:
+                break
+            reset()
+            r = min(r, measure(setup, a.rounds), key=lambda x: x["min_ns"])
+        results[name] = r
+        reset()
+        delta = None if not base else (r["min_ns"] - base) / base * 100
+        flag = ""
+        if delta is not None and delta > threshold:
+            regressions.append(name)
+            flag = "  ✗ REGRESSION"
+        if not a.json:
+            vs = f"{delta:+7.1f}%" if delta is not None else "    new"
+            print(f"  {name:<42s} {r['min_ns'] / 1000:>10.2f} µs  (median {r['median_ns'] / 1000:.2f})  {vs}{flag}")
+
+    if a.json:
+        print(json.dumps({"threshold_pct": threshold, "results": results, "regressions": regressions}, indent=2))
+
+    if a.save:
+        merged = dict(base_results, **results)
+        Path(a.baseline).write_text(json.dumps({
+            "threshold_pct": baseline.get("threshold_pct", 30),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "results": merged,
+        }, indent=2, sort_keys=True) + "\n")
+        print(f"\n✓ Baseline written to {a.baseline}", file=sys.stderr)
+    elif regressions:
+        print(f"\n✗ {len(regressions)} benchmark(s) regressed by more than {threshold}%", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Redis write-path benchmark for north/api/app.py.
+
+Imports north/api/app.py in-process against a local Redis and times one
+device-telemetry event (the heaviest /ingest shape) written three ways:
+
+  commands  the pre-script path: INCR, SET ×2, PUBLISH, LPUSH, LTRIM and
+            the telemetry HINCRBY/INCR/RPUSH/LTRIM, one round trip each
+  script    record_events() with one event — one EVALSHA, one round trip
+  batch     record_events() with --batch events — one pipelined round trip,
+            as a POSTed JSON array is written
+
+Reports events/s, µs per event and Redis round trips per event for each,
+as JSON. Run it against a Redis that is not serving anything else: keys go
+to --db (default 15) and every ohc:* key there is deleted before and after.
+Add latency (e.g. tc netem, or a Redis on another host) to see the
+round-trip saving the way a pod sees it.
+
+Usage:
+  python bench/redis_ingest.py                         # Redis on localhost:6379
+  python bench/redis_ingest.py --port 6380 --events 20000 --batch 50 --out redis-ingest.json
+
+Requires: pip install flask redis
+"""
+
+import os, sys, json, time, argparse
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+NORTH_API = HERE.parent / "north" / "api"
+
+DEVICE_EVENT = {
+    "type": "ohc.demo.telemetry.device_identity", "eventclass": "ohc.demo.telemetry", "source": "bench",
+    "data": {"deviceClass": "phone", "tier": "high", "os": "iOS", "browser": "Safari",
+             "gpuRenderer": "Apple GPU", "timezone": "Europe/London", "languages": "en-GB,en",
+             "cores": 6, "memoryGB": 4},
+}
+
+
+def per_command(north, data):
+    """The write path before the ingest script: one round trip per command."""
+    r = north.redis_client
+    count = r.incr(north._count_key())
+    ts = north._now()
+    r.set(north._last_event_time_key(), ts)
+    last = json.dumps({"ts": ts, "payload": data, "count": count})
+    r.set(north._last_key(), last)
+    r.publish(north.REDIS_CHANNEL, last)
+    r.lpush(north._event_log_key(), last)
+    r.ltrim(north._event_log_key(), 0, 199)
+    for op in north._telemetry_ops(data):
+        r.execute_command(op[0], north._telemetry_key(op[1]), *op[2:])
+    return count
+
+
+def run(name, fn, events, per_call):
+    calls = max(1, events // per_call)
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    elapsed = time.perf_counter() - start
+    n = calls * per_call
+    return {"name": name, "events": n,
+            "events_per_s": round(n / elapsed), "us_per_event": round(elapsed / n * 1e6, 2)}
+
+
+def main():
+    p = argparse.ArgumentParser(description="north/api Redis ingest write-path benchmark")
+    p.add_argument("--host", default=os.environ.get("REDIS_HOST", "localhost"))
+    p.add_argument("--port", type=int, default=int(os.environ.get("REDIS_PORT", "6379")))
+    p.add_argument("--db", type=int, default=15, help="Redis DB to use; its ohc:* keys are deleted")
+    p.add_argument("--events", type=int, default=5000)
+    p.add_argument("--batch", type=int, default=50, help="events per record_events() call in the batch run")
+    p.add_argument("--out", help="also write the JSON report here")
+    a = p.parse_args()
+
+    os.environ.update(REDIS_HOST=a.host, REDIS_PORT=str(a.port), REDIS_DB=str(a.db), DEDUPE_WINDOW="0")
+    sys.path.insert(0, str(NORTH_API))
+    try:
+        import app as north
+    except ImportError as e:
+        print(f"pip install flask redis --break-system-packages  ({e})")
+        sys.exit(1)
+    if not north.init_redis():
+        print(f"No Redis at {a.host}:{a.port}", file=sys.stderr)
+        sys.exit(1)
+
+    def clean():
+        keys = list(north.redis_client.scan_iter("ohc:*", count=1000))
+        for i in range(0, len(keys), 500):
+            north.redis_client.delete(*keys[i:i + 500])
+
+    ops = north._telemetry_ops(DEVICE_EVENT)
+    one = [(DEVICE_EVENT, ops, None)]
+    many = one * a.batch
+    round_trips = {"commands": 6 + len(ops), "script": 1, "batch": 1 / a.batch}
+
+    clean()
+    north.record_events(north._now(), one)  # load the script
+    results = []
+    for name, fn, per_call in [
+        ("commands", lambda: per_command(north, DEVICE_EVENT), 1),
+        ("script", lambda: north.record_events(north._now(), one), 1),
+        ("batch", lambda: north.record_events(north._now(), many), a.batch),
+    ]:
+        clean()
+        r = run(name, fn, a.events, per_call)
+        r["round_trips_per_event"] = round(round_trips[name], 3)
+        results.append(r)
+        print(f"  {name:<10s} {r['events_per_s']:>9,d} events/s  {r['us_per_event']:>9.2f} µs/event"
+              f"  {r['round_trips_per_event']:g} RTT/event", file=sys.stderr)
+    clean()
+
+    base = results[0]["us_per_event"]
+    report = {"redis": f"{a.host}:{a.port}/{a.db}", "event": DEVICE_EVENT["type"], "batch": a.batch,
+              "results": results,
+              "speedup": {r["name"]: round(base / r["us_per_event"], 2) for r in results[1:]}}
+    print(json.dumps(report, indent=2))
+    if a.out:
+        Path(a.out).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
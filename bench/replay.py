@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Time-scaled replay of recorded north traffic into /ingest.
+
+Reads any of:
+  - a state.json snapshot (its "event_log")
+  - a /log dump              (curl -s $NORTH/log > log.json)
+  - an NDJSON capture        (curl -sN $NORTH/events | sed -un 's/^data: //p' > booth.ndjson)
+    or a file of raw CloudEvents, one per line, timed by their "time" field
+
+and re-sends every payload at its original inter-arrival times divided by
+--speed (1, 10, 100...), through a pool of keep-alive connections. Bursts —
+a talk ends and the room scans the QR code — come out with the same shape.
+
+north only keeps the last 200 events in state.json and /log, so record an
+NDJSON capture for anything longer than a few minutes of booth traffic.
+
+Usage:
+  python bench/replay.py booth.ndjson --url http://localhost:8080 --speed 10
+  python bench/replay.py state.json --speed 100 --workers 32 --max-gap 5
+
+CloudEvent ids are re-stamped per replay so deduplication on ingest does not
+swallow them; pass --keep-ids to replay retries exactly as recorded.
+"""
+
+import sys, json, time, uuid, argparse, threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+try:
+    import requests
+except ImportError:
+    print("pip install requests --break-system-packages")
+    sys.exit(1)
+
+
+# ═══ LOADING ═══
+
+def parse_ts(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def normalize(entry):
+    """(timestamp, payload) from a logged {"ts","payload","count"} entry or a raw CloudEvent."""
+    if not isinstance(entry, dict):
+        return None
+    if "payload" in entry and "ts" in entry:
+        ts, payload = parse_ts(entry["ts"]), entry["payload"]
+    else:
+        ts, payload = parse_ts(entry.get("time")), entry
+    if ts is None or not isinstance(payload, dict):
+        return None
+    return ts, payload
+
+
+def load_events(path):
+    f = sys.stdin if path == "-" else open(path)
+    with f:
+        text = f.read()
+    entries = None
+    stripped = text.lstrip()
+    if stripped.startswith("{") or stripped.startswith("["):
+        try:
+            doc = json.loads(text)
+            entries = doc.get("event_log", [doc]) if isinstance(doc, dict) else doc
+        except ValueError:
+            pass  # more than one document — fall through to NDJSON
+    if entries is None:
+        entries = []
+        for n, line in enumerate(text.splitlines(), 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                print(f"  skipping line {n}: not JSON", file=sys.stderr)
+    events = [e for e in map(normalize, entries) if e]
+    events.sort(key=lambda e: e[0])
+    return events
+
+
+def schedule(events, speed, max_gap):
+    """Offsets (seconds from replay start) for each event, gaps scaled and clamped."""
+    offsets, t, prev = [], 0.0, None
+    for ts, _ in events:
+        if prev is not None:
+            gap = (ts - prev) / speed
+            t += min(gap, max_gap) if max_gap else gap
+        offsets.append(t)
+        prev = ts
+    return offsets
+
+
+def peak_rate(times):
+    """Busiest 1-second window, in events/sec."""
+    best, lo = 0, 0
+    for hi in range(len(times)):
+        while times[hi] - times[lo] >= 1.0:
+            lo += 1
+        best = max(best, hi - lo + 1)
+    return best
+
+
+# ═══ REPLAY ═══
+
+def replay(url, events, offsets, workers, timeout, keep_ids):
+    local = threading.local()
+    results = []
+    results_lock = threading.Lock()
+    run_id = uuid.uuid4().hex[:8]
+
+    def send(i, scheduled):
+        payload = events[i][1]
+        if not keep_ids and "id" in payload:
+            payload = {**payload, "id": f"{payload['id']}-replay-{run_id}"}
+        if not hasattr(local, "s"):
+            local.s = requests.Session()
+        sent = time.perf_counter()
+        try:
+            r = local.s.post(url + "/ingest", json=payload, timeout=timeout)
+            ok, status = r.status_code < 400, r.status_code
+        except requests.RequestException as e:
+            ok, status = False, type(e).__name__
+        done = time.perf_counter()
+        with results_lock:
+            results.append((sent - scheduled, done - sent, ok, status, sent))
+
+    pool = ThreadPoolExecutor(max_workers=workers)
+    start = time.perf_counter()
+    for i, off in enumerate(offsets):
+        at = start + off
+        delay = at - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        pool.submit(send, i, at)
+    pool.shutdown(wait=True)
+    return results, time.perf_counter() - start
+
+
+def pct(vals, q):
+    return round(vals[min(len(vals) - 1, int(q * len(vals)))] * 1000, 2) if vals else None
+
+
+def main():
+    p = argparse.ArgumentParser(description="Time-scaled replay of recorded north traffic")
+    p.add_argument("capture", help="state.json, /log dump or NDJSON capture ('-' for stdin)")
+    p.add_argument("--url", default="http://localhost:8080", help="north base URL")
+    p.add_argument("--speed", type=float, default=1.0, help="time compression factor (1, 10, 100...)")
+    p.add_argument("--workers", type=int, default=16, help="concurrent connections")
+    p.add_argument("--max-gap", type=float, default=0, help="clamp idle gaps to this many seconds after scaling (0 = off)")
+    p.add_argument("--timeout", type=float, default=10, help="per-request timeout")
+    p.add_argument("--keep-ids", action="store_true", help="replay CloudEvent ids unchanged")
+    p.add_argument("--dry-run", action="store_true", help="print the traffic shape and exit")
+    p.add_argument("--out", help="also write the JSON report here")
+    a = p.parse_args()
+
+    events = load_events(a.capture)
+    if not events:
+        sys.exit("No replayable events found.")
+    offsets = schedule(events, a.speed, a.max_gap)
+    original_span = events[-1][0] - events[0][0]
+    report = {
+        "capture": a.capture,
+        "events": len(events),
+        "speed": a.speed,
+        "original_span_s": round(original_span, 2),
+        "original_peak_eps": peak_rate([e[0] for e in events]),
+        "planned_span_s": round(offsets[-1], 2),
+        "planned_peak_eps": peak_rate(offsets),
+    }
+    if not a.dry_run:
+        print(f"Replaying {len(events)} events over {offsets[-1]:.1f}s at {a.speed}×", file=sys.stderr)
+        results, elapsed = replay(a.url.rstrip("/"), events, offsets, a.workers, a.timeout, a.keep_ids)
+        lag = sorted(r[0] for r in results)
+        lat = sorted(r[1] for r in results)
+        errors = sum(1 for r in results if not r[2])
+        statuses = {}
+        for r in results:
+            statuses[str(r[3])] = statuses.get(str(r[3]), 0) + 1
+        report.update({
+            "url": a.url,
+            "elapsed_s": round(elapsed, 2),
+            "achieved_peak_eps": peak_rate(sorted(r[4] for r in results)),
+            "errors": errors,
+            "error_rate": round(errors / max(1, len(results)), 4),
+            "status": statuses,
+            "latency_ms": {"p50": pct(lat, 0.50), "p95": pct(lat, 0.95), "p99": pct(lat, 0.99), "max": pct(lat, 1.0)},
+            "send_lag_ms": {"p50": pct(lag, 0.50), "p99": pct(lag, 0.99), "max": pct(lag, 1.0)},
+        })
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if a.out:
+        with open(a.out, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
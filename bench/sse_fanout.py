@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+SSE fan-out benchmark for north.
+
+Opens N concurrent /events connections (asyncio, one socket each), injects
+events into /ingest at a fixed rate and measures, per client:
+
+  - delivery latency   publish timestamp (stamped by the injector) → receive
+  - dropped frames     injected sequence numbers a client never saw
+  - heartbeat accuracy gap between the last frame and the first ": keepalive"
+                       once injection stops, versus the server's 15s interval
+
+With --pid (repeatable, e.g. once per gunicorn worker) it also samples the
+server's RSS and CPU from /proc while the run is in progress, so it must run
+on the same host as north for those numbers. Latency compares the injector's
+clock with the receiver's; both live in this process, so no clock sync is
+needed.
+
+Usage:
+  python bench/sse_fanout.py --url http://localhost:8080 --clients 100,1000,5000
+  python bench/sse_fanout.py --clients 1000 --rate 5 --duration 20 --pid $(pgrep -f app.py)
+
+Works against north/app.py and north/api/app.py. Requests are sent as
+HTTP/1.0 so both Werkzeug and gunicorn stream without chunked encoding.
+Each injected event is counted by north like any other event.
+"""
+
+import sys, json, time, uuid, asyncio, argparse, threading, resource, ssl, os
+from urllib.parse import urlsplit
+
+try:
+    import requests
+except ImportError:
+    print("pip install requests --break-system-packages")
+    sys.exit(1)
+
+CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+class Client:
+    __slots__ = ("lat", "seqs", "connected_at", "last_data", "heartbeat_gap", "error")
+
+    def __init__(self):
+        self.lat = []
+        self.seqs = set()
+        self.connected_at = None
+        self.last_data = None
+        self.heartbeat_gap = None
+        self.error = None
+
+
+# ═══ SERVER SAMPLING ═══
+
+def read_proc(pid):
+    """(rss_bytes, cpu_seconds) for a pid, or None if it's gone."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/statm") as f:
+            rss_pages = int(f.read().split()[1])
+        return rss_pages * os.sysconf("SC_PAGE_SIZE"), (int(fields[11]) + int(fields[12])) / CLK_TCK
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+class ProcSampler(threading.Thread):
+    def __init__(self, pids, interval=1.0):
+        super().__init__(daemon=True)
+        self.pids, self.interval = pids, interval
+        self.samples = []  # (wall, total_rss, total_cpu_s)
+        self.stop = threading.Event()
+
+    def run(self):
+        while not self.stop.is_set():
+            readings = [r for r in (read_proc(p) for p in self.pids) if r]
+            if readings:
+                self.samples.append((time.time(), sum(r[0] for r in readings),
+                                     sum(r[1] for r in readings)))
+            self.stop.wait(self.interval)
+
+    def summary(self):
+        if len(self.samples) < 2:
+            return None
+        (t0, _, c0), (t1, _, c1) = self.samples[0], self.samples[-1]
+        return {
+            "pids": self.pids,
+            "rss_start_mb": round(self.samples[0][1] / 2**20, 1),
+            "rss_peak_mb": round(max(s[1] for s in self.samples) / 2**20, 1),
+            "cpu_pct_mean": round(100 * (c1 - c0) / max(1e-9, t1 - t0), 1),
+        }
+
+
+# ═══ CLIENTS ═══
+
+async def sse_client(target, c, run_id):
+    host, port, use_tls, path = target
+    writer = None
+    try:
+        reader, writer = await asyncio.open_connection(
+            host, port, ssl=ssl.create_default_context() if use_tls else None, limit=2**20)
+        writer.write(f"GET {path} HTTP/1.0\r\nHost: {host}\r\n"
+                     f"Accept: text/event-stream\r\n\r\n".encode())
+        await writer.drain()
+        status = await reader.readline()
+        if b" 200" not in status:
+            c.error = status.decode(errors="replace").strip() or "no response"
+            return
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        c.connected_at = time.time()
+        while True:
+            line = await reader.readline()
+            if not line:
+                c.error = c.error or "closed"
+                return
+            now = time.time()
+            if line.startswith(b"data:"):
+                c.last_data = now
+                try:
+                    d = json.loads(line[5:]).get("payload", {}).get("data", {})
+                except ValueError:
+                    continue
+                if isinstance(d, dict) and d.get("bench_run") == run_id:
+                    c.lat.append(now - d["bench_ts"])
+                    c.seqs.add(d["bench_seq"])
+            elif line.startswith(b":") and c.heartbeat_gap is None and c.last_data:
+                c.heartbeat_gap = now - c.last_data
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        c.error = type(e).__name__
+    finally:
+        if writer:
+            writer.close()
+
+
+def inject(url, run_id, rate, duration, injected):
+    s = requests.Session()
+    interval = 1.0 / rate
+    next_at = time.perf_counter()
+    end = next_at + duration
+    seq = 0
+    while next_at < end:
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        seq += 1
+        evt = {"specversion": "1.0", "type": "ohc.demo.bench.fanout", "source": "bench/sse-fanout",
+               "id": f"{run_id}-{seq}", "eventclass": "bench",
+               "data": {"bench_run": run_id, "bench_seq": seq, "bench_ts": time.time()}}
+        try:
+            s.post(url + "/ingest", json=evt, timeout=10)
+            injected.append(seq)
+        except requests.RequestException as e:
+            print(f"  ✗ inject {seq}: {e}", file=sys.stderr)
+        next_at += interval
+
+
+def pct(vals, q):
+    return round(vals[min(len(vals) - 1, int(q * len(vals)))] * 1000, 2) if vals else None
+
+
+async def run_level(url, n, rate, duration, ramp, settle, hb_window, hb_expected, pids):
+    u = urlsplit(url)
+    use_tls = u.scheme == "https"
+    target = (u.hostname, u.port or (443 if use_tls else 80), use_tls, (u.path.rstrip("/") or "") + "/events")
+    run_id = uuid.uuid4().hex[:10]
+    clients = [Client() for _ in range(n)]
+    sampler = ProcSampler(pids) if pids else None
+    if sampler:
+        sampler.start()
+
+    tasks = []
+    for i, c in enumerate(clients):
+        tasks.append(asyncio.create_task(sse_client(target, c, run_id)))
+        if ramp and (i + 1) % ramp == 0:
+            await asyncio.sleep(1)
+    deadline = time.time() + 30
+    while time.time() < deadline and any(c.connected_at is None and c.error is None for c in clients):
+        await asyncio.sleep(0.2)
+    connected = [c for c in clients if c.connected_at is not None]
+    print(f"  {len(connected)}/{n} clients connected", file=sys.stderr)
+
+    injected = []
+    await asyncio.to_thread(inject, url, run_id, rate, duration, injected)
+    await asyncio.sleep(settle)
+    if hb_window:
+        print(f"  quiet for {hb_window}s to observe heartbeats", file=sys.stderr)
+        await asyncio.sleep(hb_window)
+
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if sampler:
+        sampler.stop.set()
+
+    all_lat = sorted(l for c in connected for l in c.lat)
+    per_client_p99 = sorted(pct(sorted(c.lat), 0.99) for c in connected if c.lat)
+    expected = len(injected) * len(connected)
+    delivered = sum(len(c.seqs) for c in connected)
+    gaps = sorted(c.heartbeat_gap for c in connected if c.heartbeat_gap is not None)
+    errors = {}
+    for c in clients:
+        if c.error:
+            errors[c.error] = errors.get(c.error, 0) + 1
+
+    return {
+        "clients": n,
+        "connected": len(connected),
+        "errors": errors,
+        "rate_eps": rate,
+        "injected": len(injected),
+        "delivered": delivered,
+        "dropped": expected - delivered,
+        "drop_rate": round((expected - delivered) / max(1, expected), 4),
+        "latency_ms": {"p50": pct(all_lat, 0.50), "p95": pct(all_lat, 0.95),
+                       "p99": pct(all_lat, 0.99), "max": pct(all_lat, 1.0)},
+        "client_p99_ms": {"median": per_client_p99[len(per_client_p99) // 2] if per_client_p99 else None,
+                          "worst": per_client_p99[-1] if per_client_p99 else None},
+        "heartbeat": {
+            "expected_s": hb_expected,
+            "observed": len(gaps),
+            "error_ms_p50": pct(sorted(abs(g - hb_expected) for g in gaps), 0.50),
+            "error_ms_max": pct(sorted(abs(g - hb_expected) for g in gaps), 1.0),
+        } if hb_window else None,
+        "server": sampler.summary() if sampler else None,
+    }
+
+
+def raise_fd_limit(n):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    want = min(hard, max(soft, n + 256))
+    if want > soft:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (want, hard))
+    if want < n + 256:
+        print(f"⚠ fd limit {want} is below {n} clients — raise ulimit -n", file=sys.stderr)
+
+
+def main():
+    p = argparse.ArgumentParser(description="SSE fan-out benchmark for north")
+    p.add_argument("--url", default="http://localhost:8080", help="north base URL")
+    p.add_argument("--clients", default="100,1000,5000", help="comma-separated client counts to sweep")
+    p.add_argument("--rate", type=float, default=5, help="injected events/sec")
+    p.add_argument("--duration", type=float, default=20, help="seconds of injection per level")
+    p.add_argument("--ramp", type=int, default=500, help="new connections per second (0 = all at once)")
+    p.add_argument("--settle", type=float, default=3, help="seconds to wait for stragglers")
+    p.add_argument("--heartbeat-window", type=float, default=20, help="quiet seconds to observe keepalives (0 = skip)")
+    p.add_argument("--heartbeat", type=float, default=15, help="server keepalive interval")
+    p.add_argument("--pid", type=int, action="append", default=[], help="server pid to sample (repeatable)")
+    p.add_argument("--out", help="also write the JSON report here")
+    a = p.parse_args()
+
+    levels = [int(x) for x in a.clients.split(",") if x.strip()]
+    raise_fd_limit(max(levels))
+    url = a.url.rstrip("/")
+    report = {"url": url, "levels": []}
+    for n in levels:
+        print(f"── {n} clients ──", file=sys.stderr)
+        report["levels"].append(asyncio.run(run_level(
+            url, n, a.rate, a.duration, a.ramp, a.settle, a.heartbeat_window, a.heartbeat, a.pid)))
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if a.out:
+        with open(a.out, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -19,6 +19,15 @@ Setup:
      - Repeat for each milestone
   7. Copy each trigger's webhook URL into the .env below
 
+Modes (ANNOUNCE_MODE):
+  sse   (default) — subscribe to /events and check milestones on every event
+        as it arrives. Reconnects with exponential backoff and resumes with
+        Last-Event-ID, so a dropped connection doesn't skip a crossing.
+  poll  — poll /state every ANNOUNCE_POLL seconds (original behaviour).
+
+Webhooks fire from a background worker with retries, so a slow trigger
+endpoint never delays detection. Each milestone fires at most once per run.
+
 Requires: pip install requests
 """
 
@@ -26,6 +35,9 @@ import os
 import sys
 import time
 import json
+import queue
+import random
+import threading
 from pathlib import Path
 
 try:
@@ -47,7 +59,11 @@ def load_env():
 load_env()
 
 STATE_URL = os.environ.get("STATE_URL", "https://north-qr-demo-qa.apps.cluster-nlthm.nlthm.sandbox3528.opentlc.com/state")
+EVENTS_URL = os.environ.get("EVENTS_URL", STATE_URL.rsplit("/state", 1)[0] + "/events")
 POLL_INTERVAL = int(os.environ.get("ANNOUNCE_POLL", "5"))
+MODE = os.environ.get("ANNOUNCE_MODE", "sse")
+BACKOFF_MAX = float(os.environ.get("ANNOUNCE_BACKOFF_MAX", "60"))
+WEBHOOK_RETRIES = int(os.environ.get("ANNOUNCE_WEBHOOK_RETRIES", "3"))
 
 # Milestone triggers — map count thresholds to webhook URLs
 # Get these URLs from https://trigger.esp8266-server.de/ after setting up the skill
@@ -79,48 +95,139 @@ def get_count():
 
 
 def fire_trigger(count, url):
-    try:
-        resp = requests.get(url, timeout=10)
-        if resp.status_code == 200:
-            print(f"  🔔 FIRED milestone {count}! Alexa should announce now.")
-        else:
-            print(f"  ✗ Milestone {count} trigger returned HTTP {resp.status_code}")
-    except Exception as e:
-        print(f"  ✗ Milestone {count} trigger failed: {e}")
-
-
-def main():
-    print("Alexa Webhook Announcer")
-    print(f"  State URL: {STATE_URL}")
-    print(f"  Poll:      every {POLL_INTERVAL}s")
-    print(f"  Milestones: {sorted(MILESTONES.keys())}")
-    print(f"  Ctrl+C to stop\n")
-
-    fired = set()
+    """Call a milestone webhook, retrying with backoff. Returns True once it succeeds."""
+    for attempt in range(1, WEBHOOK_RETRIES + 1):
+        try:
+            resp = requests.get(url, timeout=10)
+            if resp.status_code == 200:
+                print(f"  🔔 FIRED milestone {count}! Alexa should announce now.")
+                return True
+            print(f"  ✗ Milestone {count} trigger returned HTTP {resp.status_code} (attempt {attempt})")
+        except Exception as e:
+            print(f"  ✗ Milestone {count} trigger failed: {e} (attempt {attempt})")
+        if attempt < WEBHOOK_RETRIES:
+            time.sleep(2 ** attempt)
+    return False
+
+
+class Milestones:
+    """Detects threshold crossings and hands them to a webhook worker thread.
+
+    A threshold is marked as claimed the moment it's crossed, so the same
+    crossing seen twice (replay after reconnect, /state seed) fires once.
+    If every retry fails it's released again and the next event retries.
+    """
+
+    def __init__(self, urls):
+        self.urls = urls
+        self.claimed = set()
+        self.lock = threading.Lock()
+        self.q = queue.Queue()
+        threading.Thread(target=self._worker, daemon=True).start()
+
+    def check(self, count):
+        with self.lock:
+            due = [t for t in sorted(self.urls) if count >= t and t not in self.claimed]
+            self.claimed.update(due)
+        for threshold in due:
+            self.q.put(threshold)
+
+    def _worker(self):
+        while True:
+            threshold = self.q.get()
+            if not fire_trigger(threshold, self.urls[threshold]):
+                with self.lock:
+                    self.claimed.discard(threshold)
+
+
+def run_poll(milestones):
     last_count = 0
-
     while True:
-        try:
-            count = get_count()
-            if count is None:
-                time.sleep(POLL_INTERVAL)
-                continue
-
+        count = get_count()
+        if count is not None:
             if count != last_count:
                 print(f"[{time.strftime('%H:%M:%S')}] Count: {count}")
                 last_count = count
+            milestones.check(count)
+        time.sleep(POLL_INTERVAL)
+
+
+def sse_events(resp):
+    """Yield (id, data) for each event in an SSE response; ignores comments/heartbeats."""
+    event_id, data = None, []
+    for line in resp.iter_lines(decode_unicode=True):
+        if line is None:
+            continue
+        if not line:
+            if data:
+                yield event_id, "\n".join(data)
+            event_id, data = None, []
+        elif line.startswith(":"):
+            continue
+        else:
+            field, _, value = line.partition(":")
+            value = value[1:] if value.startswith(" ") else value
+            if field == "id":
+                event_id = value
+            elif field == "data":
+                data.append(value)
+
+
+def run_sse(milestones):
+    last_id = None
+    backoff = 1.0
+    session = requests.Session()
+    while True:
+        headers = {"Accept": "text/event-stream"}
+        if last_id:
+            headers["Last-Event-ID"] = last_id
+        try:
+            # Read timeout well above the server's 15s heartbeat to spot dead connections.
+            with session.get(EVENTS_URL, headers=headers, stream=True, timeout=(5, 45)) as resp:
+                resp.raise_for_status()
+                print(f"[{time.strftime('%H:%M:%S')}] Connected to {EVENTS_URL}"
+                      + (f" (resuming after {last_id})" if last_id else ""))
+                # Seed from /state to cover anything older than the server's replay log.
+                count = get_count()
+                if count is not None:
+                    milestones.check(count)
+                backoff = 1.0
+                for event_id, data in sse_events(resp):
+                    if event_id:
+                        last_id = event_id
+                    try:
+                        count = json.loads(data).get("count")
+                    except ValueError:
+                        continue
+                    if isinstance(count, int):
+                        milestones.check(count)
+            print(f"[{time.strftime('%H:%M:%S')}] Stream closed by server")
+        except requests.RequestException as e:
+            print(f"[{time.strftime('%H:%M:%S')}] ✗ Stream error: {e}")
+        delay = backoff * random.uniform(0.5, 1.0)
+        print(f"  Reconnecting in {delay:.1f}s")
+        time.sleep(delay)
+        backoff = min(backoff * 2, BACKOFF_MAX)
 
-            # Check milestones
-            for threshold in sorted(MILESTONES.keys()):
-                if count >= threshold and threshold not in fired:
-                    fire_trigger(threshold, MILESTONES[threshold])
-                    fired.add(threshold)
 
-            time.sleep(POLL_INTERVAL)
+def main():
+    print("Alexa Webhook Announcer")
+    if MODE == "poll":
+        print(f"  State URL: {STATE_URL}")
+        print(f"  Poll:      every {POLL_INTERVAL}s")
+    else:
+        print(f"  Events URL: {EVENTS_URL}")
+    print(f"  Milestones: {sorted(MILESTONES.keys())}")
+    print(f"  Ctrl+C to stop\n")
 
-        except KeyboardInterrupt:
-            print("\nStopped.")
-            break
+    milestones = Milestones(MILESTONES)
+    try:
+        if MODE == "poll":
+            run_poll(milestones)
+        else:
+            run_sse(milestones)
+    except KeyboardInterrupt:
+        print("\nStopped.")
 
 
 if __name__ == "__main__":
@@ -124,16 +124,16 @@ def alexa_handler():
 # ═══════════════════════════════════════════
 
 def _get_state():
-    """Read demo state directly from app.py globals (same process)."""
-    return {"count": _app.count, "last": _app.last}
+    """Read demo state from the app's current read view (same process, no locking)."""
+    v = _app.read_view()
+    return {"count": v.count, "last": v.last}
 
 
 def _get_telemetry():
-    """Read telemetry directly from app.py globals (same process)."""
-    t = _app.telemetry
-    avg = round(sum(t["batteries"]) / max(1, len(t["batteries"]))) if t["batteries"] else 0
-    return {"devices": t["devices"], "avgBattery": avg,
-            "networks": t["networks"], "locales": t["locales"]}
+    """Read telemetry from the app's current read view (same process, no locking)."""
+    v = _app.read_view()
+    return {"devices": v.devices, "avgBattery": v.avg_battery,
+            "networks": v.telemetry["networks"], "locales": v.telemetry["locales"]}
 
 
 def handle_launch():
@@ -214,31 +214,19 @@ def handle_rate():
 def handle_lockdown():
     """Inject a lockdown command CloudEvent directly — motor command DOWN."""
     now = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
-    _app.count += 1
-    _app.last_event_time = now
-    event_payload = {
-        "ts": now,
-        "payload": {
-            "specversion": "1.0",
-            "type": "ohc.demo.command.lockdown",
-            "source": "alexa://building-ops",
-            "id": f"alexa-lockdown-{uuid.uuid4().hex[:8]}",
-            "time": now,
-            "eventclass": "command",
-            "data": {
-                "action": "lockdown",
-                "initiated_by": "alexa_voice_command",
-                "description": "Lockdown initiated via Alexa voice command",
-            },
+    _app.submit({
+        "specversion": "1.0",
+        "type": "ohc.demo.command.lockdown",
+        "source": "alexa://building-ops",
+        "id": f"alexa-lockdown-{uuid.uuid4().hex[:8]}",
+        "time": now,
+        "eventclass": "command",
+        "data": {
+            "action": "lockdown",
+            "initiated_by": "alexa_voice_command",
+            "description": "Lockdown initiated via Alexa voice command",
         },
-        "count": _app.count,
-    }
-    _app.last = event_payload
-    _app.event_log.append(event_payload)
-    if len(_app.event_log) > 200:
-        _app.event_log.pop(0)
-    _app.telemetry["event_classes"]["command"] = _app.telemetry["event_classes"].get("command", 0) + 1
-    _app.publish(event_payload)
+    })
 
     speech = (
         "Lockdown initiated. Command event sent through the spinal cord. "
@@ -250,24 +238,8 @@ def handle_lockdown():
 
 
 def handle_reset():
-    """Reset all state directly via app globals."""
-    import os
-    with _app.lock:
-        _app.count = 0
-        _app.last = {}
-        _app.last_event_time = None
-        _app.event_log.clear()
-        for k in _app.telemetry:
-            if isinstance(_app.telemetry[k], list):
-                _app.telemetry[k].clear()
-            elif isinstance(_app.telemetry[k], dict):
-                _app.telemetry[k].clear()
-            else:
-                _app.telemetry[k] = 0
-        try:
-            os.remove(_app.STATE_FILE)
-        except FileNotFoundError:
-            pass
+    """Reset all state through the app's shared reset path."""
+    _app.reset_all()
     speech = "The nervous system has been reset. All counters back to zero. Ready for new impulses."
     return alexa_response(speech,
                          card_title="Reset",
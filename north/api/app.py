@@ -1,11 +1,15 @@
 from flask import Flask, request, Response, redirect
 from datetime import datetime, timezone
 import json
+import hashlib
 import threading
 import signal
 import atexit
 import os
 import time
+import heapq
+import uuid
+from collections import deque
 import redis
 
 app = Flask(__name__)
@@ -21,6 +25,11 @@ REDIS_HOST = os.environ.get("REDIS_HOST", "redis")
 REDIS_PORT = int(os.environ.get("REDIS_PORT", "6379"))
 REDIS_DB = int(os.environ.get("REDIS_DB", "0"))
 REDIS_CHANNEL = os.environ.get("REDIS_CHANNEL", "ohc:events")
+DEDUPE_WINDOW = int(os.environ.get("DEDUPE_WINDOW", "0"))  # seconds; 0 disables
+INGEST_MAX_EVENTS = int(os.environ.get("INGEST_MAX_EVENTS", "500"))  # per POSTed JSON array
+SSE_BUFFER = int(os.environ.get("SSE_BUFFER", "1024"))  # frames an /events client may lag before it's dropped
+REDIS_CONTROL_CHANNEL = os.environ.get("REDIS_CONTROL_CHANNEL", REDIS_CHANNEL + ":control")
+GEN_CACHE_S = float(os.environ.get("REDIS_GEN_CACHE_S", "1"))  # how stale another worker's reset can look
 
 redis_client = None
 pubsub = None
@@ -48,26 +57,57 @@ def init_redis():
         return False
 
 # Redis key helpers
+# Everything lives under ohc:g<gen>: so a reset is one INCR of ohc:gen;
+# telemetry has its own ohc:tgen inside that. Workers cache both numbers
+# for GEN_CACHE_S; event writes read them server-side in the ingest script.
+def _gen_key():
+    return "ohc:gen"
+
+def _tgen_key():
+    return "ohc:tgen"
+
+_gen = (0, 0, float("-inf"))  # (gen, tgen, monotonic time fetched)
+
+def _generation():
+    """(gen, tgen), from Redis at most every GEN_CACHE_S."""
+    global _gen
+    gen, tgen, fetched = _gen
+    if time.monotonic() - fetched > GEN_CACHE_S:
+        try:
+            g, t = redis_client.mget(_gen_key(), _tgen_key())
+            gen, tgen = int(g or 0), int(t or 0)
+            _gen = (gen, tgen, time.monotonic())
+        except Exception:
+            pass
+    return gen, tgen
+
+def _ns():
+    return f"ohc:g{_generation()[0]}:"
+
 def _count_key():
-    return "ohc:count"
+    return _ns() + "count"
 
 def _last_key():
-    return "ohc:last"
+    return _ns() + "last"
 
 def _last_event_time_key():
-    return "ohc:last_event_time"
+    return _ns() + "last_event_time"
 
 def _event_log_key():
-    return "ohc:event_log"
+    return _ns() + "event_log"
 
 def _telemetry_key(subkey):
-    return f"ohc:telemetry:{subkey}"
+    gen, tgen = _generation()
+    return f"ohc:g{gen}:telemetry:{tgen}:{subkey}"
 
 def _contractor_key(contractor_id):
-    return f"ohc:contractor:{contractor_id}"
+    return f"{_ns()}contractor:{contractor_id}"
 
 def _contractor_swipes_key():
-    return "ohc:contractor:swipes"
+    return _ns() + "contractor:swipes"
+
+def _dedupe_stats_key():
+    return _ns() + "dedupe_stats"
 
 # State operations using Redis
 def get_count():
@@ -78,20 +118,6 @@ def get_count():
     except Exception:
         return 0
 
-def incr_count():
-    """Increment and return event count."""
-    try:
-        return redis_client.incr(_count_key())
-    except Exception:
-        return 0
-
-def set_last(event):
-    """Store last event in Redis."""
-    try:
-        redis_client.set(_last_key(), json.dumps(event))
-    except Exception as e:
-        app.logger.warning("Failed to set last event: %s", e)
-
 def get_last():
     """Get last event from Redis."""
     try:
@@ -100,13 +126,6 @@ def get_last():
     except Exception:
         return {}
 
-def set_last_event_time(ts):
-    """Store last event timestamp."""
-    try:
-        redis_client.set(_last_event_time_key(), ts)
-    except Exception:
-        pass
-
 def get_last_event_time():
     """Get last event timestamp."""
     try:
@@ -114,14 +133,6 @@ def get_last_event_time():
     except Exception:
         return None
 
-def append_event_log(event):
-    """Append event to log (capped at 200)."""
-    try:
-        redis_client.lpush(_event_log_key(), json.dumps(event))
-        redis_client.ltrim(_event_log_key(), 0, 199)
-    except Exception as e:
-        app.logger.warning("Failed to append event log: %s", e)
-
 def get_event_log():
     """Get event log from Redis."""
     try:
@@ -130,20 +141,6 @@ def get_event_log():
     except Exception:
         return []
 
-def incr_telemetry_counter(key, field):
-    """Increment a telemetry counter."""
-    try:
-        redis_client.hincrby(_telemetry_key(key), field, 1)
-    except Exception:
-        pass
-
-def append_telemetry_list(key, value):
-    """Append to a telemetry list."""
-    try:
-        redis_client.rpush(_telemetry_key(key), value)
-    except Exception:
-        pass
-
 def get_telemetry_list(key):
     """Get telemetry list."""
     try:
@@ -166,37 +163,180 @@ def get_telemetry_value(key):
     except Exception:
         return 0
 
-def incr_telemetry_value(key):
-    """Increment telemetry value."""
-    try:
-        return redis_client.incr(_telemetry_key(key))
-    except Exception:
-        return 0
-
 def reset_telemetry():
-    """Reset all telemetry data."""
+    """Reset all telemetry data: start a new telemetry generation."""
     try:
-        keys = redis_client.keys("ohc:telemetry:*")
-        if keys:
-            redis_client.delete(*keys)
+        _bump_generation(_tgen_key())
     except Exception:
         pass
 
 def reset_state():
-    """Reset all state in Redis."""
+    """Reset all state in Redis: start a new generation."""
     try:
-        keys = redis_client.keys("ohc:*")
-        if keys:
-            redis_client.delete(*keys)
+        _bump_generation(_gen_key())
     except Exception as e:
         app.logger.warning("Failed to reset state: %s", e)
 
-def publish(event):
-    """Publish event to Redis pub/sub channel."""
+def _bump_generation(key):
+    # The control message makes other workers' listeners drop their cached generation.
+    pipe = redis_client.pipeline()
+    pipe.incr(key)
+    pipe.publish(REDIS_CONTROL_CHANNEL, key)
+    pipe.execute()
+    _invalidate_generation()
+    _reclaim_wake.set()
+
+def _invalidate_generation():
+    global _gen
+    _gen = (0, 0, float("-inf"))
+
+# Old generations are deleted in the background: SCAN in small batches and
+# UNLINK (freed off the main thread), so Redis never blocks on a reset.
+# Only generations older than the current one are touched, so a reclaim
+# racing another worker's reset can't delete live keys.
+_reclaim_wake = threading.Event()
+
+def _stale(key, gen, tgen):
+    parts = key.split(":")
+    if len(parts) < 3 or not parts[1].startswith("g") or not parts[1][1:].isdigit():
+        return False  # ohc:gen/ohc:tgen, or a flat key an older release wrote: not ours to delete
+    key_gen = int(parts[1][1:])
+    if key_gen != gen:
+        return key_gen < gen
+    return parts[2] == "telemetry" and len(parts) > 4 and parts[3].isdigit() and int(parts[3]) < tgen
+
+def reclaim_old_generations(batch=500):
+    """UNLINK every ohc:* key from an older generation. Returns how many went."""
+    migrate_flat_layout()
+    g, t = redis_client.mget(_gen_key(), _tgen_key())
+    gen, tgen = int(g or 0), int(t or 0)
+    removed, stale = 0, []
+    for key in redis_client.scan_iter("ohc:*", count=batch):
+        if _stale(key, gen, tgen):
+            stale.append(key)
+        if len(stale) >= batch:
+            removed += redis_client.unlink(*stale)
+            stale = []
+    if stale:
+        removed += redis_client.unlink(*stale)
+    return removed
+
+def _reclaim_loop():
+    while True:
+        _reclaim_wake.wait()
+        _reclaim_wake.clear()
+        try:
+            removed = reclaim_old_generations()
+            if removed:
+                app.logger.info("Reclaimed %d keys from old generations", removed)
+        except Exception as e:
+            app.logger.warning("Generation reclaim failed: %s", e)
+            time.sleep(5)
+            _reclaim_wake.set()
+
+_reclaim_thread = threading.Thread(target=_reclaim_loop, daemon=True)
+
+# Releases before generations kept state in flat keys (ohc:count,
+# ohc:telemetry:<subkey>, ...). The first worker to find ohc:gen missing
+# renames them into generation 0, atomically, so no worker writes g0 while
+# they are being moved. A key whose g0 name is already taken is left alone.
+MIGRATE_LUA = """
+if redis.call('SETNX', KEYS[1], 0) == 0 then return 0 end
+local moved = 0
+for _, key in ipairs(redis.call('KEYS', 'ohc:*')) do
+  local rest = string.sub(key, 5)
+  local target = nil
+  if string.sub(rest, 1, 10) == 'telemetry:' then
+    target = 'ohc:g0:telemetry:0:' .. string.sub(rest, 11)
+  elseif key ~= KEYS[1] and key ~= KEYS[2] and not string.match(rest, '^g%d+:') then
+    target = 'ohc:g0:' .. rest
+  end
+  if target and redis.call('RENAMENX', key, target) == 1 then moved = moved + 1 end
+end
+return moved
+"""
+
+def migrate_flat_layout():
+    """Move a pre-generation keyspace into generation 0, once. Returns keys moved."""
+    moved = redis_client.eval(MIGRATE_LUA, 2, _gen_key(), _tgen_key())
+    if moved:
+        app.logger.info("Migrated %d pre-generation keys into ohc:g0:", moved)
+    return moved
+
+def get_dedupe_stats():
+    """Dedupe counters for /about."""
+    try:
+        stats = redis_client.hgetall(_dedupe_stats_key())
+    except Exception:
+        stats = {}
+    checked, dups = int(stats.get("checked", 0)), int(stats.get("duplicates", 0))
+    return {"windowS": DEDUPE_WINDOW, "checked": checked, "duplicates": dups,
+            "duplicateRate": round(dups / max(1, checked), 4)}
+
+# Event writes: one server-side script per event, so the dedupe check,
+# count, last event, log, telemetry and publish are atomic and cost one
+# round trip. The script reads the generation itself, so an event can't
+# land in a generation another worker has just reset. "last" is spliced
+# together from the payload JSON as sent, so readers get exactly what
+# json.dumps() would have produced.
+# KEYS: gen, tgen
+# ARGV: ts, payload JSON, channel, telemetry ops JSON ([[cmd, telemetry subkey, args...]]),
+#       dedupe window, dedupe key suffix or ""
+INGEST_LUA = """
+local gen = redis.call('MGET', KEYS[1], KEYS[2])
+local ns = 'ohc:g' .. (gen[1] or '0') .. ':'
+local tns = ns .. 'telemetry:' .. (gen[2] or '0') .. ':'
+if ARGV[6] ~= '' then
+  local fresh = redis.call('SET', ns .. ARGV[6], 1, 'NX', 'EX', ARGV[5])
+  redis.call('HINCRBY', ns .. 'dedupe_stats', 'checked', 1)
+  if not fresh then
+    redis.call('HINCRBY', ns .. 'dedupe_stats', 'duplicates', 1)
+    return {1, tonumber(redis.call('GET', ns .. 'count') or 0)}
+  end
+end
+local count = redis.call('INCR', ns .. 'count')
+local last = '{"ts": "' .. ARGV[1] .. '", "payload": ' .. ARGV[2] .. ', "count": ' .. count .. '}'
+redis.call('SET', ns .. 'last_event_time', ARGV[1])
+redis.call('SET', ns .. 'last', last)
+redis.call('LPUSH', ns .. 'event_log', last)
+redis.call('LTRIM', ns .. 'event_log', 0, 199)
+for _, op in ipairs(cjson.decode(ARGV[4])) do
+  op[2] = tns .. op[2]
+  redis.call(unpack(op))
+end
+redis.call('PUBLISH', ARGV[3], last)
+return {0, count}
+"""
+_ingest_sha = hashlib.sha1(INGEST_LUA.encode()).hexdigest()
+
+def record_events(ts, events):
+    """Write [(payload, telemetry ops, dedupe key suffix or None)] in one round trip.
+
+    Returns [(count, duplicate)] per event; a duplicate gets the current count.
+    """
     try:
-        redis_client.publish(REDIS_CHANNEL, json.dumps(event))
+        for _ in range(2):
+            pipe = redis_client.pipeline(transaction=False)
+            for payload, ops, dedupe in events:
+                pipe.evalsha(_ingest_sha, 2, _gen_key(), _tgen_key(), ts, json.dumps(payload),
+                             REDIS_CHANNEL, json.dumps(ops), DEDUPE_WINDOW, dedupe or "")
+            try:
+                return [(count, bool(dup)) for dup, count in pipe.execute()]
+            except redis.exceptions.NoScriptError:
+                # Redis restarted or its script cache was flushed; nothing ran.
+                redis_client.script_load(INGEST_LUA)
     except Exception as e:
-        app.logger.warning("Failed to publish event: %s", e)
+        app.logger.warning("Failed to record events: %s", e)
+    return [(0, False)] * len(events)
+
+def _dedupe_target(data):
+    """Dedupe key (within the generation) for an event's (source, id) if DEDUPE_WINDOW is on, else None.
+
+    Each id is a SET NX key with a TTL, so Redis memory is bounded by the
+    ids seen in one window.
+    """
+    evt_id = data.get("id") if DEDUPE_WINDOW > 0 else None
+    return f"dedupe:{data.get('source', '')}:{evt_id}" if evt_id else None
 
 def add_cors(resp):
     resp.headers["Access-Control-Allow-Origin"] = "*"
@@ -205,29 +345,114 @@ def add_cors(resp):
     return resp
 
 # SSE stream generator
-def event_stream():
-    """Generate SSE stream from Redis pub/sub."""
-    sub = redis_client.pubsub(ignore_subscribe_messages=True)
+def _sse_message(raw):
+    """Frame a published event as SSE, using its count as the event id."""
+    try:
+        event_id = json.loads(raw).get("count", "")
+    except Exception:
+        event_id = ""
+    return event_id, f"id: {event_id}\ndata: {raw}\n\n"
+
+def _missed_since(last_event_id):
+    """Logged events newer than a client's Last-Event-ID, oldest first."""
+    try:
+        last_id = int(last_event_id)
+    except (TypeError, ValueError):
+        return []
+    if last_id >= get_count():
+        return []  # up to date, or ahead of us after a reset — nothing to replay
+    return [e for e in reversed(get_event_log()) if e.get("count", 0) > last_id]
+
+# One pub/sub connection per worker: the listener thread subscribes once,
+# frames each message once and appends it to a fixed-size ring that every
+# local /events client reads from with its own cursor. A client that falls
+# more than SSE_BUFFER frames behind, or that was reading when the listener
+# had to reconnect, is disconnected; EventSource reconnects with
+# Last-Event-ID and catches up from the event log.
+_bus = [None] * SSE_BUFFER       # (event_id, frame) at seq % SSE_BUFFER
+_bus_next = 0                    # seq of the next frame
+_bus_epoch = 0                   # bumped when the listener reconnects
+_bus_cv = threading.Condition()
+_bus_clients = 0
+_listener_ready = threading.Event()
+_listener_thread = None
+
+def _listen():
+    global _bus_next, _bus_epoch
+    failures = 0
+    while True:
+        sub = redis_client.pubsub(ignore_subscribe_messages=True)
+        try:
+            sub.subscribe(REDIS_CHANNEL, REDIS_CONTROL_CHANNEL)
+            _listener_ready.set()
+            app.logger.info("SSE listener subscribed to Redis channel")
+            failures = 0
+            while True:
+                message = sub.get_message(timeout=5)
+                if not message or message["type"] != "message":
+                    continue
+                if message["channel"] == REDIS_CONTROL_CHANNEL:
+                    _invalidate_generation()  # another worker reset state
+                    continue
+                event_id, frame = _sse_message(message["data"])
+                with _bus_cv:
+                    _bus[_bus_next % SSE_BUFFER] = (event_id, frame)
+                    _bus_next += 1
+                    _bus_cv.notify_all()
+        except Exception as e:
+            app.logger.warning("SSE listener error: %s", e)
+        finally:
+            sub.close()
+        _listener_ready.clear()
+        with _bus_cv:
+            _bus_epoch += 1  # messages may have been lost; clients resume from the log
+            _bus_cv.notify_all()
+        failures += 1
+        time.sleep(min(30, 2 ** failures))
+
+def _ensure_listener():
+    """Start this worker's listener on first use and wait until it's subscribed."""
+    global _listener_thread
+    with _bus_cv:
+        if _listener_thread is None:
+            _listener_thread = threading.Thread(target=_listen, daemon=True)
+            _listener_thread.start()
+    _listener_ready.wait(timeout=5)
+
+def event_stream(last_event_id=None):
+    """Generate an SSE stream from the worker's broadcast ring, replaying missed events first."""
+    global _bus_clients
+    _ensure_listener()
+    # Take a cursor before reading the log so nothing slips between replay and live.
+    with _bus_cv:
+        cursor, epoch = _bus_next, _bus_epoch
+        _bus_clients += 1
     try:
-        sub.subscribe(REDIS_CHANNEL)
-        app.logger.info("SSE client subscribed to Redis channel")
+        missed = _missed_since(last_event_id)
+        replayed = {e["count"] for e in missed}
+        for event in missed:
+            yield _sse_message(json.dumps(event))[1]
 
         while True:
-            try:
-                message = sub.get_message(timeout=15)
-                if message and message['type'] == 'message':
-                    # Message data is already JSON string from publish()
-                    yield f"data: {message['data']}\n\n"
-                else:
-                    # SSE heartbeat
-                    yield ": keepalive\n\n"
-            except Exception as e:
-                app.logger.warning("SSE stream error: %s", e)
-                break
+            with _bus_cv:
+                if cursor == _bus_next and epoch == _bus_epoch:
+                    _bus_cv.wait(timeout=15)
+                if epoch != _bus_epoch or _bus_next - cursor > SSE_BUFFER:
+                    return
+                frames = [_bus[seq % SSE_BUFFER] for seq in range(cursor, _bus_next)]
+                cursor = _bus_next
+            if not frames:
+                # SSE heartbeat
+                yield ": keepalive\n\n"
+            for event_id, frame in frames:
+                if replayed:
+                    if event_id in replayed:
+                        continue
+                    replayed = None
+                yield frame
     finally:
-        sub.unsubscribe()
-        sub.close()
-        app.logger.info("SSE client unsubscribed")
+        with _bus_cv:
+            _bus_clients -= 1
 
 @app.route("/state", methods=["GET", "OPTIONS"])
 def state():
@@ -243,42 +468,60 @@ def ingest():
     if request.method == "OPTIONS":
         return add_cors(Response(status=204))
 
-    data = request.get_json(silent=True) or {}
-    count = incr_count()
-    ts = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
-    set_last_event_time(ts)
-
-    last = {
-        "ts": ts,
-        "payload": data,
-        "count": count
-    }
+    data = request.get_json(silent=True)
+    if data is None:
+        data = {}
+    if isinstance(data, list):
+        return _ingest_many(data)
+    if not isinstance(data, dict):
+        return add_cors(Response(json.dumps({"ok": False, "error": "expected a JSON object"}),
+                                 status=400, mimetype="application/json"))
+    (count, duplicate), = record_events(_now(), [(data, _telemetry_ops(data), _dedupe_target(data))])
+    body = {"ok": True, "count": count}
+    if duplicate:
+        body["duplicate"] = True
+    return add_cors(Response(json.dumps(body), mimetype="application/json"))
+
+def _ingest_many(events):
+    """A JSON array of events in one POST, written in one round trip and answered with one response."""
+    if not events or len(events) > INGEST_MAX_EVENTS or not all(isinstance(e, dict) for e in events):
+        return add_cors(Response(json.dumps({
+            "ok": False, "error": f"expected 1-{INGEST_MAX_EVENTS} JSON objects"}),
+            status=400, mimetype="application/json"))
+    results = record_events(_now(), [(data, _telemetry_ops(data), _dedupe_target(data)) for data in events])
+    duplicates = sum(1 for _, duplicate in results if duplicate)
+    return add_cors(Response(
+        json.dumps({"ok": True, "count": results[-1][0],
+                    "accepted": len(results) - duplicates, "duplicates": duplicates}),
+        mimetype="application/json"
+    ))
 
-    set_last(last)
-    publish(last)
-    append_event_log(last)
+def _now():
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
 
-    # Telemetry aggregation
+def _telemetry_ops(data):
+    """Telemetry aggregation for one event, as [cmd, telemetry subkey, args...] for the ingest script."""
+    ops = []
     payload = data.get("data", data.get("payload", data))
     evt_type = data.get("type", "")
     evt_class = data.get("eventclass", "")
 
     if evt_class:
-        incr_telemetry_counter("event_classes", evt_class)
+        ops.append(["HINCRBY", "event_classes", str(evt_class), 1])
 
     if "telemetry.battery" in evt_type or "telemetry.power_state" in evt_type:
         try:
             level = int(payload.get("batteryPct", payload.get("level", 0)))
-            append_telemetry_list("batteries", str(level))
+            ops.append(["RPUSH", "batteries", str(level)])
         except Exception:
             pass
 
     if "telemetry.network" in evt_type or "telemetry.network_env" in evt_type:
         net_type = payload.get("effectiveType", payload.get("type", "unknown"))
-        incr_telemetry_counter("networks", net_type)
+        ops.append(["HINCRBY", "networks", str(net_type), 1])
 
     if "telemetry.device" in evt_type or "telemetry.device_identity" in evt_type:
-        incr_telemetry_value("devices")
+        ops.append(["INCR", "devices"])
 
         for key, field in [
             ("device_classes", "deviceClass"),
@@ -290,12 +533,12 @@ def ingest():
         ]:
             val = payload.get(field, "unknown")
             if val and val != "unknown" and val != "unavailable":
-                incr_telemetry_counter(key, val)
+                ops.append(["HINCRBY", key, str(val), 1])
 
         langs = payload.get("languages", "")
         if langs:
             primary = langs.split(",")[0].strip()
-            incr_telemetry_counter("locales", primary)
+            ops.append(["HINCRBY", "locales", primary, 1])
 
         profile = {
             "deviceClass": payload.get("deviceClass"),
@@ -307,17 +550,15 @@ def ingest():
             "memory": payload.get("memoryGB"),
             "timezone": payload.get("timezone"),
         }
-        append_telemetry_list("profiles", json.dumps(profile))
-        redis_client.ltrim(_telemetry_key("profiles"), -50, -1)
+        ops.append(["RPUSH", "profiles", json.dumps(profile)])
+        ops.append(["LTRIM", "profiles", -50, -1])
 
-    return add_cors(Response(
-        json.dumps({"ok": True, "count": count}),
-        mimetype="application/json"
-    ))
+    return ops
 
 @app.route("/events")
 def events():
-    resp = Response(event_stream(), mimetype="text/event-stream")
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("lastEventId")
+    resp = Response(event_stream(last_event_id), mimetype="text/event-stream")
     resp.headers["Cache-Control"] = "no-cache"
     resp.headers["X-Accel-Buffering"] = "no"
     resp.headers["Access-Control-Allow-Origin"] = "*"
@@ -377,6 +618,9 @@ def about():
         "lastEventTime": get_last_event_time(),
         "redisHost": REDIS_HOST,
         "redisPort": REDIS_PORT,
+        "dedupe": get_dedupe_stats(),
+        "sseClients": _bus_clients,  # this worker's
+        "ingestMaxEvents": INGEST_MAX_EVENTS,  # /ingest takes JSON arrays; relays check for this
     }), mimetype="application/json"))
 
 @app.get("/healthz")
@@ -441,46 +685,127 @@ def reset_state_endpoint():
 
 # Helper: emit a typed CloudEvent into the pipeline
 def _emit(event_type, event_class, source, data):
-    ts = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
-    count = incr_count()
-    set_last_event_time(ts)
-
+    ts = _now()
     payload = {"type": event_type, "eventclass": event_class, "source": source, "data": data}
-    evt = {"ts": ts, "payload": payload, "count": count}
-
-    set_last(evt)
-    append_event_log(evt)
-    incr_telemetry_counter("event_classes", event_class)
-
-    publish(evt)
-    return evt
+    (count, _), = record_events(ts, [(payload, [["HINCRBY", "event_classes", event_class, 1]], None)])
+    return {"ts": ts, "payload": payload, "count": count}
+
+# Scenario scheduler
+# Scenarios are data: a list of steps, each (delay, event_type, event_class,
+# source, data) where delay is a multiple of the run's delay_s measured from
+# the previous step. One scheduler thread drives every run off a heap, so
+# concurrent presenters cost heap entries instead of sleeping threads.
+SCENARIOS = {
+    # #42: 3D-GRC Kill Chain
+    "grc-killchain": [
+        (0, "ohc.demo.grc.badge_anomaly", "ohc.demo.grc", "alertenterprise-pacs",
+         {"badge_id": "C-4471", "cardholder": "Contractor — Alex R.",
+          "reader": "Server Room North", "anomaly": "cloned_badge",
+          "flagged_by": "AlertEnterprise PACS", "confidence": 0.97}),
+        (1, "ohc.demo.grc.it_lateral", "ohc.demo.grc", "sap-grc",
+         {"source_ip": "10.12.44.71", "target": "SAP HANA DB",
+          "credential": "svc-erp-admin", "erp_user": "C-4471-SVC",
+          "correlated_badge": "C-4471", "sap_grc_alert": "AUT-2026-8812"}),
+        (1, "ohc.demo.grc.ot_lockdown", "ohc.demo.grc", "ansible-automation",
+         {"triggered_by": "SAP GRC + AlertEnterprise correlation",
+          "scope": "OT Zone B — PLCs 12–19", "method": "Ansible playbook",
+          "playbook": "ot-emergency-lockdown.yml", "plcs_isolated": 8, "latency_ms": 312}),
+    ],
+}
 
-# #42: 3D-GRC Kill Chain Scenario
-@app.post("/scenario/grc-killchain")
-def grc_killchain_scenario():
+_sched_heap = []         # (due_monotonic, seq, run_id, step_index)
+_sched_runs = {}         # run_id → {"name", "delay_s", "started"}
+_sched_cv = threading.Condition()
+_sched_seq = 0
+_sched_jitter = deque(maxlen=500)  # recent lateness samples, seconds
+_sched_stats = {"runs": 0, "steps": 0, "cancelled": 0}
+
+def schedule_scenario(name, delay_s):
+    """Queue every step of SCENARIOS[name]; returns the run id."""
+    global _sched_seq
+    steps = SCENARIOS[name]
+    run_id = uuid.uuid4().hex[:12]
+    with _sched_cv:
+        _sched_runs[run_id] = {"name": name, "delay_s": delay_s, "started": time.time(),
+                               "remaining": len(steps)}
+        due = time.monotonic()
+        for i, step in enumerate(steps):
+            due += step[0] * delay_s
+            _sched_seq += 1
+            heapq.heappush(_sched_heap, (due, _sched_seq, run_id, i))
+        _sched_stats["runs"] += 1
+        _sched_cv.notify()
+    return run_id
+
+def cancel_scenario(run_id):
+    # Heap entries for a cancelled run are dropped lazily when they surface
+    with _sched_cv:
+        run = _sched_runs.pop(run_id, None)
+        if run:
+            _sched_stats["cancelled"] += 1
+    return run is not None
+
+def _scheduler_loop():
+    while True:
+        with _sched_cv:
+            while True:
+                if _sched_heap:
+                    wait = _sched_heap[0][0] - time.monotonic()
+                    if wait <= 0:
+                        break
+                    _sched_cv.wait(wait)
+                else:
+                    _sched_cv.wait()
+            due, _, run_id, i = heapq.heappop(_sched_heap)
+            run = _sched_runs.get(run_id)
+            if run is None:
+                continue
+            run["remaining"] -= 1
+            if run["remaining"] == 0:
+                del _sched_runs[run_id]
+            _sched_jitter.append(time.monotonic() - due)
+            _sched_stats["steps"] += 1
+            _, event_type, event_class, source, data = SCENARIOS[run["name"]][i]
+        try:
+            _emit(event_type, event_class, source, dict(data, scenario_run=run_id))
+        except Exception as e:
+            app.logger.warning("Scenario %s step %d failed: %s", run_id, i, e)
+
+_scheduler_thread = threading.Thread(target=_scheduler_loop, daemon=True)
+
+def _jitter_summary():
+    samples = sorted(_sched_jitter)
+    if not samples:
+        return {"samples": 0}
+    pick = lambda q: round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000, 2)
+    return {"samples": len(samples), "p50_ms": pick(0.50), "p99_ms": pick(0.99),
+            "max_ms": round(samples[-1] * 1000, 2)}
+
+@app.post("/scenario/<name>")
+def run_scenario(name):
+    if name not in SCENARIOS:
+        return add_cors(Response(json.dumps({"ok": False, "error": "Unknown scenario " + name}),
+                                 status=404, mimetype="application/json"))
     body = request.get_json(silent=True) or {}
     delay = max(0.5, min(float(body.get("delay_s", 3)), 10.0))
-
-    def run():
-        _emit("ohc.demo.grc.badge_anomaly", "ohc.demo.grc", "alertenterprise-pacs",
-              {"badge_id": "C-4471", "cardholder": "Contractor — Alex R.",
-               "reader": "Server Room North", "anomaly": "cloned_badge",
-               "flagged_by": "AlertEnterprise PACS", "confidence": 0.97})
-        time.sleep(delay)
-        _emit("ohc.demo.grc.it_lateral", "ohc.demo.grc", "sap-grc",
-              {"source_ip": "10.12.44.71", "target": "SAP HANA DB",
-               "credential": "svc-erp-admin", "erp_user": "C-4471-SVC",
-               "correlated_badge": "C-4471", "sap_grc_alert": "AUT-2026-8812"})
-        time.sleep(delay)
-        _emit("ohc.demo.grc.ot_lockdown", "ohc.demo.grc", "ansible-automation",
-              {"triggered_by": "SAP GRC + AlertEnterprise correlation",
-               "scope": "OT Zone B — PLCs 12–19", "method": "Ansible playbook",
-               "playbook": "ot-emergency-lockdown.yml", "plcs_isolated": 8, "latency_ms": 312})
-
-    threading.Thread(target=run, daemon=True).start()
-    return add_cors(Response(json.dumps({"ok": True, "scenario": "grc-killchain", "delay_s": delay}),
+    run_id = schedule_scenario(name, delay)
+    return add_cors(Response(json.dumps({"ok": True, "scenario": name, "delay_s": delay, "run_id": run_id}),
                              mimetype="application/json"))
 
+@app.post("/scenario/cancel/<run_id>")
+def cancel_scenario_run(run_id):
+    ok = cancel_scenario(run_id)
+    return add_cors(Response(json.dumps({"ok": ok, "run_id": run_id}),
+                             status=200 if ok else 404, mimetype="application/json"))
+
+@app.get("/scenarios")
+def scenarios():
+    with _sched_cv:
+        active = [{"run_id": k, **v} for k, v in _sched_runs.items()]
+        body = {"scenarios": sorted(SCENARIOS), "active": active, "pending_steps": len(_sched_heap),
+                **_sched_stats, "jitter": _jitter_summary()}
+    return add_cors(Response(json.dumps(body), mimetype="application/json"))
+
 # #43: Shop-Floor Visual Inspection → SAP QM
 @app.post("/shopfloor/defect")
 def shopfloor_defect():
@@ -676,34 +1001,19 @@ def piport_idoc():
     material = data.get("material", "MAT-00001")
     quantity = data.get("quantity", 1)
 
-    ts = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
-    count = incr_count()
-    set_last_event_time(ts)
-
-    payload = {
-        "type": "ohc.demo.piport.idoc_goods_receipt",
-        "eventclass": "ohc.demo.piport",
-        "source": "pi-po-migration-factory",
-        "data": {
-            "idoc_type": idoc_type,
-            "plant": plant,
-            "material": material,
-            "quantity": quantity,
-            "routing_path": "PI/PO → EIC → S/4HANA",
-            "eic_endpoint": "eic.ohc.demo.local",
-            "s4_confirmation": "GR-" + datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S"),
-            "latency_ms": 142,
-        }
-    }
-
-    evt = {"ts": ts, "payload": payload, "count": count}
-    set_last(evt)
-    append_event_log(evt)
-    incr_telemetry_counter("event_classes", "ohc.demo.piport")
-    publish(evt)
+    evt = _emit("ohc.demo.piport.idoc_goods_receipt", "ohc.demo.piport", "pi-po-migration-factory", {
+        "idoc_type": idoc_type,
+        "plant": plant,
+        "material": material,
+        "quantity": quantity,
+        "routing_path": "PI/PO → EIC → S/4HANA",
+        "eic_endpoint": "eic.ohc.demo.local",
+        "s4_confirmation": "GR-" + datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S"),
+        "latency_ms": 142,
+    })
 
     return add_cors(Response(
-        json.dumps({"ok": True, "idoc_type": idoc_type, "s4_confirmation": payload["data"]["s4_confirmation"]}),
+        json.dumps({"ok": True, "idoc_type": idoc_type, "s4_confirmation": evt["payload"]["data"]["s4_confirmation"]}),
         mimetype="application/json"
     ))
 
@@ -721,7 +1031,14 @@ def badge_tap():
     return add_cors(Response(json.dumps({"ok": True}), mimetype="application/json"))
 
 # Initialize Redis on startup
-init_redis()
+if init_redis():
+    try:
+        migrate_flat_layout()
+    except Exception as e:
+        app.logger.warning("Pre-generation key migration failed: %s", e)  # the reclaimer retries it
+_reclaim_thread.start()
+_reclaim_wake.set()  # clear out anything an earlier reset left behind
+_scheduler_thread.start()
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=8080)
@@ -1,4 +1,4 @@
-from flask import Flask, request, Response, send_from_directory, redirect
+from flask import Flask, request, Response, send_from_directory, send_file, redirect, url_for
 from datetime import datetime, timezone
 import json
 import queue
@@ -8,6 +8,21 @@ import atexit
 import os
 import time
 import subprocess
+import heapq
+import itertools
+import struct
+import zlib
+import uuid
+import hashlib
+import re
+from collections import deque
+from functools import cached_property, wraps
+from types import MappingProxyType
+
+try:
+    import zstandard  # optional: lets artifact uploads use zstd as well as gzip
+except ImportError:
+    zstandard = None
 
 app = Flask(__name__)
 
@@ -17,7 +32,24 @@ _git_commit = os.environ.get("GIT_COMMIT", "dev")
 _build_version = os.environ.get("BUILD_VERSION", "local")
 
 STATE_FILE = os.environ.get("STATE_FILE", "/data/state.json")
+SNAPSHOT_FILE = os.environ.get("SNAPSHOT_FILE", os.path.join(os.path.dirname(STATE_FILE), "state.snap"))
+STATE_FORMAT = os.environ.get("STATE_FORMAT", "binary")  # binary | json
 FLUSH_INTERVAL = int(os.environ.get("FLUSH_INTERVAL", "10"))
+DEDUPE_WINDOW = int(os.environ.get("DEDUPE_WINDOW", "0"))        # seconds; 0 disables
+DEDUPE_MAX_IDS = int(os.environ.get("DEDUPE_MAX_IDS", "100000"))
+INGEST_MAX_INFLIGHT = int(os.environ.get("INGEST_MAX_INFLIGHT", "32"))
+INGEST_MIN_INFLIGHT = int(os.environ.get("INGEST_MIN_INFLIGHT", "2"))
+INGEST_MAX_QUEUE = int(os.environ.get("INGEST_MAX_QUEUE", "64"))
+INGEST_QUEUE_TIMEOUT = float(os.environ.get("INGEST_QUEUE_TIMEOUT", "1.0"))
+INGEST_TARGET_MS = float(os.environ.get("INGEST_TARGET_MS", "50"))
+INGEST_QUEUE_MAX = int(os.environ.get("INGEST_QUEUE_MAX", "10000"))
+INGEST_BATCH = int(os.environ.get("INGEST_BATCH", "256"))
+INGEST_MAX_EVENTS = int(os.environ.get("INGEST_MAX_EVENTS", "500"))  # per POSTed JSON array
+ARTIFACT_DIR = os.environ.get("ARTIFACT_DIR", "/data/artifacts")
+ARTIFACT_TOKEN = os.environ.get("ARTIFACT_TOKEN", "")             # bearer token for uploads; empty = uploads refused
+ARTIFACT_MAX_MB = int(os.environ.get("ARTIFACT_MAX_MB", "4096"))  # per file
+ARTIFACT_STORE_MB = int(os.environ.get("ARTIFACT_STORE_MB", "512"))  # whole store; /data also holds state
+ARTIFACT_UPLOAD_TTL = int(os.environ.get("ARTIFACT_UPLOAD_TTL", "86400"))  # unfinished uploads expire
 
 count = 0
 last = {}
@@ -41,17 +73,98 @@ telemetry = {
     "profiles": [],
     "event_classes": {},
 }
+_battery_total = 0  # running sum of telemetry["batteries"]
+_contractor_swipes = {}  # contractor_id → {"name", "swipes": [], "invoice_hours"}
+
+# ── Read views ──
+# Readers never touch the mutable globals above. Whoever changes them (the
+# aggregator after each batch, reset, restore, the lazy snapshot loader)
+# calls _publish_view() while holding lock; it builds an immutable ReadView
+# and swaps it in with a single reference assignment. /state, /telemetry,
+# /log, /about and the Alexa intents read `_view` once and get a consistent
+# picture without locking. Response bodies are rendered on first request
+# and cached on the view, so bursts of writes don't pay for serialization.
+class ReadView:
+    def __init__(self, count, last, last_event_time, telemetry, log):
+        self.count = count
+        self.last = last
+        self.last_event_time = last_event_time
+        self.telemetry = MappingProxyType(telemetry)
+        self.log = log
+        self.devices = telemetry["devices"]
+        self.avg_battery = telemetry["avgBattery"]
+
+    @cached_property
+    def state_json(self):
+        return json.dumps({"count": self.count, "last": self.last})
+
+    @cached_property
+    def telemetry_json(self):
+        return json.dumps(dict(self.telemetry))
+
+    @cached_property
+    def log_json(self):
+        return json.dumps(self.log)
+
+def _build_view():
+    batteries = telemetry["batteries"]
+    return ReadView(count, last, last_event_time, {
+        "avgBattery": round(_battery_total / max(1, len(batteries))),
+        "batteryCount": len(batteries),
+        "networks": dict(telemetry["networks"]),
+        "locales": dict(telemetry["locales"]),
+        "devices": telemetry["devices"],
+        "deviceClasses": dict(telemetry["device_classes"]),
+        "tiers": dict(telemetry["tiers"]),
+        "osFamilies": dict(telemetry["os_families"]),
+        "browsers": dict(telemetry["browsers"]),
+        "gpus": dict(telemetry["gpus"]),
+        "timezones": dict(telemetry["timezones"]),
+        "profiles": telemetry["profiles"][-10:],
+        "eventClasses": dict(telemetry["event_classes"]),
+    }, tuple(event_log))
+
+def _publish_view():
+    """Swap in a fresh ReadView. Caller holds lock."""
+    global _view
+    _view = _build_view()
+
+def read_view():
+    return _view
+
+_view = _build_view()
 
 # ── State persistence ──
+# Binary snapshot (see docs/adr/003-binary-snapshot.md): magic, then
+# length-prefixed zlib sections, each with a CRC32, ending in an empty
+# header. "counters" comes first so /readyz can pass as soon as it is read;
+# the remaining sections are merged in by a background thread. The JSON
+# STATE_FILE is still read when no snapshot exists (migration) and written
+# instead of the snapshot when STATE_FORMAT=json.
+_SNAP_MAGIC = b"OHCSNAP\x01"
+_SECTION = struct.Struct(">BIII")  # name length, raw length, compressed length, crc32
+_state_ready = threading.Event()   # counters restored — safe to serve
+_state_loaded = threading.Event()  # every section merged — safe to flush
+
 def _snapshot():
     return {
         "count": count, "last": last, "event_log": event_log,
         "telemetry": telemetry, "last_event_time": last_event_time,
     }
 
+def _snapshot_copy():
+    """_snapshot() with containers copied, so it can be serialized outside lock."""
+    with lock:
+        snap = _snapshot()
+        snap["event_log"] = list(event_log)
+        snap["telemetry"] = {k: (list(v) if isinstance(v, list) else dict(v) if isinstance(v, dict) else v)
+                             for k, v in telemetry.items()}
+    return snap
+
 def _restore(snap):
-    global count, last, last_event_time, event_log, telemetry
+    global count, last, last_event_time, event_log, telemetry, _seq, _battery_total
     count = snap.get("count", 0)
+    _seq = itertools.count(count + 1)
     last = snap.get("last", {})
     last_event_time = snap.get("last_event_time")
     event_log[:] = snap.get("event_log", [])
@@ -65,38 +178,179 @@ def _restore(snap):
                 telemetry[k].update(saved_telem[k])
             else:
                 telemetry[k] = saved_telem[k]
+    _battery_total = sum(telemetry["batteries"])
+    _publish_view()
+
+def _encode_snapshot(snap):
+    """[(section name, raw bytes)] in load order."""
+    telem = snap["telemetry"]
+    batteries = telem.get("batteries", [])
+    return [
+        ("counters", json.dumps({"count": snap["count"], "last": snap["last"],
+                                 "last_event_time": snap["last_event_time"]}).encode()),
+        ("telemetry", json.dumps({k: v for k, v in telem.items()
+                                  if k not in ("batteries", "profiles")}).encode()),
+        ("batteries", struct.pack(f"<{len(batteries)}i", *batteries)),
+        ("profiles", json.dumps(telem.get("profiles", [])).encode()),
+        ("event_log", json.dumps(snap["event_log"]).encode()),
+    ]
+
+def _decode_section(name, raw):
+    if name == "batteries":
+        return list(struct.unpack(f"<{len(raw) // 4}i", raw))
+    return json.loads(raw)
+
+def write_snapshot(path, sections):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_SNAP_MAGIC)
+        for name, raw in sections:
+            comp = zlib.compress(raw, 6)
+            f.write(_SECTION.pack(len(name), len(raw), len(comp), zlib.crc32(comp)))
+            f.write(name.encode())
+            f.write(comp)
+        f.write(_SECTION.pack(0, 0, 0, 0))
+    os.replace(tmp, path)
+
+def read_snapshot(f):
+    """Yield (name, raw bytes) from an open snapshot, one section at a time.
+
+    raw is None when a section fails its checksum; later sections are still
+    readable because every header carries the compressed length.
+    """
+    if f.read(len(_SNAP_MAGIC)) != _SNAP_MAGIC:
+        raise ValueError("not an OHC snapshot")
+    while True:
+        header = f.read(_SECTION.size)
+        if len(header) < _SECTION.size:
+            raise ValueError("truncated snapshot")
+        name_len, raw_len, comp_len, crc = _SECTION.unpack(header)
+        if name_len == 0:
+            return
+        name = f.read(name_len).decode()
+        comp = f.read(comp_len)
+        if len(comp) < comp_len:
+            raise ValueError("truncated section " + name)
+        raw = zlib.decompress(comp) if zlib.crc32(comp) == crc else None
+        if raw is not None and len(raw) != raw_len:
+            raw = None
+        yield name, raw
+
+def _merge_section(name, value):
+    """Fold a lazily loaded section under whatever arrived since startup. Caller holds lock."""
+    global _battery_total
+    if name == "telemetry":
+        for k, v in value.items():
+            if isinstance(telemetry.get(k), dict):
+                for field, n in v.items():
+                    telemetry[k][field] = telemetry[k].get(field, 0) + n
+            elif k in telemetry:
+                telemetry[k] += v
+    elif name == "batteries":
+        telemetry["batteries"][:0] = value
+        _battery_total += sum(value)
+    elif name == "profiles":
+        telemetry["profiles"][:0] = value
+        del telemetry["profiles"][:-50]
+    elif name == "event_log":
+        event_log[:0] = value
+        del event_log[:-200]
+
+def _load_rest(f, sections):
+    epoch = _epoch
+    try:
+        with f:
+            for name, raw in sections:
+                if raw is None:
+                    app.logger.warning("Snapshot section %s failed its checksum — skipped", name)
+                    continue
+                value = _decode_section(name, raw)
+                with lock:
+                    if _epoch != epoch:
+                        return  # reset while loading; the old state is gone
+                    _merge_section(name, value)
+                    _publish_view()
+        app.logger.info("Snapshot fully loaded (count=%d, log=%d)", count, len(event_log))
+    except Exception as e:
+        app.logger.warning("Snapshot load stopped early: %s", e)
+    finally:
+        _state_loaded.set()
 
 def load_state():
+    global count, last, last_event_time, _seq
+    if STATE_FORMAT != "json" or not os.path.exists(STATE_FILE):
+        try:
+            f = open(SNAPSHOT_FILE, "rb")
+            try:
+                sections = read_snapshot(f)
+                name, raw = next(sections)
+                if name != "counters" or raw is None:
+                    raise ValueError("counters section missing or corrupt")
+            except Exception:
+                f.close()
+                raise
+            c = json.loads(raw)
+            count = c.get("count", 0)
+            _seq = itertools.count(count + 1)
+            last = c.get("last", {})
+            last_event_time = c.get("last_event_time")
+            with lock:
+                _publish_view()
+            _state_ready.set()
+            threading.Thread(target=_load_rest, args=(f, sections), daemon=True).start()
+            app.logger.info("Restored counters from %s (count=%d); loading the rest in background",
+                            SNAPSHOT_FILE, count)
+            return
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            app.logger.warning("Failed to load snapshot %s: %s — trying %s", SNAPSHOT_FILE, e, STATE_FILE)
     try:
         with open(STATE_FILE, "r") as f:
-            _restore(json.load(f))
+            snap = json.load(f)
+        telem = snap.get("telemetry", {})
+        if telem.get("batteries"):
+            # May predate clamping in _aggregate; the snapshot packs these as int32.
+            telem["batteries"] = [min(100, max(0, int(b))) for b in telem["batteries"]]
+        _restore(snap)
         app.logger.info("Restored state from %s (count=%d)", STATE_FILE, count)
     except FileNotFoundError:
         app.logger.info("No state file at %s — starting fresh", STATE_FILE)
     except Exception as e:
         app.logger.warning("Failed to load state: %s — starting fresh", e)
+    _state_ready.set()
+    _state_loaded.set()
 
 def flush_state():
+    if not _state_loaded.wait(30):
+        app.logger.warning("Skipping flush: snapshot still loading")
+        return
     try:
-        os.makedirs(os.path.dirname(STATE_FILE) or ".", exist_ok=True)
-        tmp = STATE_FILE + ".tmp"
-        with open(tmp, "w") as f:
-            json.dump(_snapshot(), f)
-        os.replace(tmp, STATE_FILE)
+        snap = _snapshot_copy()
+        if STATE_FORMAT == "json":
+            os.makedirs(os.path.dirname(STATE_FILE) or ".", exist_ok=True)
+            tmp = STATE_FILE + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(snap, f)
+            os.replace(tmp, STATE_FILE)
+            return
+        os.makedirs(os.path.dirname(SNAPSHOT_FILE) or ".", exist_ok=True)
+        write_snapshot(SNAPSHOT_FILE, _encode_snapshot(snap))
+        if os.path.exists(STATE_FILE):
+            # One-way migration: keep the JSON for rollback, out of the load path
+            os.replace(STATE_FILE, STATE_FILE + ".migrated")
     except Exception as e:
         app.logger.warning("Failed to flush state: %s", e)
 
 def _flush_loop():
     while True:
         threading.Event().wait(FLUSH_INTERVAL)
-        with lock:
-            flush_state()
+        flush_state()
 
 _flush_thread = threading.Thread(target=_flush_loop, daemon=True)
 
 def _shutdown_flush(*_):
-    with lock:
-        flush_state()
+    flush_state()
     app.logger.info("State flushed on shutdown")
 
 atexit.register(_shutdown_flush)
@@ -109,10 +363,128 @@ def add_cors(resp):
     return resp
 
 def publish(event):
+    publish_many([event])
+
+def publish_many(events):
     with lock:
-        for q in list(subscribers):
+        subs = list(subscribers)
+    for q in subs:
+        for event in events:
             q.put(event)
 
+# ── CloudEvent id dedupe ──
+# Retries from relays and flaky phone Wi-Fi resend the same (source, id).
+# Ids live in time buckets covering DEDUPE_WINDOW; whole buckets expire at
+# once and the oldest is dropped early if DEDUPE_MAX_IDS would be exceeded.
+_DEDUPE_BUCKETS = 6
+_dedupe_buckets = deque()  # (bucket_start, set of keys), oldest first
+_dedupe_size = 0
+_dedupe_lock = threading.Lock()
+_dedupe_stats = {"checked": 0, "duplicates": 0}
+
+def is_duplicate(data):
+    """True if this event's (source, id) was already seen inside the window."""
+    global _dedupe_size
+    evt_id = data.get("id") if DEDUPE_WINDOW > 0 else None
+    if not evt_id:
+        return False
+    key = (data.get("source", ""), evt_id)
+    now = time.time()
+    width = DEDUPE_WINDOW / _DEDUPE_BUCKETS
+    with _dedupe_lock:
+        _dedupe_stats["checked"] += 1
+        while _dedupe_buckets and (_dedupe_buckets[0][0] + width < now - DEDUPE_WINDOW
+                                   or _dedupe_size >= DEDUPE_MAX_IDS):
+            _dedupe_size -= len(_dedupe_buckets.popleft()[1])
+        for _, ids in _dedupe_buckets:
+            if key in ids:
+                _dedupe_stats["duplicates"] += 1
+                return True
+        if not _dedupe_buckets or _dedupe_buckets[-1][0] + width <= now:
+            _dedupe_buckets.append((now, set()))
+        _dedupe_buckets[-1][1].add(key)
+        _dedupe_size += 1
+    return False
+
+def forget_duplicate(data):
+    """Un-mark an id is_duplicate() just recorded, e.g. because the event was refused with a 429."""
+    global _dedupe_size
+    evt_id = data.get("id") if DEDUPE_WINDOW > 0 else None
+    if not evt_id:
+        return
+    key = (data.get("source", ""), evt_id)
+    with _dedupe_lock:
+        for _, ids in reversed(_dedupe_buckets):
+            if key in ids:
+                ids.discard(key)
+                _dedupe_size -= 1
+                return
+
+def _dedupe_summary():
+    with _dedupe_lock:
+        checked, dups = _dedupe_stats["checked"], _dedupe_stats["duplicates"]
+        return {"windowS": DEDUPE_WINDOW, "ids": _dedupe_size, "checked": checked,
+                "duplicates": dups, "duplicateRate": round(dups / max(1, checked), 4)}
+
+# ── Ingest admission control ──
+# At most `limit` ingests run at once and at most INGEST_MAX_QUEUE wait for a
+# slot; everything beyond that gets 429 + Retry-After straight away, so a
+# QR-scan stampede can't starve /state, /telemetry and /events of threads.
+# The limit adapts AIMD-style on how long events wait in _ingest_q before
+# the aggregator applies them (the request itself only enqueues): it shrinks
+# while that delay's EWMA is over INGEST_TARGET_MS and grows back while
+# requests are queueing under it.
+_admission_cv = threading.Condition()
+_admission = {"limit": INGEST_MAX_INFLIGHT, "inflight": 0, "waiting": 0, "ewma_ms": 0.0, "delay_ms": 0.0,
+              "admitted": 0, "rejected": 0}
+
+def admit():
+    """Claim an ingest slot; False means the caller should answer 429."""
+    a = _admission
+    with _admission_cv:
+        if a["inflight"] >= a["limit"]:
+            if a["waiting"] >= INGEST_MAX_QUEUE:
+                a["rejected"] += 1
+                return False
+            a["waiting"] += 1
+            deadline = time.monotonic() + INGEST_QUEUE_TIMEOUT
+            while a["inflight"] >= a["limit"]:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                _admission_cv.wait(remaining)
+            a["waiting"] -= 1
+            if a["inflight"] >= a["limit"]:
+                a["rejected"] += 1
+                return False
+        a["inflight"] += 1
+        a["admitted"] += 1
+        return True
+
+def observe_delay(delay_s):
+    """Aggregator: how long the oldest event in a batch took from submit() to applied."""
+    with _admission_cv:
+        _admission["delay_ms"] = delay_s * 1000
+        _admission["ewma_ms"] = 0.9 * _admission["ewma_ms"] + 0.1 * delay_s * 1000
+
+def release():
+    a = _admission
+    with _admission_cv:
+        a["inflight"] -= 1
+        if a["ewma_ms"] > INGEST_TARGET_MS:
+            a["limit"] = max(INGEST_MIN_INFLIGHT, int(a["limit"] * 0.9))
+        elif a["waiting"] and a["limit"] < INGEST_MAX_INFLIGHT:
+            a["limit"] += 1
+        _admission_cv.notify()
+
+def _retry_after():
+    # Roughly how long what's queued now takes to be applied: the latest
+    # batch's delay, not the EWMA, which lags a queue that just filled up.
+    return max(1, round(_admission["delay_ms"] / 1000))
+
+def _admission_summary():
+    with _admission_cv:
+        return {k: round(v, 2) if isinstance(v, float) else v for k, v in _admission.items()}
 
 @app.route("/assets/<path:filename>")
 def assets(filename):
@@ -124,34 +496,118 @@ def assets(filename):
 def state():
     if request.method == "OPTIONS":
         return add_cors(Response(status=204))
-    return add_cors(Response(
-        json.dumps({"count": count, "last": last}),
-        mimetype="application/json"
-    ))
+    return add_cors(Response(_view.state_json, mimetype="application/json"))
 
 @app.route("/ingest", methods=["POST","OPTIONS"])
 def ingest():
-    global count, last, last_event_time
     if request.method == "OPTIONS":
         return add_cors(Response(status=204))
+    if not admit():
+        resp = Response(json.dumps({"ok": False, "error": "busy"}), status=429,
+                        mimetype="application/json")
+        resp.headers["Retry-After"] = str(_retry_after())
+        return add_cors(resp)
+    try:
+        return _ingest()
+    finally:
+        release()
+
+def _ingest():
+    data = request.get_json(silent=True)
+    if data is None:
+        data = {}
+    if isinstance(data, list):
+        return _ingest_many(data)
+    if not isinstance(data, dict):
+        return add_cors(Response(json.dumps({"ok": False, "error": "expected a JSON object"}),
+                                 status=400, mimetype="application/json"))
+    if is_duplicate(data):
+        return add_cors(Response(
+            json.dumps({"ok": True, "count": _view.count, "duplicate": True}),
+            mimetype="application/json"
+        ))
+    try:
+        evt = submit(data, block=False)
+    except queue.Full:
+        forget_duplicate(data)  # the retry must not be taken for a duplicate
+        resp = Response(json.dumps({"ok": False, "error": "busy"}), status=429,
+                        mimetype="application/json")
+        resp.headers["Retry-After"] = str(_retry_after())
+        return add_cors(resp)
+    return add_cors(Response(
+        json.dumps({"ok": True, "count": evt["count"]}),
+        mimetype="application/json"
+    ))
 
-    data = request.get_json(silent=True) or {}
-    count += 1
-    last_event_time = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
-    last = {
-        "ts": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
-        "payload": data,
-        "count": count
-    }
-
-    publish(last)
+def _ingest_many(events):
+    """A JSON array of events in one POST: one admission slot, one response."""
+    if not events or len(events) > INGEST_MAX_EVENTS or not all(isinstance(e, dict) for e in events):
+        return add_cors(Response(json.dumps({
+            "ok": False, "error": f"expected 1-{INGEST_MAX_EVENTS} JSON objects"}),
+            status=400, mimetype="application/json"))
+    if INGEST_QUEUE_MAX > 0 and INGEST_QUEUE_MAX - _ingest_q.qsize() < len(events):
+        resp = Response(json.dumps({"ok": False, "error": "busy", "accepted": 0}), status=429,
+                        mimetype="application/json")
+        resp.headers["Retry-After"] = str(_retry_after())
+        return add_cors(resp)
+    accepted = duplicates = 0
+    count = _view.count
+    for data in events:
+        if is_duplicate(data):
+            duplicates += 1
+            continue
+        try:
+            count = submit(data, block=False)["count"]
+        except queue.Full:
+            # Raced another writer for the last slots; the sender retries the
+            # rest (with DEDUPE_WINDOW on, the accepted ones are skipped). This
+            # one was never enqueued, so it mustn't be skipped.
+            forget_duplicate(data)
+            resp = Response(json.dumps({"ok": False, "error": "busy", "accepted": accepted}),
+                            status=429, mimetype="application/json")
+            resp.headers["Retry-After"] = str(_retry_after())
+            return add_cors(resp)
+        accepted += 1
+    return add_cors(Response(
+        json.dumps({"ok": True, "count": count, "accepted": accepted, "duplicates": duplicates}),
+        mimetype="application/json"
+    ))
 
-    event_log.append(last)
-    if len(event_log) > 200:
-        event_log.pop(0)
+# ── Ingest pipeline ──
+# Request threads only validate, take a count from _seq and enqueue. One
+# aggregator thread drains _ingest_q in batches and is the only writer of
+# count/last/event_log/telemetry outside reset and restore, so the lock is
+# taken once per batch instead of once per event. Queue items carry the
+# reset epoch they were submitted in; anything queued before a reset is
+# dropped instead of resurrecting old counts. They also carry their submit
+# time, which admission control adapts on.
+_ingest_q = queue.Queue(maxsize=INGEST_QUEUE_MAX)
+_seq = itertools.count(1)
+_epoch = 0
+
+def _now():
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+def submit(payload, block=True):
+    """Number a payload and hand it to the aggregator; returns the event.
+
+    Raises queue.Full when block is False and the aggregator is behind by
+    INGEST_QUEUE_MAX events.
+    """
+    # Epoch first: reset_all() swaps _seq before bumping _epoch, so an event
+    # tagged with the new epoch can't carry a count from the old sequence.
+    # One that races the reset the other way is tagged old and dropped.
+    epoch = _epoch
+    evt = {"ts": _now(), "payload": payload, "count": next(_seq)}
+    _ingest_q.put((epoch, time.monotonic(), evt), block=block)
+    return evt
 
-    # Telemetry aggregation
+def _aggregate(data):
+    """Fold one event payload into telemetry. Caller holds lock."""
+    global _battery_total
     payload = data.get("data", data.get("payload", data))
+    if not isinstance(payload, dict):
+        payload = {}
     evt_type = data.get("type", "")
     evt_class = data.get("eventclass", "")
     if evt_class:
@@ -159,8 +615,11 @@ def ingest():
 
     if "telemetry.battery" in evt_type or "telemetry.power_state" in evt_type:
         try:
-            level = int(payload.get("batteryPct", payload.get("level", 0)))
+            # Clamped: the snapshot packs batteries as int32, and one bogus
+            # reading must not stop state from ever being saved again.
+            level = min(100, max(0, int(payload.get("batteryPct", payload.get("level", 0)))))
             telemetry["batteries"].append(level)
+            _battery_total += level
         except Exception:
             pass
 
@@ -201,25 +660,72 @@ def ingest():
         if len(telemetry["profiles"]) > 50:
             telemetry["profiles"].pop(0)
 
-    return add_cors(Response(
-        json.dumps({"ok": True, "count": count}),
-        mimetype="application/json"
-    ))
+def _apply_batch(batch):
+    """Apply queued (epoch, submit time, event) items; returns the events that were kept."""
+    global count, last, last_event_time
+    with lock:
+        kept = [evt for epoch, _, evt in batch if epoch == _epoch]
+        for evt in kept:
+            _aggregate(evt["payload"])
+            event_log.append(evt)
+            if evt["count"] > count:
+                count = evt["count"]
+        if kept:
+            last = kept[-1]
+            last_event_time = last["ts"]
+            del event_log[:-200]
+            _publish_view()
+    return kept
+
+def _aggregator_loop():
+    while True:
+        batch = [_ingest_q.get()]
+        try:
+            while len(batch) < INGEST_BATCH:
+                batch.append(_ingest_q.get_nowait())
+        except queue.Empty:
+            pass
+        try:
+            publish_many(_apply_batch(batch))
+        except Exception as e:
+            app.logger.warning("Aggregator dropped a batch of %d: %s", len(batch), e)
+        observe_delay(time.monotonic() - batch[0][1])
+
+_aggregator_thread = threading.Thread(target=_aggregator_loop, daemon=True)
 
 
+def _missed_since(last_event_id):
+    """Events from the log newer than a client's Last-Event-ID (SSE ids are event counts)."""
+    try:
+        last_id = int(last_event_id)
+    except (TypeError, ValueError):
+        return []
+    v = _view
+    if last_id >= v.count:
+        return []  # up to date, or ahead of us after a reset — nothing to replay
+    return [e for e in v.log if e.get("count", 0) > last_id]
 
 @app.route("/events")
 def events():
+    # Subscribe before reading the log so nothing slips between replay and live.
     q = queue.Queue()
     with lock:
         subscribers.append(q)
+    missed = _missed_since(request.headers.get("Last-Event-ID") or request.args.get("lastEventId"))
 
     def stream():
+        replayed = {e["count"] for e in missed}
         try:
+            for event in missed:
+                yield f"id: {event['count']}\ndata: {json.dumps(event)}\n\n"
             while True:
                 try:
                     event = q.get(timeout=15)
-                    yield f"data: {json.dumps(event)}\n\n"
+                    if replayed:
+                        if event.get("count") in replayed:
+                            continue
+                        replayed = None
+                    yield f"id: {event.get('count', '')}\ndata: {json.dumps(event)}\n\n"
                 except queue.Empty:
                     # SSE heartbeat (comment)
                     yield ": keepalive\n\n"
@@ -237,26 +743,11 @@ def events():
 
 @app.get("/telemetry")
 def get_telemetry():
-    avg_battery = round(sum(telemetry["batteries"]) / max(1, len(telemetry["batteries"])))
-    return add_cors(Response(json.dumps({
-        "avgBattery": avg_battery,
-        "batteryCount": len(telemetry["batteries"]),
-        "networks": telemetry["networks"],
-        "locales": telemetry["locales"],
-        "devices": telemetry["devices"],
-        "deviceClasses": telemetry["device_classes"],
-        "tiers": telemetry["tiers"],
-        "osFamilies": telemetry["os_families"],
-        "browsers": telemetry["browsers"],
-        "gpus": telemetry["gpus"],
-        "timezones": telemetry["timezones"],
-        "profiles": telemetry["profiles"][-10:],
-        "eventClasses": telemetry["event_classes"],
-    }), mimetype="application/json"))
+    return add_cors(Response(_view.telemetry_json, mimetype="application/json"))
 
 @app.get("/log")
 def event_log_view():
-    return add_cors(Response(json.dumps(event_log), mimetype="application/json"))
+    return add_cors(Response(_view.log_json, mimetype="application/json"))
 
 @app.get("/pod-name")
 def pod_name():
@@ -319,18 +810,21 @@ def about():
     uptime_s = int(time.time() - _start_time)
     h, rem = divmod(uptime_s, 3600)
     m, s = divmod(rem, 60)
-    with lock:
-        sse_clients = len(subscribers)
+    v = _view
     return add_cors(Response(json.dumps({
         "version": _build_version,
         "commit": _git_commit,
         "pod": POD_NAME,
         "uptime": f"{h}h {m}m {s}s",
         "uptimeSeconds": uptime_s,
-        "eventsProcessed": count,
-        "lastEventTime": last_event_time,
-        "sseClients": sse_clients,
-        "stateFile": STATE_FILE,
+        "eventsProcessed": v.count,
+        "lastEventTime": v.last_event_time,
+        "sseClients": len(subscribers),
+        "stateFile": STATE_FILE if STATE_FORMAT == "json" else SNAPSHOT_FILE,
+        "stateLoaded": _state_loaded.is_set(),
+        "dedupe": _dedupe_summary(),
+        "admission": _admission_summary(),
+        "ingestMaxEvents": INGEST_MAX_EVENTS,  # /ingest takes JSON arrays; relays check for this
     }), mimetype="application/json"))
 
 @app.get("/about-panel")
@@ -343,7 +837,7 @@ def healthz():
 
 @app.get("/readyz")
 def readyz():
-    ready = count >= 0  # always ready once loaded
+    ready = _state_ready.is_set()  # counters restored; log and profiles may still be loading
     return Response("ready" if ready else "not ready",
                     status=200 if ready else 503,
                     mimetype="text/plain")
@@ -377,10 +871,18 @@ def short_url_list():
 
 @app.post("/reset")
 def reset_state():
-    global count, last
+    reset_all()
+    return add_cors(Response(json.dumps({"ok": True, "reset": True}), mimetype="application/json"))
+
+def reset_all():
+    """Zero every counter and delete the state file (shared with Alexa)."""
+    global count, last, last_event_time, _seq, _epoch, _battery_total
     with lock:
+        _seq = itertools.count(1)
+        _epoch += 1  # after the swap; see submit()
         count = 0
         last = {}
+        last_event_time = None
         event_log.clear()
         for k in telemetry:
             if isinstance(telemetry[k], list):
@@ -389,56 +891,135 @@ def reset_state():
                 telemetry[k].clear()
             else:
                 telemetry[k] = 0
-        try:
-            os.remove(STATE_FILE)
-        except FileNotFoundError:
-            pass
-    return add_cors(Response(json.dumps({"ok": True, "reset": True}), mimetype="application/json"))
+        _battery_total = 0
+        _publish_view()
+        for path in (STATE_FILE, SNAPSHOT_FILE):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
 
 # ── Helper: emit a typed CloudEvent into the pipeline ──
 def _emit(event_type, event_class, source, data):
-    global count, last, last_event_time
-    ts = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
-    with lock:
-        count += 1
-        last_event_time = ts
-        payload = {"type": event_type, "eventclass": event_class, "source": source, "data": data}
-        evt = {"ts": ts, "payload": payload, "count": count}
-        last = evt
-        event_log.append(evt)
-        if len(event_log) > 200:
-            event_log.pop(0)
-        telemetry["event_classes"][event_class] = telemetry["event_classes"].get(event_class, 0) + 1
-    publish(evt)
-    return evt
-
-# ── Contractor Overcharge State ──
-_contractor_swipes = {}  # contractor_id → {"name", "swipes": [], "invoice_hours"}
+    payload = {"type": event_type, "eventclass": event_class, "source": source, "data": data}
+    return submit(payload)
+
+# ── Scenario scheduler ──
+# Scenarios are data: a list of steps, each (delay, event_type, event_class,
+# source, data) where delay is a multiple of the run's delay_s measured from
+# the previous step. One scheduler thread drives every run off a heap, so
+# concurrent presenters cost heap entries instead of sleeping threads.
+SCENARIOS = {
+    # #42: 3D-GRC Kill Chain
+    "grc-killchain": [
+        (0, "ohc.demo.grc.badge_anomaly", "ohc.demo.grc", "alertenterprise-pacs",
+         {"badge_id": "C-4471", "cardholder": "Contractor — Alex R.",
+          "reader": "Server Room North", "anomaly": "cloned_badge",
+          "flagged_by": "AlertEnterprise PACS", "confidence": 0.97}),
+        (1, "ohc.demo.grc.it_lateral", "ohc.demo.grc", "sap-grc",
+         {"source_ip": "10.12.44.71", "target": "SAP HANA DB",
+          "credential": "svc-erp-admin", "erp_user": "C-4471-SVC",
+          "correlated_badge": "C-4471", "sap_grc_alert": "AUT-2026-8812"}),
+        (1, "ohc.demo.grc.ot_lockdown", "ohc.demo.grc", "ansible-automation",
+         {"triggered_by": "SAP GRC + AlertEnterprise correlation",
+          "scope": "OT Zone B — PLCs 12–19", "method": "Ansible playbook",
+          "playbook": "ot-emergency-lockdown.yml", "plcs_isolated": 8, "latency_ms": 312}),
+    ],
+}
 
-# ── #42: 3D-GRC Kill Chain Scenario ──
-@app.post("/scenario/grc-killchain")
-def grc_killchain_scenario():
+_sched_heap = []         # (due_monotonic, seq, run_id, step_index)
+_sched_runs = {}         # run_id → {"name", "delay_s", "started"}
+_sched_cv = threading.Condition()
+_sched_seq = 0
+_sched_jitter = deque(maxlen=500)  # recent lateness samples, seconds
+_sched_stats = {"runs": 0, "steps": 0, "cancelled": 0}
+
+def schedule_scenario(name, delay_s):
+    """Queue every step of SCENARIOS[name]; returns the run id."""
+    global _sched_seq
+    steps = SCENARIOS[name]
+    run_id = uuid.uuid4().hex[:12]
+    with _sched_cv:
+        _sched_runs[run_id] = {"name": name, "delay_s": delay_s, "started": time.time(),
+                               "remaining": len(steps)}
+        due = time.monotonic()
+        for i, step in enumerate(steps):
+            due += step[0] * delay_s
+            _sched_seq += 1
+            heapq.heappush(_sched_heap, (due, _sched_seq, run_id, i))
+        _sched_stats["runs"] += 1
+        _sched_cv.notify()
+    return run_id
+
+def cancel_scenario(run_id):
+    # Heap entries for a cancelled run are dropped lazily when they surface
+    with _sched_cv:
+        run = _sched_runs.pop(run_id, None)
+        if run:
+            _sched_stats["cancelled"] += 1
+    return run is not None
+
+def _scheduler_loop():
+    while True:
+        with _sched_cv:
+            while True:
+                if _sched_heap:
+                    wait = _sched_heap[0][0] - time.monotonic()
+                    if wait <= 0:
+                        break
+                    _sched_cv.wait(wait)
+                else:
+                    _sched_cv.wait()
+            due, _, run_id, i = heapq.heappop(_sched_heap)
+            run = _sched_runs.get(run_id)
+            if run is None:
+                continue
+            run["remaining"] -= 1
+            if run["remaining"] == 0:
+                del _sched_runs[run_id]
+            _sched_jitter.append(time.monotonic() - due)
+            _sched_stats["steps"] += 1
+            _, event_type, event_class, source, data = SCENARIOS[run["name"]][i]
+        try:
+            _emit(event_type, event_class, source, dict(data, scenario_run=run_id))
+        except Exception as e:
+            app.logger.warning("Scenario %s step %d failed: %s", run_id, i, e)
+
+_scheduler_thread = threading.Thread(target=_scheduler_loop, daemon=True)
+
+def _jitter_summary():
+    samples = sorted(_sched_jitter)
+    if not samples:
+        return {"samples": 0}
+    pick = lambda q: round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000, 2)
+    return {"samples": len(samples), "p50_ms": pick(0.50), "p99_ms": pick(0.99),
+            "max_ms": round(samples[-1] * 1000, 2)}
+
+@app.post("/scenario/<name>")
+def run_scenario(name):
+    if name not in SCENARIOS:
+        return add_cors(Response(json.dumps({"ok": False, "error": "Unknown scenario " + name}),
+                                 status=404, mimetype="application/json"))
     body = request.get_json(silent=True) or {}
     delay = max(0.5, min(float(body.get("delay_s", 3)), 10.0))
-    def run():
-        _emit("ohc.demo.grc.badge_anomaly", "ohc.demo.grc", "alertenterprise-pacs",
-              {"badge_id": "C-4471", "cardholder": "Contractor — Alex R.",
-               "reader": "Server Room North", "anomaly": "cloned_badge",
-               "flagged_by": "AlertEnterprise PACS", "confidence": 0.97})
-        time.sleep(delay)
-        _emit("ohc.demo.grc.it_lateral", "ohc.demo.grc", "sap-grc",
-              {"source_ip": "10.12.44.71", "target": "SAP HANA DB",
-               "credential": "svc-erp-admin", "erp_user": "C-4471-SVC",
-               "correlated_badge": "C-4471", "sap_grc_alert": "AUT-2026-8812"})
-        time.sleep(delay)
-        _emit("ohc.demo.grc.ot_lockdown", "ohc.demo.grc", "ansible-automation",
-              {"triggered_by": "SAP GRC + AlertEnterprise correlation",
-               "scope": "OT Zone B — PLCs 12–19", "method": "Ansible playbook",
-               "playbook": "ot-emergency-lockdown.yml", "plcs_isolated": 8, "latency_ms": 312})
-    threading.Thread(target=run, daemon=True).start()
-    return add_cors(Response(json.dumps({"ok": True, "scenario": "grc-killchain", "delay_s": delay}),
+    run_id = schedule_scenario(name, delay)
+    return add_cors(Response(json.dumps({"ok": True, "scenario": name, "delay_s": delay, "run_id": run_id}),
                              mimetype="application/json"))
 
+@app.post("/scenario/cancel/<run_id>")
+def cancel_scenario_run(run_id):
+    ok = cancel_scenario(run_id)
+    return add_cors(Response(json.dumps({"ok": ok, "run_id": run_id}),
+                             status=200 if ok else 404, mimetype="application/json"))
+
+@app.get("/scenarios")
+def scenarios():
+    with _sched_cv:
+        active = [{"run_id": k, **v} for k, v in _sched_runs.items()]
+        body = {"scenarios": sorted(SCENARIOS), "active": active, "pending_steps": len(_sched_heap),
+                **_sched_stats, "jitter": _jitter_summary()}
+    return add_cors(Response(json.dumps(body), mimetype="application/json"))
+
 @app.get("/present-grc")
 def present_grc():
     return send_from_directory("/stage", "present-grc-killchain.html")
@@ -628,50 +1209,451 @@ def present_job_coach():
 
 @app.post("/piport/idoc")
 def piport_idoc():
-    global count, last, last_event_time
     data = request.get_json(silent=True) or {}
     idoc_type = data.get("idoc_type", "MBGMCR002")
     plant = data.get("plant", "PLANT_01")
     material = data.get("material", "MAT-00001")
     quantity = data.get("quantity", 1)
 
-    event = {
-        "ts": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
-        "payload": {
-            "type": "ohc.demo.piport.idoc_goods_receipt",
-            "eventclass": "ohc.demo.piport",
-            "source": "pi-po-migration-factory",
-            "data": {
-                "idoc_type": idoc_type,
-                "plant": plant,
-                "material": material,
-                "quantity": quantity,
-                "routing_path": "PI/PO → EIC → S/4HANA",
-                "eic_endpoint": "eic.ohc.demo.local",
-                "s4_confirmation": "GR-" + datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S"),
-                "latency_ms": 142,
-            }
+    payload = {
+        "type": "ohc.demo.piport.idoc_goods_receipt",
+        "eventclass": "ohc.demo.piport",
+        "source": "pi-po-migration-factory",
+        "data": {
+            "idoc_type": idoc_type,
+            "plant": plant,
+            "material": material,
+            "quantity": quantity,
+            "routing_path": "PI/PO → EIC → S/4HANA",
+            "eic_endpoint": "eic.ohc.demo.local",
+            "s4_confirmation": "GR-" + datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S"),
+            "latency_ms": 142,
         }
     }
-    event["payload"]["type"] = "ohc.demo.piport.idoc_goods_receipt"
-
-    with lock:
-        count += 1
-        last_event_time = event["ts"]
-        event["count"] = count
-        last = {"ts": event["ts"], "payload": event["payload"], "count": count}
-        event_log.append(last)
-        if len(event_log) > 200:
-            event_log.pop(0)
-        ec = "ohc.demo.piport"
-        telemetry["event_classes"][ec] = telemetry["event_classes"].get(ec, 0) + 1
-
-    publish(last)
+    submit(payload)
     return add_cors(Response(
-        json.dumps({"ok": True, "idoc_type": idoc_type, "s4_confirmation": event["payload"]["data"]["s4_confirmation"]}),
+        json.dumps({"ok": True, "idoc_type": idoc_type, "s4_confirmation": payload["data"]["s4_confirmation"]}),
         mimetype="application/json"
     ))
 
+# ── Artifacts ──
+# Receiving end of transport/send-artifacts.py; receive-artifacts.py reads
+# the same URLs back. A set lives at /artifacts/<set>. File contents are
+# stored once under ARTIFACT_DIR/blobs by sha256, whichever set or name they
+# came in under; delta-mode chunks go to chunks/, resumable uploads sit in
+# uploads/ until completed, and each set's manifest in sets/<set>/. Files
+# are served as redirects to immutable blob URLs so any cache in front of
+# north can keep them.
+_SHA_RE = re.compile(r"^[0-9a-f]{64}$")
+_SET_RE = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+_UPLOAD_RE = re.compile(r"^[0-9a-f]{32}$")
+_ARTIFACT_BLOCK = 1024 * 1024
+_CHUNK_MAX = 1024 * 1024
+_artifact_lock = threading.Lock()
+_uploads_busy = set()   # upload ids with a part being written
+_manifests = {}         # set → (mtime, parsed manifest)
+_store_used = None      # bytes counted against ARTIFACT_STORE_MB; walked once, then kept up to date
+_DECODE_ERRORS = (zlib.error, zstandard.ZstdError) if zstandard else (zlib.error,)
+
+def _art(*parts):
+    return os.path.join(ARTIFACT_DIR, *parts)
+
+def _blob(sha):
+    return _art("blobs", sha[:2], sha)
+
+def _chunk(sha):
+    return _art("chunks", sha[:2], sha)
+
+def _art_json(obj, status=200):
+    return Response(json.dumps(obj), status=status, mimetype="application/json")
+
+def _art_tmp():
+    os.makedirs(_art("tmp"), exist_ok=True)
+    return _art("tmp", uuid.uuid4().hex)
+
+def _hash_file(path):
+    h, n = hashlib.sha256(), 0
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_ARTIFACT_BLOCK), b""):
+            h.update(block)
+            n += len(block)
+    return h.hexdigest(), n
+
+def _keep(tmp, dest):
+    """Move a verified temp file into the store; an existing copy wins (same content)."""
+    if os.path.exists(dest):
+        _store_remove(tmp)
+    else:
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        os.replace(tmp, dest)
+
+def _copy_stream(src, f, limit):
+    n = 0
+    for block in iter(lambda: src.read(_ARTIFACT_BLOCK), b""):
+        n += len(block)
+        if n > limit:
+            raise ValueError("too large")
+        f.write(block)
+    return n
+
+def _walk_store():
+    used = 0
+    for sub in ("blobs", "chunks", "uploads", "tmp"):
+        for root, _, files in os.walk(_art(sub)):
+            for f in files:
+                if not f.endswith(".json"):
+                    try:
+                        used += os.path.getsize(os.path.join(root, f))
+                    except FileNotFoundError:
+                        pass
+    return used
+
+def _store_add(n):
+    """Count n bytes written to the store (negative: removed); returns the bytes in use.
+
+    The store is walked on first use only; after that every write and delete
+    goes through here, so a delta push doesn't stat the whole store per chunk.
+    """
+    global _store_used
+    with _artifact_lock:
+        if _store_used is None:
+            _store_used = _walk_store()
+        _store_used += n
+        return _store_used
+
+def _store_remove(path):
+    size = os.path.getsize(path)
+    os.unlink(path)
+    _store_add(-size)
+
+def _store_free():
+    """Bytes left under ARTIFACT_STORE_MB (blobs, chunks, unfinished uploads and temp files)."""
+    return ARTIFACT_STORE_MB * 1024 * 1024 - _store_add(0)
+
+def _store_full():
+    return _art_json({"ok": False, "error": f"artifact store full ({ARTIFACT_STORE_MB} MB)"}, 507)
+
+def _decoded(src, encoding):
+    """Yield the decoded contents of src in blocks of at most _ARTIFACT_BLOCK bytes, however well it compressed."""
+    if encoding == "zstd":
+        reader = zstandard.ZstdDecompressor().stream_reader(src)
+        yield from iter(lambda: reader.read(_ARTIFACT_BLOCK), b"")
+        return
+    d = zlib.decompressobj(31)
+    for block in iter(lambda: src.read(_ARTIFACT_BLOCK), b""):
+        while True:
+            data = d.decompress(block, _ARTIFACT_BLOCK)
+            if data:
+                yield data
+            block = d.unconsumed_tail
+            if not block and len(data) < _ARTIFACT_BLOCK:
+                break
+    yield d.flush()
+
+def _safe_rel(rel):
+    parts = rel.split("/")
+    return bool(rel) and not rel.startswith("/") and ".." not in parts and "" not in parts \
+        and rel != "manifest.json"
+
+def _artifact_route(fn):
+    """Validate the set name and, for writes, ARTIFACT_TOKEN (no token configured: no writes)."""
+    @wraps(fn)
+    def wrapper(name, *args, **kwargs):
+        if not _SET_RE.match(name):
+            return _art_json({"ok": False, "error": "bad set name"}, 400)
+        if request.method not in ("GET", "HEAD"):
+            if not ARTIFACT_TOKEN:
+                return _art_json({"ok": False, "error": "uploads disabled (ARTIFACT_TOKEN not set)"}, 403)
+            if request.headers.get("Authorization") != f"Bearer {ARTIFACT_TOKEN}":
+                return _art_json({"ok": False, "error": "unauthorized"}, 401)
+        return fn(name, *args, **kwargs)
+    return wrapper
+
+def _load_manifest(name):
+    path = _art("sets", name, "manifest.json")
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached = _manifests.get(name)
+    if not cached or cached[0] != mtime:
+        with open(path) as f:
+            cached = _manifests[name] = (mtime, json.load(f))
+    return cached[1]
+
+def _assemble(chunks, sha):
+    """Build a blob from stored chunks; returns False if any chunk is missing or the digest is wrong."""
+    if not all(isinstance(c, list) and c and _SHA_RE.match(str(c[0])) and os.path.exists(_chunk(c[0]))
+               for c in chunks):
+        return False
+    tmp, h, room = _art_tmp(), hashlib.sha256(), _store_free()
+    try:
+        with open(tmp, "wb") as out:
+            for c in chunks:
+                with open(_chunk(c[0]), "rb") as f:
+                    data = f.read()
+                room -= len(data)
+                if room < 0:
+                    break
+                out.write(data)
+                h.update(data)
+    finally:
+        _store_add(os.path.getsize(tmp))
+    if room < 0 or h.hexdigest() != sha:
+        _store_remove(tmp)
+        return False
+    _keep(tmp, _blob(sha))
+    return True
+
+def _expire_uploads():
+    cutoff = time.time() - ARTIFACT_UPLOAD_TTL
+    for entry in os.scandir(_art("uploads")):
+        if entry.name.endswith(".json") and entry.stat().st_mtime < cutoff:
+            for p, remove in ((entry.path, os.unlink), (entry.path[:-5], _store_remove)):
+                try:
+                    remove(p)
+                except FileNotFoundError:
+                    pass
+
+@app.get("/artifacts/<name>/capabilities")
+@_artifact_route
+def artifact_capabilities(name):
+    return _art_json({"delta": True, "encodings": ["zstd", "gzip"] if zstandard else ["gzip"],
+                      "max_mb": ARTIFACT_MAX_MB})
+
+@app.post("/artifacts/<name>/uploads")
+@_artifact_route
+def artifact_upload_open(name):
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data.get("name"), str) or not isinstance(data.get("size"), int) \
+            or data["size"] > ARTIFACT_MAX_MB * 1024 * 1024 or data.get("encoding") not in (None, "gzip", "zstd"):
+        return _art_json({"ok": False, "error": "expected {name, size[, encoding]}"}, 400)
+    if data.get("encoding") == "zstd" and not zstandard:
+        return _art_json({"ok": False, "error": "zstd not supported"}, 400)
+    if data["size"] > _store_free():
+        return _store_full()
+    os.makedirs(_art("uploads"), exist_ok=True)
+    _expire_uploads()
+    upload_id = uuid.uuid4().hex
+    open(_art("uploads", upload_id), "wb").close()
+    with open(_art("uploads", upload_id + ".json"), "w") as f:
+        json.dump({"set": name, "name": data["name"], "size": data["size"],
+                   "encoding": data.get("encoding")}, f)
+    return _art_json({"id": upload_id, "offset": 0}, 201)
+
+@app.route("/artifacts/<name>/uploads/<upload_id>", methods=["GET", "PUT"])
+@_artifact_route
+def artifact_upload_part(name, upload_id):
+    path = _art("uploads", upload_id)
+    if not _UPLOAD_RE.match(upload_id) or not os.path.exists(path + ".json"):
+        return _art_json({"ok": False, "error": "unknown upload"}, 404)
+    offset = os.path.getsize(path)
+    if request.method == "GET":
+        return _art_json({"offset": offset})
+    with _artifact_lock:
+        if upload_id in _uploads_busy or request.args.get("offset", type=int) != offset:
+            return _art_json({"ok": False, "error": "wrong offset", "offset": offset}, 409)
+        _uploads_busy.add(upload_id)
+    room = _store_free()
+    try:
+        # Written as it arrives: if the sender drops mid-part, what got here counts.
+        with open(path, "ab") as f:
+            _copy_stream(request.stream, f, min(ARTIFACT_MAX_MB * 1024 * 1024 - offset, room))
+    except ValueError:
+        if room < ARTIFACT_MAX_MB * 1024 * 1024 - offset:
+            return _store_full()
+        return _art_json({"ok": False, "error": f"over {ARTIFACT_MAX_MB} MB"}, 413)
+    finally:
+        _store_add(os.path.getsize(path) - offset)
+        with _artifact_lock:
+            _uploads_busy.discard(upload_id)
+    os.utime(path + ".json")
+    return _art_json({"offset": os.path.getsize(path)})
+
+@app.post("/artifacts/<name>/uploads/<upload_id>/complete")
+@_artifact_route
+def artifact_upload_complete(name, upload_id):
+    path = _art("uploads", upload_id)
+    if not _UPLOAD_RE.match(upload_id) or not os.path.exists(path + ".json"):
+        return _art_json({"ok": False, "error": "unknown upload"}, 404)
+    with open(path + ".json") as f:
+        meta = json.load(f)
+    body = request.get_json(silent=True) or {}
+    sha, size = _hash_file(path)
+    encoding = meta.get("encoding")
+    if encoding:
+        if sha != body.get("encoded_sha256"):
+            return _art_json({"ok": False, "error": "encoded digest mismatch", "encoded_sha256": sha}, 409)
+        # Keep the plain file too, so receivers that can't decode still get it.
+        # Decoding stops as soon as it passes the declared size.
+        if meta["size"] > _store_free():
+            return _store_full()
+        tmp, h, raw_size = _art_tmp(), hashlib.sha256(), 0
+        try:
+            with open(path, "rb") as src, open(tmp, "wb") as out:
+                for data in _decoded(src, encoding):
+                    raw_size += len(data)
+                    if raw_size > meta["size"]:
+                        break
+                    out.write(data)
+                    _store_add(len(data))
+                    h.update(data)
+        except _DECODE_ERRORS:
+            _store_remove(tmp)
+            return _art_json({"ok": False, "error": f"not valid {encoding}"}, 409)
+        if raw_size > meta["size"]:
+            _store_remove(tmp)
+            return _art_json({"ok": False, "error": f"decodes to more than the declared {meta['size']} bytes"}, 409)
+        if h.hexdigest() != body.get("sha256") or raw_size != meta["size"]:
+            _store_remove(tmp)
+            return _art_json({"ok": False, "error": "digest mismatch", "sha256": h.hexdigest()}, 409)
+        _keep(path, _blob(sha))
+        _keep(tmp, _blob(h.hexdigest()))
+        sha, size = h.hexdigest(), raw_size
+    else:
+        if sha != body.get("sha256") or size != meta["size"]:
+            return _art_json({"ok": False, "error": "digest mismatch", "sha256": sha, "size": size}, 409)
+        _keep(path, _blob(sha))
+    os.unlink(path + ".json")
+    return _art_json({"ok": True, "sha256": sha, "size": size})
+
+@app.post("/artifacts/<name>/chunks/missing")
+@_artifact_route
+def artifact_chunks_missing(name):
+    chunks = (request.get_json(silent=True) or {}).get("chunks")
+    if not isinstance(chunks, list) or not all(isinstance(c, str) and _SHA_RE.match(c) for c in chunks):
+        return _art_json({"ok": False, "error": "expected {chunks: [sha256, ...]}"}, 400)
+    return _art_json({"missing": [c for c in chunks if not os.path.exists(_chunk(c))]})
+
+@app.route("/artifacts/<name>/chunks/<sha>", methods=["GET", "PUT"])
+@_artifact_route
+def artifact_chunk(name, sha):
+    if not _SHA_RE.match(sha):
+        return _art_json({"ok": False, "error": "bad digest"}, 400)
+    if request.method == "GET":
+        if not os.path.exists(_chunk(sha)):
+            return _art_json({"ok": False, "error": "no such chunk"}, 404)
+        resp = send_file(_chunk(sha), mimetype="application/octet-stream", etag=sha, max_age=31536000)
+        resp.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        return resp
+    data = request.get_data(cache=False)
+    if len(data) > _CHUNK_MAX or hashlib.sha256(data).hexdigest() != sha:
+        return _art_json({"ok": False, "error": "digest mismatch"}, 409)
+    if not os.path.exists(_chunk(sha)):
+        if len(data) > _store_free():
+            return _store_full()
+        tmp = _art_tmp()
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+        finally:
+            _store_add(os.path.getsize(tmp))
+        _keep(tmp, _chunk(sha))
+    return _art_json({"ok": True}, 201)
+
+def _publish_manifest(name, manifest):
+    """Check every file is stored (building delta files from chunks), then make manifest live."""
+    if not isinstance(manifest, dict):
+        return _art_json({"ok": False, "error": "manifest must be an object"}, 400)
+    missing = []
+    for rel, entry in manifest.items():
+        sha = entry if isinstance(entry, str) else entry.get("sha256") if isinstance(entry, dict) else None
+        if not _safe_rel(rel) or not isinstance(sha, str) or not _SHA_RE.match(sha):
+            return _art_json({"ok": False, "error": f"bad manifest entry: {rel}"}, 400)
+        if os.path.exists(_blob(sha)):
+            continue
+        if not (isinstance(entry, dict) and isinstance(entry.get("chunks"), list) and _assemble(entry["chunks"], sha)):
+            missing.append(rel)
+    if missing:
+        return _art_json({"ok": False, "error": "files not uploaded", "missing": missing}, 409)
+    os.makedirs(_art("sets", name), exist_ok=True)
+    tmp = _art("sets", name, "manifest.json.tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, sort_keys=True)
+    os.replace(tmp, _art("sets", name, "manifest.json"))
+    return _art_json({"ok": True, "files": len(manifest)})
+
+@app.route("/artifacts/<name>/manifest.json", methods=["GET", "PUT"])
+@_artifact_route
+def artifact_manifest(name):
+    if request.method == "PUT":
+        return _publish_manifest(name, request.get_json(silent=True))
+    path = _art("sets", name, "manifest.json")
+    if not os.path.exists(path):
+        return _art_json({"ok": False, "error": "no such artifact set"}, 404)
+    resp = send_file(path, mimetype="application/json", max_age=0)
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+@app.post("/artifacts/<name>")
+@_artifact_route
+def artifact_upload_multipart(name):
+    """Old send-artifacts.py: one multipart POST with every file plus manifest.json."""
+    manifest_part = request.files.get("manifest.json")
+    try:
+        manifest = json.load(manifest_part.stream) if manifest_part else None
+    except ValueError:
+        manifest = None
+    if not isinstance(manifest, dict):
+        return _art_json({"ok": False, "error": "missing manifest.json part"}, 400)
+    room = _store_free()
+    for field, storage in request.files.items():
+        if field == "manifest.json":
+            continue
+        tmp, h = _art_tmp(), hashlib.sha256()
+        try:
+            with open(tmp, "wb") as f:
+                for block in iter(lambda: storage.stream.read(_ARTIFACT_BLOCK), b""):
+                    room -= len(block)
+                    if room < 0:
+                        break
+                    f.write(block)
+                    h.update(block)
+        finally:
+            _store_add(os.path.getsize(tmp))
+        if room < 0:
+            _store_remove(tmp)
+            return _store_full()
+        sha = h.hexdigest()
+        if manifest.get(field) != sha:
+            _store_remove(tmp)
+            return _art_json({"ok": False, "error": f"digest mismatch for {field}", "sha256": sha}, 409)
+        _keep(tmp, _blob(sha))
+    return _publish_manifest(name, manifest)
+
+@app.get("/artifacts/<name>/blobs/<sha>")
+@app.get("/artifacts/<name>/blobs/<sha>/<path:filename>")
+@_artifact_route
+def artifact_blob(name, sha, filename=None):
+    """Content by digest; never changes, so cacheable forever. filename only sets the content type."""
+    if not _SHA_RE.match(sha) or not os.path.exists(_blob(sha)):
+        return _art_json({"ok": False, "error": "no such blob"}, 404)
+    resp = send_file(_blob(sha), download_name=filename or sha, etag=sha, max_age=31536000,
+                     mimetype=None if filename else "application/octet-stream")
+    resp.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return resp
+
+@app.get("/artifacts/<name>/<path:rel>")
+@_artifact_route
+def artifact_file(name, rel):
+    manifest = _load_manifest(name)
+    entry = manifest.get(rel) if manifest else None
+    if entry is None:
+        return _art_json({"ok": False, "error": "not in manifest"}, 404)
+    sha = entry if isinstance(entry, str) else entry["sha256"]
+    encoding = request.args.get("encoding")
+    if encoding:
+        if not isinstance(entry, dict) or entry.get("encoding") != encoding \
+                or not os.path.exists(_blob(str(entry.get("encoded_sha256")))):
+            return _art_json({"ok": False, "error": f"no {encoding} copy"}, 406)
+        sha = entry["encoded_sha256"]
+        filename = None
+    else:
+        filename = rel.rsplit("/", 1)[-1]
+    resp = redirect(url_for("artifact_blob", name=name, sha=sha, filename=filename))
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
 from alexa_skill import alexa_bp, init_alexa
 app.register_blueprint(alexa_bp)
 
@@ -680,6 +1662,8 @@ init_alexa(sys.modules[__name__])
 
 load_state()
 _flush_thread.start()
+_aggregator_thread.start()
+_scheduler_thread.start()
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=8080)
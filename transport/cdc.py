@@ -0,0 +1,138 @@
+"""
+Content-defined chunking for artifact delta transfers.
+
+Files are cut where a rolling gear hash of the last 64 bytes hits a bit
+pattern, so an insertion or edit only changes the chunks around it and the
+rest of the file keeps the same chunk digests from one version to the next.
+Both ends keep a ChunkStore keyed by chunk sha256; only chunks the other
+side lacks need to move.
+
+Usage (scripts in this directory):
+    import cdc
+    with path.open("rb") as f:
+        digest, chunks = cdc.split_file(f)     # file sha256, [[chunk sha256, offset, length], ...]
+    store = cdc.ChunkStore(root)
+    store.put(data); store.has(sha); store.get(sha)
+"""
+import hashlib
+import json
+import os
+from pathlib import Path
+
+MIN_SIZE = 2 * 1024
+AVG_BITS = 13                # ~8 KiB between cut points past MIN_SIZE
+MAX_SIZE = 64 * 1024
+READ_SIZE = 1024 * 1024
+
+_M64 = (1 << 64) - 1
+# Gear table: 256 fixed pseudo-random 64-bit values. Must be identical on every side.
+GEAR = [int.from_bytes(hashlib.sha256(b"ohc-cdc-gear-%d" % i).digest()[:8], "big") for i in range(256)]
+# Test the top bits: the low bits of a gear hash only depend on the last few bytes.
+_MASK = ((1 << AVG_BITS) - 1) << (64 - AVG_BITS)
+
+
+def _cut(buf, start: int, end: int) -> int:
+    """End offset of the chunk starting at start; buf[start:end] is all the data available."""
+    limit = min(end, start + MAX_SIZE)
+    if limit - start <= MIN_SIZE:
+        return limit
+    gear, mask, h = GEAR, _MASK, 0
+    # The hash only sees the last 64 bytes, so warm it up just before MIN_SIZE.
+    for i in range(start + MIN_SIZE - 64, start + MIN_SIZE):
+        h = ((h << 1) + gear[buf[i]]) & _M64
+    for i in range(start + MIN_SIZE, limit):
+        h = ((h << 1) + gear[buf[i]]) & _M64
+        if not h & mask:
+            return i + 1
+    return limit
+
+
+def split(f):
+    """Yield (offset, chunk bytes) for a binary file object, reading it once."""
+    buf = b""
+    pos = 0      # start of the next chunk within buf
+    base = 0     # file offset of buf[0]
+    eof = False
+    while True:
+        if not eof and len(buf) - pos < MAX_SIZE:
+            more = f.read(READ_SIZE)
+            eof = not more
+            buf, base, pos = buf[pos:] + more, base + pos, 0
+        if pos >= len(buf):
+            return
+        end = _cut(buf, pos, len(buf))
+        yield base + pos, buf[pos:end]
+        pos = end
+
+
+def split_file(f):
+    """(sha256 of the whole file, [[chunk sha256, offset, length], ...]) in one pass."""
+    whole = hashlib.sha256()
+    chunks = []
+    for offset, data in split(f):
+        whole.update(data)
+        chunks.append([hashlib.sha256(data).hexdigest(), offset, len(data)])
+    return whole.hexdigest(), chunks
+
+
+class ChunkStore:
+    """Chunks on disk by sha256 (root/ab/abcdef...), plus cached chunk lists of local files."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def path(self, sha: str) -> Path:
+        return self.root / sha[:2] / sha
+
+    def has(self, sha: str) -> bool:
+        return self.path(sha).is_file()
+
+    def get(self, sha: str) -> bytes:
+        return self.path(sha).read_bytes()
+
+    def put(self, data: bytes, sha: str = None) -> str:
+        actual = hashlib.sha256(data).hexdigest()
+        if sha and sha != actual:
+            raise ValueError(f"chunk digest mismatch: expected {sha}, got {actual}")
+        p = self.path(actual)
+        if not p.exists():
+            p.parent.mkdir(parents=True, exist_ok=True)
+            tmp = p.with_name(f"{actual}.{os.getpid()}.{id(data)}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, p)
+        return actual
+
+    def prune(self, keep) -> int:
+        """Delete stored chunks not in keep; returns how many went."""
+        removed = 0
+        for p in self.root.glob("??/*"):
+            if p.name not in keep and len(p.name) == 64:
+                p.unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+    # ── chunk lists of local files, so unchanged files aren't re-read ──
+
+    def _recipe_path(self, path: Path) -> Path:
+        st = path.stat()
+        key = f"{path.resolve()}|{st.st_size}|{st.st_mtime_ns}"
+        return self.root / "recipes" / f"{hashlib.sha256(key.encode()).hexdigest()}.json"
+
+    def recipe(self, path: Path):
+        """(file sha256, chunks) for path, from the cache when the file hasn't changed."""
+        rp = self._recipe_path(path)
+        try:
+            cached = json.loads(rp.read_text())
+            return cached["sha256"], cached["chunks"]
+        except (OSError, ValueError, KeyError):
+            pass
+        with path.open("rb") as f:
+            digest, chunks = split_file(f)
+        try:
+            rp.parent.mkdir(parents=True, exist_ok=True)
+            tmp = rp.with_name(f"{rp.name}.{os.getpid()}.tmp")
+            tmp.write_text(json.dumps({"sha256": digest, "chunks": chunks}))
+            os.replace(tmp, rp)
+        except OSError:
+            pass
+        return digest, chunks
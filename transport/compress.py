@@ -0,0 +1,90 @@
+"""
+Per-file compression for artifact transfers.
+
+choose() picks an encoding and level for one file: known-compressed formats
+(images, audio, video, archives, fonts) are sent as they are, everything
+else is sampled (start, middle, end) and only compressed if a quick zlib
+pass saves at least MIN_SAVING. Text-like files that compress well get a
+high level; large files get a moderate one so compression keeps up with
+the link.
+
+zstd is used when the zstandard package is installed on both ends, gzip
+(stdlib zlib) otherwise. Both produce deterministic output for the same
+input and level, which the uploader relies on to resume mid-stream.
+"""
+import zlib
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+SKIP_EXTENSIONS = {
+    ".png", ".jpg", ".jpeg", ".gif", ".webp", ".avif", ".heic", ".ico",
+    ".mp3", ".m4a", ".aac", ".ogg", ".opus", ".flac",
+    ".mp4", ".m4v", ".mov", ".webm", ".mkv",
+    ".zip", ".gz", ".tgz", ".bz2", ".xz", ".zst", ".7z", ".rar", ".br", ".jar", ".whl",
+    ".woff", ".woff2", ".pdf",
+}
+TEXT_EXTENSIONS = {
+    ".html", ".htm", ".svg", ".css", ".js", ".mjs", ".json", ".yaml", ".yml", ".xml",
+    ".txt", ".md", ".csv", ".b64", ".sh", ".py", ".conf", ".ini", ".toml",
+}
+MIN_SIZE = 1024              # not worth a round of framing below this
+MIN_SAVING = 0.10
+SAMPLE = 64 * 1024
+HIGH_LEVEL_MAX = 64 * 1024 * 1024  # above this, favour speed
+LEVELS = {"zstd": (6, 19), "gzip": (6, 9)}  # (default, high)
+
+
+def available():
+    """Encodings this side can produce and decode, best first."""
+    return ["zstd", "gzip"] if zstandard else ["gzip"]
+
+
+def _sample(path: Path, size: int) -> bytes:
+    with path.open("rb") as f:
+        if size <= 3 * SAMPLE:
+            return f.read()
+        parts = []
+        for offset in (0, size // 2 - SAMPLE // 2, size - SAMPLE):
+            f.seek(offset)
+            parts.append(f.read(SAMPLE))
+        return b"".join(parts)
+
+
+def choose(path: Path, accepted):
+    """(encoding, level) for path, or None to send it uncompressed."""
+    encoding = next((e for e in available() if e in accepted), None)
+    size = path.stat().st_size
+    if not encoding or size < MIN_SIZE or path.suffix.lower() in SKIP_EXTENSIONS:
+        return None
+    sample = _sample(path, size)
+    ratio = len(zlib.compress(sample, 1)) / max(1, len(sample))
+    if ratio > 1 - MIN_SAVING:
+        return None
+    default, high = LEVELS[encoding]
+    if size <= HIGH_LEVEL_MAX and (path.suffix.lower() in TEXT_EXTENSIONS or ratio < 0.4):
+        return encoding, high
+    return encoding, default
+
+
+def compressor(encoding: str, level: int):
+    """Object with compress(bytes) and flush() producing one complete stream."""
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=level).compressobj()
+    return zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip container, mtime 0
+
+
+# What a corrupt stream raises from decompress()/flush().
+DECODE_ERRORS = (zlib.error, zstandard.ZstdError) if zstandard else (zlib.error,)
+
+
+def decompressor(encoding: str):
+    """Object with decompress(bytes) and flush()."""
+    if encoding == "zstd":
+        return zstandard.ZstdDecompressor().decompressobj()
+    if encoding == "gzip":
+        return zlib.decompressobj(31)
+    raise ValueError(f"unsupported encoding: {encoding}")
@@ -0,0 +1,110 @@
+"""
+Change detection for the vehicle relays.
+
+Relays poll on a timer, but most polls return what the last one did. The
+ChangeFilter keeps the last *emitted* value of every metric per vehicle and
+passes an event on only when something moved by at least its deadband, or
+when the metric hasn't been sent for CHANGE_HEARTBEAT_S (so north can tell
+"unchanged" from "relay dead"). Comparing against the last emitted value
+rather than the last seen one means slow drift still gets through once it
+adds up to a full deadband.
+
+Usage:
+    from changes import ChangeFilter
+    CHANGES = ChangeFilter()
+    events = CHANGES.filter(events)      # CloudEvents in, the meaningful ones out
+    print(CHANGES.summary())             # "suppressed 412/500 (82%)"
+"""
+
+import os, time
+
+HEARTBEAT_S = float(os.getenv("CHANGE_HEARTBEAT_S", "300"))
+
+# event type (last segment) → {data field: smallest change worth sending}.
+# 0 means any change; fields not listed must match exactly; "description"
+# is derived text and ignored.
+DEADBANDS = {
+    "fuel":          {"fuel_pct": 1, "range_km": 10},
+    "odometer":      {"odometer_km": 1},
+    "tire_pressure": {"front_left_kpa": 5},
+    "battery":       {"voltage": 0.2},
+    "lock_status":   {"locked": 0},
+}
+
+IGNORED = {"description"}
+
+
+def _number(v):
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+
+class ChangeFilter:
+    def __init__(self, deadbands=DEADBANDS, heartbeat=HEARTBEAT_S):
+        self.deadbands = deadbands
+        self.heartbeat = heartbeat
+        self.last = {}  # (vehicle, event type) → (data, emitted at)
+        self.seen = 0
+        self.passed = 0
+        self.heartbeats = 0
+
+    def changed(self, event_type, data, now=None):
+        """Why this reading should be emitted ("new", "moved", "heartbeat"), or None to suppress it.
+
+        A reading that passes becomes the new baseline for its metric.
+        """
+        now = time.monotonic() if now is None else now
+        key = (data.get("vehicle") or data.get("vin"), event_type)
+        self.seen += 1
+        prev = self.last.get(key)
+        if prev is None:
+            reason = "new"
+        elif self._moved(event_type, prev[0], data):
+            reason = "moved"
+        elif now - prev[1] >= self.heartbeat:
+            reason = "heartbeat"
+            self.heartbeats += 1
+        else:
+            return None
+        self.last[key] = (data, now)
+        self.passed += 1
+        return reason
+
+    def _moved(self, event_type, old, new):
+        bands = self.deadbands.get(event_type, {})
+        for field in (old.keys() | new.keys()) - IGNORED:
+            a, b = old.get(field), new.get(field)
+            band = bands.get(field)
+            if band:
+                x, y = _number(a), _number(b)
+                if x is not None and y is not None:
+                    if abs(y - x) >= band:
+                        return True
+                    continue
+            if a != b:
+                return True
+        return False
+
+    def filter(self, events, reasons=None):
+        """Keep the CloudEvents worth sending (type is ohc.demo.vehicle.<event type>).
+
+        Pass a list as `reasons` to collect why each kept event passed.
+        """
+        kept = []
+        for e in events:
+            reason = self.changed(e["type"].rsplit(".", 1)[-1], e["data"])
+            if reason:
+                kept.append(e)
+                if reasons is not None:
+                    reasons.append(reason)
+        return kept
+
+    @property
+    def ratio(self):
+        return 1 - self.passed / self.seen if self.seen else 0.0
+
+    def summary(self):
+        return (f"suppressed {self.seen - self.passed}/{self.seen} ({self.ratio:.0%}), "
+                f"{self.heartbeats} heartbeats")
@@ -0,0 +1,341 @@
+"""
+Shared CloudEvent emitter for the Mercedes relays.
+
+One background sender thread per relay:
+  - pooled keep-alive session to north
+  - events are batched and POSTed as one JSON array when EMIT_BATCH events
+    are waiting or EMIT_FLUSH_S seconds have passed — once north's /about
+    says it takes arrays; until then (and for older builds) one POST per event
+  - while north is unreachable (connection errors, 5xx, 429) batches are
+    appended to an on-disk NDJSON spool instead of being dropped; new events
+    queue behind the spool so order is kept
+  - once north answers again the spool drains at EMIT_DRAIN_RATE events/s,
+    with the read offset persisted so a restarted relay picks up where it
+    left off
+
+Usage:
+    from emitter import Emitter
+    EMITTER = Emitter("mercedes_relay", NORTH_URL, source="mercedes://relay", id_prefix="mb")
+    EMITTER.emit("fuel", {...})          # build + queue one event
+    EMITTER.send([event, event, ...])    # queue prebuilt CloudEvents
+    EMITTER.close()                      # flush what's queued (also runs at exit)
+"""
+
+import os, json, time, uuid, queue, atexit, threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+import requests
+
+BATCH_SIZE   = int(os.getenv("EMIT_BATCH", "50"))
+FLUSH_S      = float(os.getenv("EMIT_FLUSH_S", "1.0"))
+DRAIN_RATE   = float(os.getenv("EMIT_DRAIN_RATE", "100"))  # events/s while replaying the spool
+SPOOL_MAX_MB = float(os.getenv("EMIT_SPOOL_MAX_MB", "100"))
+SPOOL_DIR    = Path(os.getenv("RELAY_SPOOL_DIR", str(Path(__file__).parent / ".spool")))
+RETRY_MAX_S  = 30.0
+BATCH_PROBE_S = 300.0  # how often to re-check a north that didn't take arrays
+
+# North answered a batch but can't take a JSON array: resend one by one.
+_NO_BATCH = {400, 404, 405, 413, 415}
+
+
+def cloudevent(event_type, source, id_prefix, data):
+    now = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+    return {
+        "specversion": "1.0",
+        "type": f"ohc.demo.vehicle.{event_type}",
+        "source": source,
+        "id": f"{id_prefix}-{event_type}-{uuid.uuid4().hex[:8]}",
+        "time": now,
+        "eventclass": "vehicle",
+        "data": data,
+    }
+
+
+class Unavailable(Exception):
+    """North can't take events right now. `done` events at the front were already handled."""
+
+    def __init__(self, reason, retry_after=None, done=0):
+        super().__init__(reason)
+        self.retry_after = retry_after
+        self.done = done
+
+
+class Emitter:
+    def __init__(self, name, north_url, source, id_prefix, verbose=True):
+        self.name = name
+        self.url = f"{north_url.rstrip('/')}/ingest"
+        self.about_url = f"{north_url.rstrip('/')}/about"
+        self.source, self.id_prefix = source, id_prefix
+        self.verbose = verbose
+        self.q = queue.Queue()
+        self.session = requests.Session()
+        self.session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=4))
+        self.session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=4))
+        self.spool = SPOOL_DIR / f"{name}.ndjson"
+        self.offset_file = SPOOL_DIR / f"{name}.offset"
+        self.batch_ok = None  # None until north's /about has been checked
+        self.probed_at = 0.0
+        self.fails = 0
+        self.retry_at = 0.0  # while north is down, don't try again before this
+        self.stats = {"sent": 0, "batches": 0, "spooled": 0, "drained": 0, "rejected": 0, "dropped": 0}
+        self._stop = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    # ── producer side ──
+
+    def emit(self, event_type, data):
+        event = cloudevent(event_type, self.source, self.id_prefix, data)
+        self.send([event])
+        return event
+
+    def send(self, events):
+        self._ensure_started()
+        for e in events:
+            self.q.put(e)
+
+    def close(self, timeout=15):
+        """Flush queued events to north (or the spool) and stop the sender."""
+        if not self._thread:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+        s = self.stats
+        if any(s.values()):
+            print(f"  emitter: sent {s['sent']} in {s['batches']} requests, spooled {s['spooled']}, "
+                  f"drained {s['drained']}, rejected {s['rejected']}, dropped {s['dropped']}"
+                  + (f" — {self._backlog()} bytes still spooled in {self.spool}" if self._backlog() else ""))
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name=f"emit-{self.name}", daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+
+    # ── sender thread ──
+
+    def _run(self):
+        self._repair_spool()
+        while True:
+            try:
+                if self._step():
+                    return
+            except Exception as e:
+                # One bad spool line or failed write must not stop delivery for good.
+                self._log(f"✗ sender error: {type(e).__name__}: {e}")
+                if self._stop.is_set() and self.q.empty():
+                    return
+                time.sleep(1)
+
+    def _step(self):
+        """One pass of the sender loop; True once stopping and everything is flushed or spooled."""
+        draining = self._backlog() > 0
+        batch = self._collect(0.05 if draining else FLUSH_S)
+        stopping = self._stop.is_set() and self.q.empty()
+        if draining or time.monotonic() < self.retry_at:
+            if batch:
+                self._append(batch)  # keep order: live events go behind the backlog
+            if time.monotonic() < self.retry_at:
+                return stopping  # north is down; the spool waits for the next run
+            try:
+                n = self._drain_step()
+                time.sleep(n / DRAIN_RATE)
+            except Unavailable as e:
+                self.retry_at = time.monotonic() + self._backoff(e)
+        elif batch:
+            try:
+                self._post(batch)
+            except Unavailable as e:
+                self._append(batch[e.done:])
+                self.retry_at = time.monotonic() + self._backoff(e)
+        return stopping
+
+    def _collect(self, timeout):
+        batch = []
+        deadline = time.monotonic() + timeout
+        while len(batch) < BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.q.get(timeout=remaining) if remaining > 0 else self.q.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _backoff(self, e):
+        self.fails += 1
+        wait = e.retry_after or min(RETRY_MAX_S, 2 ** self.fails)
+        if self.fails == 1:
+            self._log(f"✗ north unavailable ({e}) — spooling to {self.spool}")
+        elif self.fails % 10 == 0:
+            self._log(f"✗ north still unavailable ({e}); {self._backlog()} bytes spooled")
+        return wait
+
+    # ── HTTP ──
+
+    def _post(self, events):
+        """Deliver events or raise Unavailable. Events north rejects outright (4xx) are counted, not retried."""
+        if len(events) > 1 and self._batch_supported():
+            status, retry = self._request(events)
+            if 200 <= status < 300:
+                self._done(len(events), 1)
+                return
+            if status >= 500 or status == 429:
+                raise Unavailable(f"HTTP {status}", retry)
+            if status not in _NO_BATCH:
+                self.stats["rejected"] += len(events)
+                self.stats["batches"] += 1
+                self._log(f"✗ north rejected a batch of {len(events)} (HTTP {status})")
+                return
+            self.batch_ok = False
+            self.probed_at = time.monotonic()
+            self._log(f"north rejected a batch (HTTP {status}); sending one event per request")
+        for i, e in enumerate(events):
+            try:
+                status, retry = self._request(e)
+            except Unavailable as u:
+                u.done = i
+                raise
+            if status >= 500 or status == 429:
+                raise Unavailable(f"HTTP {status}", retry, done=i)
+            if 200 <= status < 300:
+                self._done(1, 1)
+            else:
+                self.stats["rejected"] += 1
+                self.stats["batches"] += 1
+
+    def _batch_supported(self):
+        """Whether north takes JSON arrays, as its /about advertises.
+
+        Asked up front rather than learned from a failed batch: builds that
+        predate arrays count the POST as an event before answering 500.
+        """
+        if self.batch_ok is None or (not self.batch_ok and time.monotonic() - self.probed_at > BATCH_PROBE_S):
+            try:
+                r = self.session.get(self.about_url, timeout=10)
+                about = r.json() if r.ok else {}
+            except ValueError:
+                about = {}
+            except requests.RequestException as e:
+                raise Unavailable(type(e).__name__)
+            was, self.batch_ok = self.batch_ok, isinstance(about, dict) and "ingestMaxEvents" in about
+            self.probed_at = time.monotonic()
+            if self.batch_ok != was:
+                self._log("north takes JSON arrays; batching" if self.batch_ok
+                          else "north doesn't take JSON arrays; sending one event per request")
+        return self.batch_ok
+
+    def _request(self, payload):
+        try:
+            r = self.session.post(self.url, json=payload, timeout=10)
+        except requests.RequestException as e:
+            raise Unavailable(type(e).__name__)
+        retry = r.headers.get("Retry-After", "")
+        return r.status_code, float(retry) if retry.isdigit() else None
+
+    def _done(self, n, requests_made):
+        self.stats["sent"] += n
+        self.stats["batches"] += requests_made
+        self.fails = 0
+        if self.verbose:
+            print(f"  [{datetime.now().strftime('%H:%M:%S')}] → north {n} event(s) ✓")
+
+    # ── spool ──
+
+    def _backlog(self):
+        try:
+            return self.spool.stat().st_size - self._offset()
+        except FileNotFoundError:
+            return 0
+
+    def _offset(self):
+        try:
+            return int(self.offset_file.read_text() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _repair_spool(self):
+        """Cut off a torn last line (a write interrupted by a crash) so the next append starts clean."""
+        try:
+            with open(self.spool, "rb+") as f:
+                size = f.seek(0, os.SEEK_END)
+                if not size:
+                    return
+                f.seek(size - 1)
+                if f.read(1) == b"\n":
+                    return
+                keep = size
+                while keep > 0:
+                    step = min(65536, keep)
+                    f.seek(keep - step)
+                    nl = f.read(step).rfind(b"\n")
+                    if nl >= 0:
+                        keep = keep - step + nl + 1
+                        break
+                    keep -= step
+                f.truncate(keep)
+            self._log(f"dropped a torn {size - keep}-byte record from the end of {self.spool}")
+        except FileNotFoundError:
+            pass
+
+    def _append(self, events):
+        SPOOL_DIR.mkdir(parents=True, exist_ok=True)
+        self._repair_spool()
+        size = self.spool.stat().st_size if self.spool.exists() else 0
+        if size > SPOOL_MAX_MB * 1024 * 1024:
+            self.stats["dropped"] += len(events)
+            self._log(f"✗ spool over {SPOOL_MAX_MB:.0f} MB — dropping {len(events)} event(s)")
+            return
+        with open(self.spool, "a") as f:
+            f.write("".join(json.dumps(e) + "\n" for e in events))
+            f.flush()
+            os.fsync(f.fileno())
+        self.stats["spooled"] += len(events)
+
+    def _drain_step(self):
+        """Send the next batch from the spool; returns how many events went out."""
+        offset = self._offset()
+        events, ends = [], []  # ends[i]: spool offset just past events[i]'s line
+        pos = offset
+        with open(self.spool, "rb") as f:
+            f.seek(offset)
+            while len(events) < BATCH_SIZE:
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    break  # EOF, or a torn last write from a crash — cut off by _repair_spool
+                pos += len(line)
+                try:
+                    events.append(json.loads(line))
+                    ends.append(pos)
+                except ValueError:
+                    self.stats["dropped"] += 1
+                    self._log(f"✗ skipping undecodable spool line at byte {pos - len(line)}")
+        if not events:
+            if pos == offset:
+                self._repair_spool()  # only a torn tail is left
+            self._commit(pos, 0)
+            return 0
+        try:
+            self._post(events)
+        except Unavailable as e:
+            if e.done:
+                self._commit(ends[e.done - 1], e.done)
+            raise
+        self._commit(pos, len(events))
+        return len(events)
+
+    def _commit(self, offset, n):
+        self.stats["drained"] += n
+        if offset >= self.spool.stat().st_size:
+            # Caught up. Only this thread appends to the spool, so it's safe to reset.
+            self.spool.unlink()
+            self.offset_file.unlink(missing_ok=True)
+            self._log(f"✓ spool drained ({self.stats['drained']} events replayed)")
+        else:
+            self.offset_file.write_text(str(offset))
+
+    def _log(self, msg):
+        print(f"  [{datetime.now().strftime('%H:%M:%S')}] emitter[{self.name}] {msg}")
@@ -17,6 +17,21 @@ SETUP:
   7. python mercedes_relay.py --auth   (first time — opens browser for OAuth)
   8. python mercedes_relay.py           (runs the relay)
 
+Only readings that moved past their deadband (changes.py) are emitted, plus
+a heartbeat per metric every CHANGE_HEARTBEAT_S; --all sends every poll.
+
+FLEET MODE:
+  python mercedes_relay.py --fleet     (every vehicle in MB_VEHICLE_IDS, or all discovered)
+  One asyncio task per vehicle on a jittered schedule, a token bucket per
+  container API (MB_API_RATE/MB_API_BURST), backing off toward MB_POLL_MAX
+  while a vehicle returns no data and tightening toward MB_POLL_MIN while
+  its values are changing.
+
+OFFLINE:
+  python mock_mb_api.py --vehicles 50 &
+  MB_API_BASE=http://127.0.0.1:9191/vehicledata/v2 MB_ACCESS_TOKEN=mock \
+      python mercedes_relay.py --fleet --dry-run
+
 READS (all read-only):
   - Fuel level + range
   - Odometer
@@ -31,8 +46,9 @@ DOES NOT:
   - Any write operation
 """
 
-import os, sys, json, time, uuid, argparse, webbrowser
-from datetime import datetime, timezone
+import os, sys, json, time, random, asyncio, argparse, webbrowser
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from pathlib import Path
 
 try:
@@ -42,18 +58,27 @@ except ImportError:
     print("pip install requests python-dotenv --break-system-packages")
     sys.exit(1)
 
+from emitter import Emitter, cloudevent
+from changes import ChangeFilter
+
 load_dotenv()
 
 CLIENT_ID     = os.getenv("MB_CLIENT_ID", "")
 CLIENT_SECRET = os.getenv("MB_CLIENT_SECRET", "")
 REDIRECT_URI  = os.getenv("MB_REDIRECT_URI", "http://localhost:9090/callback")
 VEHICLE_ID    = os.getenv("MB_VEHICLE_ID", "")
+VEHICLE_IDS   = [v.strip() for v in os.getenv("MB_VEHICLE_IDS", "").split(",") if v.strip()]
+ACCESS_TOKEN  = os.getenv("MB_ACCESS_TOKEN", "")  # skips OAuth, e.g. against mock_mb_api.py
 NORTH_URL     = os.getenv("NORTH_URL", "https://north-qr-demo-qa.apps.cluster-nlthm.nlthm.sandbox3528.opentlc.com")
 POLL_INTERVAL = int(os.getenv("MB_POLL_INTERVAL", "30"))
+POLL_MIN      = float(os.getenv("MB_POLL_MIN", str(max(5, POLL_INTERVAL // 3))))
+POLL_MAX      = float(os.getenv("MB_POLL_MAX", "600"))
+API_RATE      = float(os.getenv("MB_API_RATE", "1"))   # fleet mode: requests/s per container API
+API_BURST     = int(os.getenv("MB_API_BURST", "5"))
 
 MB_AUTH_URL  = "https://id.mercedes-benz.com/as/authorization.oauth2"
 MB_TOKEN_URL = "https://id.mercedes-benz.com/as/token.oauth2"
-MB_API_BASE  = "https://api.mercedes-benz.com/vehicledata/v2"
+MB_API_BASE  = os.getenv("MB_API_BASE", "https://api.mercedes-benz.com/vehicledata/v2")
 
 TOKEN_FILE = Path(__file__).parent / ".mb_token.json"
 
@@ -65,6 +90,14 @@ SCOPES = " ".join([
 ])
 
 DRY_RUN = False
+CHANGES = ChangeFilter()  # set to None (--all) to emit every reading every poll
+
+# One keep-alive session for MB API calls; poll() fetches the four
+# containers in parallel on it, so a cycle costs about one round-trip.
+SESSION = requests.Session()
+SESSION.mount("https://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=8))
+SESSION.mount("http://", requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=8))
+POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="mb-poll")
 
 
 # ═══ OAUTH2 ═══
@@ -108,6 +141,8 @@ def do_auth():
 
 
 def load_token():
+    if ACCESS_TOKEN:
+        return {"access_token": ACCESS_TOKEN}
     if not TOKEN_FILE.exists():
         sys.exit(f"No token. Run: python {sys.argv[0]} --auth")
     td = json.loads(TOKEN_FILE.read_text())
@@ -138,14 +173,20 @@ def refresh_token(td):
 
 # ═══ VEHICLE DATA ═══
 
-def api_get(token, path):
+def api_fetch(token, path):
+    """GET an MB API path. Returns (status, json body or None, Retry-After seconds or None)."""
     try:
-        r = requests.get(f"{MB_API_BASE}{path}", headers={"Authorization": f"Bearer {token}"}, timeout=15)
-        if r.status_code == 200:
-            return r.json()
+        r = SESSION.get(f"{MB_API_BASE}{path}", headers={"Authorization": f"Bearer {token}"}, timeout=15)
+        retry = r.headers.get("Retry-After", "")
+        return (r.status_code, r.json() if r.status_code == 200 else None,
+                float(retry) if retry.isdigit() else None)
     except Exception as e:
         print(f"  API error: {e}")
-    return None
+    return None, None, None
+
+
+def api_get(token, path):
+    return api_fetch(token, path)[1]
 
 
 def get_vehicles(token):
@@ -169,49 +210,61 @@ def get_payg(token, vid):
 
 
 # ═══ CLOUDEVENT EMISSION ═══
+# Batching, retries and the outage spool live in emitter.py (shared by all relays).
 
-def emit(event_type, data):
-    if DRY_RUN:
-        ts = datetime.now().strftime("%H:%M:%S")
-        print(f"  [{ts}] {event_type:.<24s} (dry run)")
-        return
+EMITTER = Emitter("mercedes_relay", NORTH_URL, source="mercedes://relay", id_prefix="mb")
 
-    now = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
-    event = {
-        "specversion": "1.0",
-        "type": f"ohc.demo.vehicle.{event_type}",
-        "source": "mercedes://relay",
-        "id": f"mb-{event_type}-{uuid.uuid4().hex[:8]}",
-        "time": now,
-        "eventclass": "vehicle",
-        "data": data,
-    }
-    try:
-        r = requests.post(f"{NORTH_URL}/ingest", json=event, timeout=10)
-        sym = "✓" if r.status_code == 200 else f"✗ {r.status_code}"
-    except Exception as e:
-        sym = f"✗ {e}"
 
+def make_event(event_type, data):
+    return cloudevent(event_type, "mercedes://relay", "mb", data)
+
+
+def emit_batch(events, verbose=True):
+    """Queue a cycle's events for north; the emitter batches them into one request."""
     ts = datetime.now().strftime("%H:%M:%S")
-    print(f"  [{ts}] {event_type:.<24s} {sym}")
+    for e in events if verbose else ():
+        print(f"  [{ts}] {e['type'].rsplit('.', 1)[-1]:.<24s} {'(dry run)' if DRY_RUN else 'queued'}")
+    if not DRY_RUN:
+        EMITTER.send(events)
+
 
+def emit(event_type, data):
+    emit_batch([make_event(event_type, data)])
+
+
+def index_container(container):
+    """Flatten an MB API container response once per poll.
 
-def find_val(container, *needles):
-    """Fish a value out of the MB API container response."""
+    Containers are lists of single-key dicts like {"tanklevelpercent": {"value": ..}};
+    some carry the name in a "type" field instead. Returns ({name: value}, [(type, value)])
+    with names lowercased.
+    """
+    keys, types = {}, []
     if not container:
-        return None
-    items = container if isinstance(container, list) else [container]
-    for item in items:
-        for needle in needles:
-            if isinstance(item, dict):
-                # Direct key match
-                if needle in item:
-                    v = item[needle]
-                    return v.get("value", v) if isinstance(v, dict) else v
-                # Nested in type field
-                t = item.get("type", "")
-                if needle.lower() in t.lower():
-                    return item.get("value", item)
+        return keys, types
+    for item in container if isinstance(container, list) else [container]:
+        if not isinstance(item, dict):
+            continue
+        for k, v in item.items():
+            keys.setdefault(k.lower(), v.get("value", v) if isinstance(v, dict) else v)
+        t = item.get("type")
+        if isinstance(t, str):
+            types.append((t.lower(), item.get("value", item)))
+    return keys, types
+
+
+def find_val(index, *needles):
+    """Look a value up in an index_container() result: exact key first, then type substring."""
+    keys, types = index
+    for needle in needles:
+        v = keys.get(needle.lower())
+        if v is not None:
+            return v
+    for needle in needles:
+        n = needle.lower()
+        for t, v in types:
+            if n in t:
+                return v
     return None
 
 
@@ -224,54 +277,223 @@ def redact_vid(vid):
 # ═══ POLL CYCLE ═══
 
 def poll(token, vid):
-    rvid = redact_vid(vid)
-    n = 0
+    futures = {name: POOL.submit(fn, token, vid) for name, fn in
+               [("fuel", get_fuel), ("payg", get_payg), ("lock", get_lock), ("status", get_status)]}
+    events = build_events(redact_vid(vid), *(index_container(futures[n].result())
+                                              for n in ("fuel", "payg", "lock", "status")))
+    if not events:
+        print("  (no data this cycle — API may need warmup or vehicle may be sleeping)")
+        return 0
+
+    if CHANGES:
+        n = len(events)
+        events = CHANGES.filter(events)
+        print(f"  {n - len(events)}/{n} unchanged within deadband — {CHANGES.summary()} overall")
+    emit_batch(events)
+    return len(events)
+
+
+def build_events(rvid, fuel_data, payg, lock_data, vs):
+    """Turn one vehicle's indexed containers into CloudEvents."""
+    events = []
 
     # Fuel
-    fuel_data = get_fuel(token, vid)
     fl = find_val(fuel_data, "tanklevelpercent", "fuelLevel", "tanklevel")
     rng = find_val(fuel_data, "rangeliquid", "rangeLiquid", "range")
     if fl is not None:
         desc = f"Fuel: {fl}%"
         if rng is not None:
             desc += f" ({rng} km range)"
-        emit("fuel", {"vehicle": rvid, "fuel_pct": fl, "range_km": rng, "description": desc})
-        n += 1
+        events.append(make_event("fuel", {"vehicle": rvid, "fuel_pct": fl, "range_km": rng, "description": desc}))
 
     # Odometer
-    payg = get_payg(token, vid)
     odo = find_val(payg, "odo", "odometer", "distanceSinceReset")
     if odo is not None:
-        emit("odometer", {"vehicle": rvid, "odometer_km": odo, "description": f"Odometer: {odo} km"})
-        n += 1
+        events.append(make_event("odometer", {"vehicle": rvid, "odometer_km": odo, "description": f"Odometer: {odo} km"}))
 
     # Lock status
-    lock_data = get_lock(token, vid)
     lock = find_val(lock_data, "doorlockstatusvehicle", "vehicleLockStatus", "lockStatus")
     if lock is not None:
         locked = str(lock).lower() in ("0", "true", "locked", "1")
-        emit("lock_status", {"vehicle": rvid, "locked": locked, "description": f"Vehicle {'locked' if locked else 'UNLOCKED'}"})
-        n += 1
+        events.append(make_event("lock_status", {"vehicle": rvid, "locked": locked, "description": f"Vehicle {'locked' if locked else 'UNLOCKED'}"}))
 
     # Vehicle status (tires, windows, etc.)
-    vs = get_status(token, vid)
     tire = find_val(vs, "tirepressFrontLeft", "tirepressure")
     if tire is not None:
-        emit("tire_pressure", {"vehicle": rvid, "front_left_kpa": tire, "description": f"Tire FL: {tire} kPa"})
-        n += 1
+        events.append(make_event("tire_pressure", {"vehicle": rvid, "front_left_kpa": tire, "description": f"Tire FL: {tire} kPa"}))
 
     # Location — emit existence only, never coordinates
-    if payg:
+    if payg[0] or payg[1]:
         lat = find_val(payg, "latitude")
         lon = find_val(payg, "longitude")
         if lat is not None and lon is not None:
-            emit("location_ping", {"vehicle": rvid, "has_fix": True, "description": "Location updated (coords redacted)"})
-            n += 1
-
-    if n == 0:
-        print("  (no data this cycle — API may need warmup or vehicle may be sleeping)")
+            events.append(make_event("location_ping", {"vehicle": rvid, "has_fix": True, "description": "Location updated (coords redacted)"}))
+
+    return events
+
+
+# ═══ FLEET MODE ═══
+
+CONTAINERS = ["fuelstatus", "payasyoudrive", "vehiclelock", "vehiclestatus"]  # build_events() order
+
+
+class TokenBucket:
+    """Async token bucket; MB rate-limits each container API separately.
+
+    The refill rate is AIMD-adjusted: halved on every 429, crept back up
+    toward the configured rate on each success.
+    """
+
+    def __init__(self, rate, burst):
+        self.max_rate, self.rate, self.burst = rate, rate, burst
+        self.tokens = float(burst)
+        self.stamp = time.monotonic()
+        self.paused_until = 0.0
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def throttled(self, retry_after):
+        """The API said 429: slow down, and hand out nothing until Retry-After has passed."""
+        self.rate = max(self.rate / 2, self.max_rate / 100)
+        self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+        self.tokens = 0
+
+    def succeeded(self):
+        self.rate = min(self.max_rate, self.rate + self.max_rate / 50)
+
+
+THROTTLED = object()  # _fetch() gave up after repeated 429s
+
+
+class Vehicle:
+    def __init__(self, vid):
+        self.vid, self.rvid = vid, redact_vid(vid)
+        self.interval = float(POLL_INTERVAL)
+
+
+class Fleet:
+    def __init__(self, vids, concurrency):
+        self.vehicles = [Vehicle(v) for v in vids]
+        self.buckets = {c: TokenBucket(API_RATE, API_BURST) for c in CONTAINERS}
+        self.pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="mb-fleet")
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=concurrency)
+        SESSION.mount("https://", adapter)
+        SESSION.mount("http://", adapter)
+        self.token, self.token_at = None, 0.0
+        # Movement drives the adaptive interval even with --all, so keep a filter either way.
+        self.changes = CHANGES or ChangeFilter()
+        self.stats = {"polls": 0, "events": 0, "empty": 0, "changed": 0, "throttled": 0,
+                      "skipped": 0, "errors": 0}
+
+    async def _call(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+
+    async def _token(self):
+        if time.monotonic() - self.token_at > 60:
+            self.token = (await self._call(load_token))["access_token"]
+            self.token_at = time.monotonic()
+        return self.token
+
+    async def _fetch(self, v, container):
+        bucket = self.buckets[container]
+        for _ in range(3):
+            await bucket.acquire()
+            status, body, retry = await self._call(
+                api_fetch, await self._token(), f"/vehicles/{v.vid}/containers/{container}")
+            if status != 429:
+                bucket.succeeded()
+                return body
+            self.stats["throttled"] += 1
+            bucket.throttled(retry or 5)
+        return THROTTLED
+
+    async def poll(self, v):
+        bodies = await asyncio.gather(*(self._fetch(v, c) for c in CONTAINERS))
+        if THROTTLED in bodies:
+            # Partial data says nothing about the vehicle; keep its interval and retry next round.
+            self.stats["skipped"] += 1
+            return
+        events = build_events(v.rvid, *(index_container(b) for b in bodies))
+        self.stats["polls"] += 1
+        if not events:
+            # Nothing back: probably asleep. Back off so we don't burn quota on it.
+            self.stats["empty"] += 1
+            v.interval = min(v.interval * 2, POLL_MAX)
+            return
+        reasons = []
+        kept = self.changes.filter(events, reasons)
+        sent = kept if CHANGES else events
+        if "moved" in reasons:
+            self.stats["changed"] += 1
+            v.interval = max(v.interval / 2, POLL_MIN)
+        else:
+            v.interval += (POLL_INTERVAL - v.interval) / 2
+        self.stats["events"] += len(sent)
+        emit_batch(sent, verbose=False)
+        ts = datetime.now().strftime("%H:%M:%S")
+        print(f"  [{ts}] {v.rvid:<12s} {len(sent)}/{len(events)} events queued  next ~{v.interval:.0f}s")
+
+    async def _vehicle_loop(self, v):
+        await asyncio.sleep(random.uniform(0, v.interval))  # spread the first round
+        while True:
+            try:
+                await self.poll(v)
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"  [{v.rvid}] ERROR: {e}")
+            await asyncio.sleep(v.interval * random.uniform(0.8, 1.2))
+
+    async def _report(self):
+        while True:
+            await asyncio.sleep(60)
+            intervals = sorted(v.interval for v in self.vehicles)
+            print(f"── fleet: {len(self.vehicles)} vehicles, " +
+                  ", ".join(f"{k} {n}" for k, n in self.stats.items()) +
+                  f", interval median {intervals[len(intervals) // 2]:.0f}s"
+                  f" (min {intervals[0]:.0f}s, max {intervals[-1]:.0f}s), API rate " +
+                  "/".join(f"{b.rate:.1f}" for b in self.buckets.values()) + "/s" +
+                  (f", {CHANGES.summary()}" if CHANGES else "") + " ──")
+
+    async def run(self):
+        await asyncio.gather(self._report(), *(self._vehicle_loop(v) for v in self.vehicles))
+
+
+def run_fleet(concurrency):
+    vids = VEHICLE_IDS
+    if not vids:
+        print("No MB_VEHICLE_IDS set. Discovering...")
+        vehicles = get_vehicles(load_token()["access_token"])
+        vids = [v.get("id", v.get("vin", "")) for v in vehicles if isinstance(v, dict)] \
+            if isinstance(vehicles, list) else []
+        if not vids:
+            sys.exit("No vehicles found.")
 
-    return n
+    print(f"\n{'='*60}")
+    print(f" MERCEDES → OHC RELAY (FLEET)")
+    print(f"{'='*60}")
+    print(f" Vehicles:  {len(vids)}")
+    print(f" API:       {MB_API_BASE}")
+    print(f" Target:    {NORTH_URL}/ingest")
+    print(f" Interval:  {POLL_INTERVAL}s (adaptive {POLL_MIN:.0f}–{POLL_MAX:.0f}s)")
+    print(f" Rate:      {API_RATE}/s per API, burst {API_BURST}")
+    print(f" Mode:      READ-ONLY {'(DRY RUN)' if DRY_RUN else ''}")
+    print(f"{'='*60}\n")
+    EMITTER.verbose = False  # per-vehicle lines are enough; the emitter still reports outages
+    try:
+        asyncio.run(Fleet(vids, concurrency).run())
+    except KeyboardInterrupt:
+        print("\n\nFleet relay stopped. 🚗")
 
 
 # ═══ MAIN ═══
@@ -318,12 +540,15 @@ def run():
 
 
 def main():
-    global DRY_RUN
+    global DRY_RUN, CHANGES
     p = argparse.ArgumentParser(description="Mercedes → OHC Relay")
     p.add_argument("--auth", action="store_true", help="OAuth2 flow")
     p.add_argument("--vehicles", action="store_true", help="List vehicles")
     p.add_argument("--status", action="store_true", help="One-shot status")
     p.add_argument("--dry-run", action="store_true", help="Don't POST")
+    p.add_argument("--fleet", action="store_true", help="Poll every vehicle (MB_VEHICLE_IDS or discovered)")
+    p.add_argument("--concurrency", type=int, default=16, help="Fleet mode: max in-flight HTTP calls")
+    p.add_argument("--all", action="store_true", help="Emit every reading, not just changes")
     a = p.parse_args()
 
     if a.auth:
@@ -340,6 +565,10 @@ def main():
         return
     if a.dry_run:
         DRY_RUN = True
+    if a.all:
+        CHANGES = None
+    if a.fleet:
+        run_fleet(a.concurrency); return
     run()
 
 if __name__ == "__main__":
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Mock Mercedes-Benz Connected Vehicle API
+Local stand-in for api.mercedes-benz.com/vehicledata/v2 so the relay's
+fleet mode can be exercised offline. Stdlib only.
+
+Serves:
+  GET /vehicledata/v2/vehicles
+  GET /vehicledata/v2/vehicles/<vin>/containers/{fuelstatus,payasyoudrive,vehiclelock,vehiclestatus}
+
+Each vehicle random-walks: some are parked (values frozen), some drive
+(fuel drains, odometer climbs), some are asleep (204 No Content, like the
+real API when a car hasn't reported). Each container API has its own
+rate limit and answers 429 + Retry-After when exceeded.
+
+Usage:
+  python mock_mb_api.py                          # 20 vehicles on :9191
+  python mock_mb_api.py --vehicles 500 --rate 50 --sleeping 0.3 --latency 80
+  MB_API_BASE=http://127.0.0.1:9191/vehicledata/v2 MB_ACCESS_TOKEN=mock \\
+      python mercedes_relay.py --fleet
+"""
+
+import json, time, random, argparse, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = "/vehicledata/v2"
+CONTAINERS = ("fuelstatus", "payasyoudrive", "vehiclelock", "vehiclestatus")
+
+
+class MockVehicle:
+    def __init__(self, n, sleeping, driving):
+        self.vin = f"W1NKMOCK{n:09d}"
+        self.sleeping = sleeping
+        self.driving = driving
+        self.fuel = random.uniform(30, 95)
+        self.odo = random.uniform(5000, 120000)
+        self.locked = not driving
+        self.tire = random.randint(220, 250)
+        self.lat, self.lon = 48.78 + random.uniform(-0.2, 0.2), 9.18 + random.uniform(-0.2, 0.2)
+        self.stamp = time.time()
+        self.lock = threading.Lock()
+
+    def advance(self):
+        """Catch the simulation up to now. Driving cars burn fuel and add km; cars occasionally start/stop."""
+        with self.lock:
+            now = time.time()
+            dt, self.stamp = now - self.stamp, now
+            if self.driving:
+                km = dt * random.uniform(0.005, 0.025)  # 18–90 km/h
+                self.odo += km
+                self.fuel = max(3.0, self.fuel - km * 0.012)
+                self.lat += random.uniform(-1, 1) * km * 0.001
+                self.lon += random.uniform(-1, 1) * km * 0.001
+            if random.random() < min(1.0, dt / 600):
+                self.driving = not self.driving
+                self.locked = not self.driving
+
+    def container(self, name):
+        ts = int(time.time() * 1000)
+        v = lambda value: {"value": str(value), "timestamp": ts}
+        if name == "fuelstatus":
+            return [{"tanklevelpercent": v(round(self.fuel))}, {"rangeliquid": v(round(self.fuel * 7.5))}]
+        if name == "payasyoudrive":
+            return [{"odo": v(round(self.odo))}, {"latitude": v(round(self.lat, 5))},
+                    {"longitude": v(round(self.lon, 5))}]
+        if name == "vehiclelock":
+            return [{"doorlockstatusvehicle": v(2 if self.locked else 0)}]
+        return [{"tirepressFrontLeft": v(self.tire)}]
+
+
+class RateLimiter:
+    def __init__(self, rate):
+        self.rate, self.tokens, self.stamp = rate, float(rate), time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        """Returns 0 if allowed, else seconds until a token is available."""
+        if self.rate <= 0:
+            return 0
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    vehicles = {}
+    limiters = {}
+    latency = 0.0
+    hits = {"200": 0, "204": 0, "429": 0, "401": 0, "404": 0}
+
+    def _send(self, status, body=None, headers=()):
+        Handler.hits[str(status)] = Handler.hits.get(str(status), 0) + 1
+        data = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        for k, val in headers:
+            self.send_header(k, val)
+        if data:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(random.uniform(0.5, 1.5) * self.latency)
+        if not self.headers.get("Authorization", "").startswith("Bearer "):
+            return self._send(401, {"error": "missing bearer token"})
+        parts = self.path.split("?", 1)[0][len(PREFIX):].strip("/").split("/")
+        if not self.path.startswith(PREFIX) or parts[0] != "vehicles":
+            return self._send(404, {"error": "not found"})
+        if len(parts) == 1:
+            return self._send(200, [{"id": vin} for vin in self.vehicles])
+        if len(parts) != 4 or parts[2] != "containers" or parts[3] not in CONTAINERS:
+            return self._send(404, {"error": "not found"})
+        vehicle = self.vehicles.get(parts[1])
+        if not vehicle:
+            return self._send(404, {"error": "unknown vehicle"})
+        wait = self.limiters[parts[3]].take()
+        if wait:
+            return self._send(429, {"error": "rate limit"}, [("Retry-After", str(max(1, round(wait))))])
+        if vehicle.sleeping:
+            return self._send(204)
+        vehicle.advance()
+        self._send(200, vehicle.container(parts[3]))
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    p = argparse.ArgumentParser(description="Mock Mercedes-Benz vehicle data API")
+    p.add_argument("--port", type=int, default=9191)
+    p.add_argument("--vehicles", type=int, default=20)
+    p.add_argument("--sleeping", type=float, default=0.2, help="Fraction of vehicles that return no data")
+    p.add_argument("--driving", type=float, default=0.3, help="Fraction of vehicles driving at start")
+    p.add_argument("--rate", type=float, default=10, help="Requests/s allowed per container API (0 = unlimited)")
+    p.add_argument("--latency", type=float, default=50, help="Mean response latency in ms")
+    p.add_argument("--seed", type=int, default=None)
+    a = p.parse_args()
+
+    random.seed(a.seed)
+    for n in range(a.vehicles):
+        v = MockVehicle(n, random.random() < a.sleeping, random.random() < a.driving)
+        Handler.vehicles[v.vin] = v
+    Handler.limiters = {c: RateLimiter(a.rate) for c in CONTAINERS}
+    Handler.latency = a.latency / 1000
+
+    server = ThreadingHTTPServer(("127.0.0.1", a.port), Handler)
+    server.daemon_threads = True
+    asleep = sum(v.sleeping for v in Handler.vehicles.values())
+    print(f"Mock MB API on http://127.0.0.1:{a.port}{PREFIX}")
+    print(f"  {a.vehicles} vehicles ({asleep} asleep), {a.rate}/s per API, ~{a.latency:.0f}ms latency")
+    print("  Ctrl+C to stop\n")
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        while True:
+            time.sleep(30)
+            print(f"[{time.strftime('%H:%M:%S')}] " + ", ".join(f"{k}: {n}" for k, n in Handler.hits.items()))
+    except KeyboardInterrupt:
+        server.shutdown()
+        print("\nStopped.")
+
+
+if __name__ == "__main__":
+    main()
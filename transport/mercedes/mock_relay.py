@@ -6,9 +6,15 @@ Generates fake vehicle events for demo purposes
 Usage:
   python mock_relay.py          # Send one batch of events
   python mock_relay.py --loop   # Keep sending events every 30s
+  python mock_relay.py --all    # Don't suppress readings that haven't changed (see changes.py)
+
+  # Soak test: thousands of simulated vehicles + phones across processes
+  python mock_relay.py --fleet --vehicles 5000 --phones 5000 --rate 500 --duration 120
+  python mock_relay.py --fleet --rate 2000 --batch 50 --procs 4
 """
 
-import sys, json, time, uuid, random, argparse
+import os, sys, json, time, random, argparse, threading
+import multiprocessing as mp
 from datetime import datetime, timezone
 
 try:
@@ -17,30 +23,23 @@ except ImportError:
     print("pip install requests --break-system-packages")
     sys.exit(1)
 
-NORTH_URL = "https://north-qr-demo-qa.apps.cluster-nlthm.nlthm.sandbox3528.opentlc.com"
+from emitter import Emitter
+from changes import ChangeFilter
+
+NORTH_URL = os.getenv("NORTH_URL", "https://north-qr-demo-qa.apps.cluster-nlthm.nlthm.sandbox3528.opentlc.com")
 VEHICLE_ID = "W1NK...2482"  # Redacted VIN
 
-def emit(event_type, data):
-    """Emit CloudEvent to OHC demo"""
-    now = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
-    event = {
-        "specversion": "1.0",
-        "type": f"ohc.demo.vehicle.{event_type}",
-        "source": "mercedes://mock-relay",
-        "id": f"mb-mock-{uuid.uuid4().hex[:8]}",
-        "time": now,
-        "eventclass": "vehicle",
-        "data": data,
-    }
-    try:
-        r = requests.post(f"{NORTH_URL}/ingest", json=event, timeout=10)
-        sym = "✓" if r.status_code == 200 else f"✗ {r.status_code}"
-    except Exception as e:
-        sym = f"✗ {e}"
+EMITTER = Emitter("mock_relay", NORTH_URL, source="mercedes://mock-relay", id_prefix="mb-mock")
+CHANGES = ChangeFilter()  # None (--all) emits every reading
 
+def emit(event_type, data):
+    """Queue a CloudEvent for the OHC demo (sent/spooled by the shared emitter)"""
     ts = datetime.now().strftime("%H:%M:%S")
-    print(f"  [{ts}] {event_type:.<30s} {sym}")
-    return r.status_code == 200 if 'r' in locals() else False
+    if CHANGES and not CHANGES.changed(event_type, data):
+        print(f"  [{ts}] {event_type:.<30s} unchanged")
+        return
+    EMITTER.emit(event_type, data)
+    print(f"  [{ts}] {event_type:.<30s} queued")
 
 def send_vehicle_events():
     """Send a batch of realistic vehicle events"""
@@ -95,10 +94,270 @@ def send_vehicle_events():
         "description": f"Battery: {battery_v}V"
     })
 
+# ═══ FLEET GENERATOR ═══
+# --fleet turns the one-car mock into a soak-test source. Worker processes
+# each own a shard of simulated vehicles and phones whose metrics random-walk
+# (fuel drains while driving and refills, the odometer only climbs, phone
+# batteries drain and recharge) on a clock sped up TIME_SCALE times. Each
+# sender thread owns a slice of its process's shard and paces itself
+# open-loop at its share of --rate; latency is measured from the scheduled
+# send time, so a slow north shows up as latency rather than a lower
+# offered rate. Workers report once a second to the parent, which prints
+# achieved rate and latency percentiles. Readings bypass the change filter
+# and the emitter: this is raw load.
+
+TIME_SCALE = 60  # one wall-clock second = one simulated minute
+PHONE_PROFILES = [
+    {"deviceClass": "phone", "os": "iOS", "browser": "Safari", "tier": "high", "cores": 6, "memoryGB": 6},
+    {"deviceClass": "phone", "os": "Android", "browser": "Chrome", "tier": "mid", "cores": 8, "memoryGB": 4},
+    {"deviceClass": "phone", "os": "Android", "browser": "Chrome", "tier": "low", "cores": 4, "memoryGB": 3},
+    {"deviceClass": "tablet", "os": "iOS", "browser": "Safari", "tier": "high", "cores": 8, "memoryGB": 8},
+    {"deviceClass": "desktop", "os": "macOS", "browser": "Chrome", "tier": "high", "cores": 8, "memoryGB": 16},
+]
+NETWORKS = ["4g", "4g", "4g", "3g", "wifi"]
+LANGS = ["en-US,en", "en-GB,en", "de-DE,de,en", "fr-FR,fr", "es-ES,es"]
+
+
+def sim_event(evt_type, source, eventclass, data, eid):
+    return {
+        "specversion": "1.0",
+        "type": f"ohc.demo.{evt_type}",
+        "source": source,
+        "id": eid,
+        "time": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
+        "eventclass": eventclass,
+        "data": data,
+    }
+
+
+class SimVehicle:
+    def __init__(self, rng, n):
+        self.name = f"W1NK...{n:06d}"
+        self.fuel = rng.uniform(20, 95)
+        self.odo = rng.uniform(5000, 150000)
+        self.driving = rng.random() < 0.3
+        self.tire = rng.uniform(225, 245)
+        self.volts = rng.uniform(12.4, 14.2)
+        self.t = time.monotonic()
+
+    def step(self, rng):
+        now = time.monotonic()
+        dt, self.t = (now - self.t) * TIME_SCALE, now
+        if self.driving:
+            km = dt * rng.uniform(20, 110) / 3600
+            self.odo += km
+            self.fuel -= km * 0.13
+            self.volts += (14.1 - self.volts) * 0.5
+        else:
+            self.volts += (12.5 - self.volts) * min(1.0, dt / 7200)
+        if self.fuel < 8:
+            self.fuel = rng.uniform(85, 100)  # gas station
+        if rng.random() < dt / 1800:  # trips and stops average ~30 simulated minutes
+            self.driving = not self.driving
+        self.tire = min(260, max(200, self.tire + rng.gauss(0, 0.3)))
+
+    def reading(self, rng):
+        self.step(rng)
+        v = self.name
+        kind = rng.choices(["fuel", "odometer", "lock_status", "tire_pressure", "battery", "location_ping"],
+                           [3, 3, 1, 1, 1, 1])[0]
+        if kind == "fuel":
+            pct, rng_km = round(self.fuel), round(self.fuel * 7.5)
+            data = {"vehicle": v, "fuel_pct": pct, "range_km": rng_km, "description": f"Fuel: {pct}% ({rng_km} km range)"}
+        elif kind == "odometer":
+            data = {"vehicle": v, "odometer_km": round(self.odo), "description": f"Odometer: {round(self.odo):,} km"}
+        elif kind == "lock_status":
+            locked = not self.driving
+            data = {"vehicle": v, "locked": locked, "description": f"Vehicle {'locked' if locked else 'UNLOCKED'}"}
+        elif kind == "tire_pressure":
+            data = {"vehicle": v, "front_left_kpa": round(self.tire), "description": f"Tire FL: {round(self.tire)} kPa"}
+        elif kind == "battery":
+            volts = round(self.volts, 1)
+            data = {"vehicle": v, "voltage": volts, "status": "healthy" if volts > 12.6 else "check",
+                    "description": f"Battery: {volts}V"}
+        else:
+            data = {"vehicle": v, "has_fix": True, "description": "Location updated (coords redacted)"}
+        return f"vehicle.{kind}", "mercedes://mock-fleet", "vehicle", data
+
+
+class SimPhone:
+    def __init__(self, rng, n):
+        self.profile = dict(rng.choice(PHONE_PROFILES), timezone="America/New_York",
+                            languages=rng.choice(LANGS), gpuRenderer="unavailable")
+        self.battery = rng.uniform(20, 100)
+        self.charging = False
+        self.network = rng.choice(NETWORKS)
+        self.t = time.monotonic()
+
+    def step(self, rng):
+        now = time.monotonic()
+        dt, self.t = (now - self.t) * TIME_SCALE, now
+        self.battery += dt * (0.02 if self.charging else -0.003)
+        if self.battery <= 15:
+            self.charging = True
+        elif self.battery >= 100:
+            self.battery, self.charging = 100, False
+        if rng.random() < dt / 900:
+            self.network = rng.choice(NETWORKS)
+
+    def reading(self, rng):
+        self.step(rng)
+        roll = rng.random()
+        if roll < 0.5:
+            return "telemetry.battery", "south/sim-phone", "telem", {
+                "metric": "battery", "batteryPct": round(self.battery), "charging": self.charging}
+        if roll < 0.8:
+            return "telemetry.network", "south/sim-phone", "telem", {
+                "metric": "network", "effectiveType": self.network,
+                "downlink": round(rng.uniform(0.5, 20), 1), "rtt": rng.choice([50, 100, 250])}
+        return "telemetry.device", "south/sim-phone", "telem", dict(self.profile, metric="device")
+
+
+def _sender(idx, tid, entities, rate, args, box, lock, stop):
+    """One paced sender thread: `rate` events/s from its own slice of entities."""
+    rng = random.Random(hash((args.seed, idx, tid)))
+    session = requests.Session()
+    per_request = max(1, args.batch)
+    interval = per_request / rate
+    url = f"{NORTH_URL}/ingest"
+    seq = 0
+    next_t = time.monotonic() + rng.uniform(0, interval)
+    while not stop.is_set():
+        delay = next_t - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        scheduled, next_t = next_t, next_t + interval
+        events = []
+        for _ in range(per_request):
+            seq += 1
+            evt_type, source, eventclass, data = rng.choice(entities).reading(rng)
+            events.append(sim_event(evt_type, source, eventclass, data, f"sim-{idx}-{tid}-{seq}"))
+        try:
+            r = session.post(url, json=events if args.batch else events[0], timeout=10)
+            status = r.status_code
+        except requests.RequestException:
+            status = "conn"
+        latency = time.monotonic() - scheduled
+        with lock:
+            c = box[0]
+            c["requests"] += 1
+            c["status"][status] = c["status"].get(status, 0) + 1
+            if status == 200:
+                c["events"] += len(events)
+            else:
+                c["errors"] += 1
+            if len(c["lat"]) < 5000:
+                c["lat"].append(latency)
+
+
+def fleet_worker(idx, args, stats_q, stop):
+    rng = random.Random(hash((args.seed, idx)))
+    shard = [SimVehicle(rng, n) for n in range(idx, args.vehicles, args.procs)]
+    shard += [SimPhone(rng, n) for n in range(idx, args.phones, args.procs)]
+    threads = min(args.concurrency, len(shard)) or 1
+    rate = args.rate / args.procs / threads
+    lock = threading.Lock()
+    fresh = lambda: {"events": 0, "requests": 0, "errors": 0, "status": {}, "lat": []}
+    box = [fresh()]  # senders add to box[0]; swapped out once a second
+    for tid in range(threads):
+        threading.Thread(target=_sender, args=(idx, tid, shard[tid::threads] or shard, rate, args,
+                                               box, lock, stop), daemon=True).start()
+    while not stop.wait(1.0):
+        with lock:
+            snapshot, box[0] = box[0], fresh()
+        stats_q.put(snapshot)
+    with lock:
+        stats_q.put(box[0])
+    stats_q.put(None)
+
+
+def _pct(sorted_vals, p):
+    return sorted_vals[min(len(sorted_vals) - 1, int(len(sorted_vals) * p))] * 1000 if sorted_vals else 0.0
+
+
+def run_fleet(args):
+    print(f"\n{'='*60}")
+    print(f" MOCK FLEET → OHC (SOAK TEST)")
+    print(f"{'='*60}")
+    print(f" Entities:  {args.vehicles} vehicles, {args.phones} phones")
+    print(f" Target:    {NORTH_URL}/ingest")
+    print(f" Rate:      {args.rate} events/s, {'batches of ' + str(args.batch) if args.batch else 'one event per request'}")
+    print(f" Workers:   {args.procs} processes × {args.concurrency} threads")
+    print(f" Duration:  {str(args.duration) + 's' if args.duration else 'until Ctrl+C'}")
+    print(f"{'='*60}\n")
+
+    stats_q, stop = mp.Queue(), mp.Event()
+    procs = [mp.Process(target=fleet_worker, args=(i, args, stats_q, stop), daemon=True)
+             for i in range(args.procs)]
+    for p in procs:
+        p.start()
+
+    t0 = last_print = time.monotonic()
+    window = {"events": 0, "requests": 0, "errors": 0, "status": {}, "lat": []}
+    total = {"events": 0, "requests": 0, "errors": 0, "status": {}, "lat": []}
+    running = len(procs)
+    try:
+        while running:
+            if args.duration and time.monotonic() - t0 >= args.duration:
+                stop.set()
+            try:
+                snap = stats_q.get(timeout=0.5)
+            except Exception:
+                continue
+            if snap is None:
+                running -= 1
+                continue
+            for agg in (window, total):
+                for k in ("events", "requests", "errors"):
+                    agg[k] += snap[k]
+                for k, n in snap["status"].items():
+                    agg["status"][k] = agg["status"].get(k, 0) + n
+                agg["lat"].extend(snap["lat"][:2000])
+            now = time.monotonic()
+            if now - last_print >= args.stats_every:
+                lat = sorted(window["lat"])
+                dt = now - last_print
+                print(f"[{time.strftime('%H:%M:%S')}] {window['events'] / dt:7.0f} ev/s (target {args.rate:.0f})"
+                      f"  {window['requests'] / dt:6.0f} req/s  latency p50 {_pct(lat, .5):6.1f}ms"
+                      f"  p95 {_pct(lat, .95):6.1f}ms  p99 {_pct(lat, .99):6.1f}ms"
+                      f"  errors {window['errors']}"
+                      + (f" {dict(window['status'])}" if window["errors"] else ""))
+                window = {"events": 0, "requests": 0, "errors": 0, "status": {}, "lat": []}
+                last_print = now
+    except KeyboardInterrupt:
+        stop.set()
+    for p in procs:
+        p.join(5)
+
+    elapsed = time.monotonic() - t0
+    lat = sorted(total["lat"])
+    print(f"\n── {total['events']} events in {total['requests']} requests over {elapsed:.0f}s: "
+          f"{total['events'] / elapsed:.0f} ev/s achieved (target {args.rate:.0f}), "
+          f"p50 {_pct(lat, .5):.1f}ms p95 {_pct(lat, .95):.1f}ms p99 {_pct(lat, .99):.1f}ms, "
+          f"{total['errors']} errors {dict(total['status'])} ──\n")
+
+
 def main():
     p = argparse.ArgumentParser(description="Mock Mercedes → OHC Relay")
     p.add_argument("--loop", action="store_true", help="Keep sending events every 30s")
+    p.add_argument("--all", action="store_true", help="Emit every reading, not just changes")
+    p.add_argument("--fleet", action="store_true", help="Soak-test generator: many vehicles + phones")
+    p.add_argument("--vehicles", type=int, default=1000, help="Fleet: simulated vehicles")
+    p.add_argument("--phones", type=int, default=1000, help="Fleet: simulated phones")
+    p.add_argument("--rate", type=float, default=200, help="Fleet: target events/s")
+    p.add_argument("--batch", type=int, default=0, help="Fleet: events per request as a JSON array (0 = one object per request)")
+    p.add_argument("--procs", type=int, default=os.cpu_count() or 1, help="Fleet: worker processes")
+    p.add_argument("--concurrency", type=int, default=8, help="Fleet: sender threads per process")
+    p.add_argument("--duration", type=float, default=0, help="Fleet: seconds to run (0 = until Ctrl+C)")
+    p.add_argument("--stats-every", type=float, default=5, help="Fleet: seconds between stats lines")
+    p.add_argument("--seed", type=int, default=0)
     args = p.parse_args()
+    global CHANGES
+    if args.all:
+        CHANGES = None
+    if args.fleet:
+        run_fleet(args)
+        return
 
     print(f"\n{'='*60}")
     print(f" MOCK MERCEDES → OHC RELAY")
@@ -116,12 +375,15 @@ def main():
                 cycle += 1
                 print(f"── Cycle #{cycle} ──")
                 send_vehicle_events()
+                if CHANGES:
+                    print(f"  {CHANGES.summary()}")
                 print()
                 time.sleep(30)
         except KeyboardInterrupt:
             print("\n\nMock relay stopped. 🚗")
     else:
         send_vehicle_events()
+        EMITTER.close()
         print(f"\n✓ Mock vehicle events sent to demo")
         print(f"   View at: {NORTH_URL}/dashboard\n")
 
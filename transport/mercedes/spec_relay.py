@@ -8,10 +8,26 @@ Usage:
   1. Copy .env.spec.example → .env.spec
   2. Add MB_API_KEY and MB_VIN
   3. python spec_relay.py
+  4. python spec_relay.py --vins VIN1,VIN2,...   (or --vin-file vins.txt, or MB_VINS=...)
+
+Spec data is static, so it's cached locally: .spec_cache/objects/<sha256>.json
+holds each distinct spec document once (content-addressed) and
+.spec_cache/index.json maps VIN → digest + fetch time. Entries younger than
+MB_SPEC_CACHE_TTL are served from the cache; --refresh ignores it.
+
+The API has been seen answering on three URL shapes. The first time, all
+three are probed concurrently; the one that answers is remembered in the
+index and tried first (alone) from then on.
+
+Specs are embedded in the CloudEvent. If MB_SPEC_REF_BASE is set to a URL
+where .spec_cache/objects/ is published (e.g. https://host/specs/), specs
+larger than MB_SPEC_INLINE_MAX bytes are relayed as a digest, size, summary
+of top-level fields and spec_ref = MB_SPEC_REF_BASE + <sha256>.json instead.
 """
 
-import os, sys, json, time, uuid
-from datetime import datetime, timezone
+import os, sys, json, time, hashlib, argparse, threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
 from pathlib import Path
 
 try:
@@ -21,16 +37,35 @@ except ImportError:
     print("pip install requests python-dotenv --break-system-packages")
     sys.exit(1)
 
+from emitter import Emitter
+
 load_dotenv(".env.spec")
 
 API_KEY = os.getenv("MB_API_KEY", "")
 VIN = os.getenv("MB_VIN", "")
+VINS = [v.strip() for v in os.getenv("MB_VINS", "").split(",") if v.strip()]
 NORTH_URL = os.getenv("NORTH_URL", "https://north-qr-demo-qa.apps.cluster-nlthm.nlthm.sandbox3528.opentlc.com")
 
 # Vehicle Specification API endpoint
-SPEC_API_BASE = "https://api.mercedes-benz.com/vehicle-specification/v1"
+SPEC_API_BASE = os.getenv("MB_SPEC_API_BASE", "https://api.mercedes-benz.com/vehicle-specification/v1")
+SPEC_SHAPES = ["/vehicles/{vin}", "/vehicles/{vin}/specification", "/specifications/{vin}"]
+
+CACHE_DIR = Path(os.getenv("MB_SPEC_CACHE_DIR", str(Path(__file__).parent / ".spec_cache")))
+CACHE_TTL = float(os.getenv("MB_SPEC_CACHE_TTL", str(7 * 24 * 3600)))
+INLINE_MAX = int(os.getenv("MB_SPEC_INLINE_MAX", "4096"))   # bytes of canonical JSON
+REF_BASE = os.getenv("MB_SPEC_REF_BASE", "")               # URL of a published objects/ dir; empty = always inline
+
+EMITTER = Emitter("spec_relay", NORTH_URL, source="mercedes://spec-relay", id_prefix="mb-spec")
+SESSION = requests.Session()
+SESSION.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=16))
+SESSION.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=16))
 
-def api_get(endpoint):
+
+def redact(vin):
+    return f"{vin[:8]}...{vin[-4:]}"
+
+
+def api_get(endpoint, quiet=False):
     """Call Vehicle Specification API with API Key"""
     headers = {
         "Authorization": f"Bearer {API_KEY}",
@@ -38,60 +73,202 @@ def api_get(endpoint):
     }
     try:
         url = f"{SPEC_API_BASE}{endpoint}"
-        print(f"  → GET {url}")
-        r = requests.get(url, headers=headers, timeout=15)
-        print(f"  ← {r.status_code}")
+        r = SESSION.get(url, headers=headers, timeout=15)
+        if not quiet:
+            print(f"  → GET {url} ← {r.status_code}")
         if r.status_code == 200:
             return r.json()
-        else:
-            print(f"  Error: {r.text}")
-            return None
+        if not quiet:
+            print(f"  Error: {r.text[:200]}")
+        return None
     except Exception as e:
         print(f"  API error: {e}")
         return None
 
 def emit(event_type, data):
-    """Emit CloudEvent to OHC demo"""
-    now = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
-    event = {
-        "specversion": "1.0",
-        "type": f"ohc.demo.vehicle.{event_type}",
-        "source": "mercedes://spec-relay",
-        "id": f"mb-spec-{uuid.uuid4().hex[:8]}",
-        "time": now,
-        "eventclass": "vehicle",
-        "data": data,
-    }
+    """Queue a CloudEvent for the OHC demo (sent/spooled by the shared emitter)"""
+    EMITTER.emit(event_type, data)
+    ts = datetime.now().strftime("%H:%M:%S")
+    print(f"  [{ts}] {event_type:.<30s} queued")
+
+
+# ═══ SPEC CACHE ═══
+
+class SpecCache:
+    """Content-addressed spec store with a VIN index. Safe to share between threads."""
+
+    def __init__(self, root):
+        self.root = root
+        self.objects = root / "objects"
+        self.index_file = root / "index.json"
+        self.lock = threading.Lock()
+        try:
+            self.index = json.loads(self.index_file.read_text())
+        except (FileNotFoundError, ValueError):
+            self.index = {}
+        self.index.setdefault("vins", {})
+
+    @staticmethod
+    def canonical(spec):
+        return json.dumps(spec, sort_keys=True, separators=(",", ":")).encode()
+
+    def get(self, vin, ttl=CACHE_TTL):
+        """(spec, sha256) if a fresh entry exists, else None."""
+        with self.lock:
+            entry = self.index["vins"].get(vin)
+        if not entry or time.time() - entry["fetched_at"] > ttl:
+            return None
+        try:
+            return json.loads((self.objects / f"{entry['sha256']}.json").read_bytes()), entry["sha256"]
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def put(self, vin, spec):
+        body = self.canonical(spec)
+        sha = hashlib.sha256(body).hexdigest()
+        path = self.objects / f"{sha}.json"
+        if not path.exists():  # identical specs (same model/options) are stored once
+            self.objects.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".tmp{threading.get_ident()}")
+            tmp.write_bytes(body)
+            os.replace(tmp, path)
+        with self.lock:
+            self.index["vins"][vin] = {"sha256": sha, "bytes": len(body), "fetched_at": time.time()}
+        return sha
+
+    @property
+    def shape(self):
+        return self.index.get("shape")
+
+    @shape.setter
+    def shape(self, value):
+        with self.lock:
+            self.index["shape"] = value
+
+    def save(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        with self.lock:
+            data = json.dumps(self.index, indent=2, sort_keys=True)
+        tmp = self.index_file.with_suffix(".tmp")
+        tmp.write_text(data)
+        os.replace(tmp, self.index_file)
+
+
+CACHE = SpecCache(CACHE_DIR)
+
+
+def probe_shapes(vin):
+    """Try every endpoint shape at once; returns (spec, shape) from the first that answers."""
+    # No `with`: leaving it would wait for the slower probes too.
+    pool = ThreadPoolExecutor(max_workers=len(SPEC_SHAPES))
+    futures = {pool.submit(api_get, shape.format(vin=vin), True): shape for shape in SPEC_SHAPES}
     try:
-        r = requests.post(f"{NORTH_URL}/ingest", json=event, timeout=10)
-        sym = "✓" if r.status_code == 200 else f"✗ {r.status_code}"
-    except Exception as e:
-        sym = f"✗ {e}"
+        for f in as_completed(futures):
+            spec = f.result()
+            if spec:
+                return spec, futures[f]
+        return None, None
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def get_vehicle_spec(vin, refresh=False):
+    """Get vehicle specifications by VIN: (spec, sha256, source) or (None, None, reason)."""
+    if not refresh:
+        hit = CACHE.get(vin)
+        if hit:
+            return hit[0], hit[1], "cache"
+
+    shape = CACHE.shape
+    spec = api_get(shape.format(vin=vin), True) if shape else None
+    if not spec:
+        spec, found = probe_shapes(vin)
+        if not spec:
+            return None, None, "no endpoint shape answered"
+        if found != shape:
+            print(f"  (spec endpoint shape: {found})")
+            CACHE.shape = found
+    return spec, CACHE.put(vin, spec), "api"
 
-    ts = datetime.now().strftime("%H:%M:%S")
-    print(f"  [{ts}] {event_type:.<30s} {sym}")
 
-def get_vehicle_spec(vin):
-    """Get vehicle specifications by VIN"""
-    # Try different endpoints
-    endpoints = [
-        f"/vehicles/{vin}",
-        f"/vehicles/{vin}/specification",
-        f"/specifications/{vin}"
-    ]
+def spec_event(vin, spec, sha):
+    """CloudEvent data: the spec inline if small or there's nowhere to refer to, else digest + size + summary + URL."""
+    size = len(SpecCache.canonical(spec))
+    data = {"vin": redact(vin), "spec_sha256": sha, "spec_bytes": size,
+            "description": f"Vehicle specification for {vin[:8]}..."}
+    if size <= INLINE_MAX or not REF_BASE:
+        data["spec"] = spec
+    else:
+        data["spec_ref"] = f"{REF_BASE.rstrip('/')}/{sha}.json"
+        if isinstance(spec, dict):
+            data["summary"] = {k: v for k, v in list(spec.items())[:40]
+                               if isinstance(v, (str, int, float, bool))}
+    return data
 
-    for endpoint in endpoints:
-        spec = api_get(endpoint)
-        if spec:
-            return spec
 
-    return None
+# ═══ MAIN ═══
+
+def run_batch(vins, workers, refresh):
+    print(f"\n{'='*60}")
+    print(f" MERCEDES VEHICLE SPEC → OHC RELAY (BATCH)")
+    print(f"{'='*60}")
+    print(f" VINs:      {len(vins)}")
+    print(f" Target:    {NORTH_URL}/ingest")
+    print(f" Cache:     {CACHE_DIR} (TTL {CACHE_TTL / 3600:.0f}h{', refreshing' if refresh else ''})")
+    print(f"{'='*60}\n")
+
+    # One VIN resolves the endpoint shape first so the rest don't all probe three URLs.
+    results = {}
+    first, rest = vins[0], vins[1:]
+    results[first] = get_vehicle_spec(first, refresh)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for vin, result in zip(rest, pool.map(lambda v: get_vehicle_spec(v, refresh), rest)):
+            results[vin] = result
+    CACHE.save()
+
+    counts = {"cache": 0, "api": 0, "failed": 0}
+    for vin in vins:
+        spec, sha, source = results[vin]
+        if spec is None:
+            counts["failed"] += 1
+            print(f"  ✗ {redact(vin)}  {source}")
+            continue
+        counts[source] += 1
+        data = spec_event(vin, spec, sha)
+        EMITTER.emit("specification", data)
+        print(f"  ✓ {redact(vin)}  {source:<5s} {sha[:12]}  {data['spec_bytes']:>7,d} B"
+              f"  {'inline' if 'spec' in data else 'by reference'}")
+
+    EMITTER.close()
+    print(f"\n✓ {counts['api'] + counts['cache']} specs relayed ({counts['cache']} from cache, "
+          f"{counts['api']} fetched), {counts['failed']} failed")
+    print(f"  {len(set(r[1] for r in results.values() if r[1]))} distinct spec documents\n")
+    if counts["failed"] == len(vins):
+        sys.exit(1)
+
 
 def run():
+    p = argparse.ArgumentParser(description="Mercedes vehicle specification → OHC relay")
+    p.add_argument("--vins", help="Comma-separated VINs (batch mode)")
+    p.add_argument("--vin-file", help="File with one VIN per line (batch mode)")
+    p.add_argument("--workers", type=int, default=8, help="Concurrent lookups in batch mode")
+    p.add_argument("--refresh", action="store_true", help="Ignore cached specs")
+    a = p.parse_args()
+
     if not API_KEY:
         print("ERROR: Set MB_API_KEY in .env.spec")
         sys.exit(1)
 
+    vins = list(VINS)
+    if a.vins:
+        vins += [v.strip() for v in a.vins.split(",") if v.strip()]
+    if a.vin_file:
+        vins += [l.strip() for l in Path(a.vin_file).read_text().splitlines()
+                 if l.strip() and not l.startswith("#")]
+    if vins:
+        run_batch(list(dict.fromkeys(vins)), a.workers, a.refresh)
+        return
+
     if not VIN:
         print("ERROR: Set MB_VIN (your vehicle VIN) in .env.spec")
         sys.exit(1)
@@ -106,23 +283,21 @@ def run():
 
     # Get vehicle spec
     print("Fetching vehicle specification...")
-    spec = get_vehicle_spec(VIN)
+    spec, sha, source = get_vehicle_spec(VIN, a.refresh)
+    CACHE.save()
 
     if not spec:
-        print("\n❌ Could not retrieve vehicle specification")
+        print(f"\n❌ Could not retrieve vehicle specification ({source})")
         print("   Check your VIN and API key")
         sys.exit(1)
 
-    print(f"\n✓ Got vehicle specification:")
+    print(f"\n✓ Got vehicle specification ({'cached' if source == 'cache' else 'fetched'}, sha256 {sha[:12]}):")
     print(json.dumps(spec, indent=2))
 
     # Emit spec as event
-    emit("specification", {
-        "vin": VIN[:8] + "..." + VIN[-4:],
-        "spec": spec,
-        "description": f"Vehicle specification for {VIN[:8]}..."
-    })
+    emit("specification", spec_event(VIN, spec, sha))
 
+    EMITTER.close()
     print(f"\n✓ Vehicle spec relayed to demo")
     print(f"\nNote: Vehicle Specification API provides static data, not live telemetry.")
     print(f"For live data (fuel, location, locks), you need Vehicle Status 1.5 Business (pending approval).\n")
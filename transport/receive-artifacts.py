@@ -1,11 +1,56 @@
 #!/usr/bin/env python3
+"""
+Fetch an artifact set (manifest.json + files) into a directory.
+
+Up to --jobs files download at once. Each is hashed as it is written, into
+<name>.part, and renamed into place only once the digest matches, so the
+output directory never holds a partial file. Files already present with the
+right digest are skipped; a .part left by an interrupted run is resumed
+with an HTTP Range request.
+
+Manifest values are either the sha256 string or {"sha256": ..., "size": ...}.
+
+Entries that also list "chunks" ([[sha256, length], ...], see cdc.py) are
+rebuilt from a local chunk store (ARTIFACT_CHUNKS, default
+<output-dir>/.chunks): the previous version of the file is split into the
+store first, and only chunks still missing are fetched from
+<base-url>/chunks/<sha256>. The store is pruned to the current manifest
+afterwards.
+
+Entries with "encoding" (+ "encoded_sha256", "encoded_size") were uploaded
+compressed. If this side can decode it, the compressed form is fetched
+from <base-url>/<name>?encoding=<encoding>, verified against
+encoded_sha256, then decoded into place and verified against sha256.
+Otherwise, or if the server only has the plain file or the compressed copy
+doesn't decode, <base-url>/<name> is used as before.
+"""
+import argparse
 import hashlib
 import json
 import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 import requests
 
+import cdc
+import compress
+
+BLOCK = 1024 * 1024
+RETRIES = int(os.environ.get("ARTIFACT_RETRIES", "5"))
+
+
+class Unsupported(Exception):
+    """Server can't serve this form of the file (chunks, an encoding); fetch the plain file instead."""
+
+
+class Failed(Exception):
+    def __init__(self, code: int, msg: str):
+        super().__init__(msg)
+        self.code = code
+
+
 def sha256_file(path: Path) -> str:
     h = hashlib.sha256()
     with path.open("rb") as f:
@@ -13,18 +58,180 @@ def sha256_file(path: Path) -> str:
             h.update(block)
     return h.hexdigest()
 
+
+def hash_existing(path: Path, h) -> int:
+    """Feed a partial download into h; returns its size."""
+    n = 0
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(BLOCK), b""):
+            h.update(block)
+            n += len(block)
+    return n
+
+
+def up_to_date(target: Path, digest: str, size) -> bool:
+    return target.is_file() and (size is None or target.stat().st_size == size) and sha256_file(target) == digest
+
+
+def get_with_retries(session, url: str) -> bytes:
+    for attempt in range(RETRIES + 1):
+        try:
+            r = session.get(url, timeout=(10, 60))
+            if r.status_code in (404, 405):
+                raise Unsupported()
+            r.raise_for_status()
+            return r.content
+        except requests.RequestException as e:
+            if attempt == RETRIES or (isinstance(e, requests.HTTPError) and e.response.status_code < 500):
+                raise Failed(6, f"Fetch failed for {url}: {e}")
+            time.sleep(min(30, 2 ** (attempt + 1)))
+
+
+def fetch_delta(session, base_url: str, target: Path, entry: dict, store: cdc.ChunkStore):
+    """Rebuild target from chunks; returns ("skipped" | "fetched", bytes downloaded)."""
+    digest = entry["sha256"]
+    if up_to_date(target, digest, entry.get("size")):
+        return "skipped", 0
+    if target.is_file():
+        # The previous version shares most of its chunks with the new one.
+        with target.open("rb") as f:
+            for _, data in cdc.split(f):
+                store.put(data)
+    downloaded = 0
+    for sha, _ in entry["chunks"]:
+        if not store.has(sha):
+            data = get_with_retries(session, f"{base_url}/chunks/{sha}")
+            try:
+                store.put(data, sha)
+            except ValueError as e:
+                raise Failed(5, f"Chunk for {target.name}: {e}")
+            downloaded += len(data)
+
+    part = target.with_name(target.name + ".part")
+    target.parent.mkdir(parents=True, exist_ok=True)
+    h = hashlib.sha256()
+    with part.open("wb") as f:
+        for sha, _ in entry["chunks"]:
+            data = store.get(sha)
+            f.write(data)
+            h.update(data)
+    actual = h.hexdigest()
+    if actual != digest:
+        part.unlink(missing_ok=True)
+        raise Failed(5, f"Hash mismatch for {target.name}: expected {digest}, got {actual}")
+    os.replace(part, target)
+    return "fetched", downloaded
+
+
+def fetch(session, url: str, target: Path, digest: str, size, optional: bool = False) -> str:
+    """Download url to target via target.part; returns "skipped" or "fetched".
+
+    With optional, a 404/406 raises Unsupported instead of failing. A
+    resumed .part that doesn't verify (left from an older version of the
+    file) is discarded and downloaded once more from the start.
+    """
+    if up_to_date(target, digest, size):
+        return "skipped"
+    part = target.with_name(target.name + ".part")
+    target.parent.mkdir(parents=True, exist_ok=True)
+    for fresh in (False, True):
+        if fresh:
+            part.unlink(missing_ok=True)
+        resumed = part.exists()
+        h = _download(session, url, part, size, optional)
+        actual = h.hexdigest()
+        if actual == digest:
+            os.replace(part, target)
+            return "fetched"
+        part.unlink(missing_ok=True)
+        if not resumed:
+            break
+    raise Failed(5, f"Hash mismatch for {target.name}: expected {digest}, got {actual}")
+
+
+def _download(session, url: str, part: Path, size, optional: bool):
+    """Bring part up to date with url, resuming what's there; returns its sha256 object."""
+    failures = 0
+    while True:
+        h = hashlib.sha256()
+        have = hash_existing(part, h) if part.exists() else 0
+        try:
+            if size is not None and have >= size:
+                return h  # everything arrived last time; just verify
+            headers = {"Range": f"bytes={have}-"} if have else {}
+            with session.get(url, headers=headers, stream=True, timeout=(10, 60)) as r:
+                if r.status_code == 416:
+                    return h
+                if optional and r.status_code in (404, 406):
+                    raise Unsupported()
+                r.raise_for_status()
+                mode = "ab"
+                if r.status_code != 206 and have:
+                    h, mode = hashlib.sha256(), "wb"  # server ignored the range: start over
+                with part.open(mode) as f:
+                    for block in r.iter_content(chunk_size=BLOCK):
+                        f.write(block)
+                        h.update(block)
+            return h
+        except requests.RequestException as e:
+            failures += 1
+            if failures > RETRIES or (isinstance(e, requests.HTTPError) and e.response.status_code < 500):
+                raise Failed(6, f"Fetch failed for {url}: {e}")
+            time.sleep(min(30, 2 ** failures))
+
+
+def fetch_encoded(session, url: str, target: Path, entry: dict):
+    """Download the compressed form (verified, resumable), then decode it into place."""
+    if up_to_date(target, entry["sha256"], entry.get("size")):
+        return "skipped", 0
+    encoding = entry["encoding"]
+    encoded = target.with_name(f".{target.name}.{encoding}")
+    fetch(session, f"{url}?encoding={encoding}", encoded, entry["encoded_sha256"], entry.get("encoded_size"),
+          optional=True)
+    part = target.with_name(target.name + ".part")
+    h = hashlib.sha256()
+    d = compress.decompressor(encoding)
+    try:
+        with encoded.open("rb") as src, part.open("wb") as f:
+            for block in iter(lambda: src.read(BLOCK), b""):
+                data = d.decompress(block)
+                f.write(data)
+                h.update(data)
+            data = d.flush()
+            f.write(data)
+            h.update(data)
+    except compress.DECODE_ERRORS as e:
+        part.unlink(missing_ok=True)
+        print(f"Can't decode {encoding} copy of {target.name} ({e}); fetching it uncompressed", file=sys.stderr)
+        raise Unsupported()
+    finally:
+        encoded.unlink(missing_ok=True)
+    actual = h.hexdigest()
+    if actual != entry["sha256"]:
+        part.unlink(missing_ok=True)
+        raise Failed(5, f"Hash mismatch for {target.name} after decoding: expected {entry['sha256']}, got {actual}")
+    os.replace(part, target)
+    return "fetched", entry.get("encoded_size") or 0
+
+
 def main():
-    if len(sys.argv) != 3:
-        print("Usage: receive-artifacts.py <base-url> <output-dir>", file=sys.stderr)
-        sys.exit(2)
-    base_url = sys.argv[1].rstrip("/")
-    out_root = Path(sys.argv[2]).resolve()
+    ap = argparse.ArgumentParser(usage="receive-artifacts.py [--jobs N] <base-url> <output-dir>")
+    ap.add_argument("base_url")
+    ap.add_argument("out_dir")
+    ap.add_argument("--jobs", type=int, default=int(os.environ.get("ARTIFACT_JOBS", "4")),
+                    help="files downloaded at once")
+    args = ap.parse_args()
+    base_url = args.base_url.rstrip("/")
+    out_root = Path(args.out_dir).resolve()
     if not out_root.is_dir():
         print(f"Output not a directory: {out_root}", file=sys.stderr)
         sys.exit(1)
     manifest_url = f"{base_url}/manifest.json"
+    session = requests.Session()
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=args.jobs))
+    session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=args.jobs))
     try:
-        r = requests.get(manifest_url, timeout=30)
+        r = session.get(manifest_url, timeout=30)
         r.raise_for_status()
         manifest = r.json()
     except (requests.RequestException, json.JSONDecodeError, ValueError) as e:
@@ -33,28 +240,59 @@ def main():
     if not isinstance(manifest, dict):
         print("Manifest is not a dict", file=sys.stderr)
         sys.exit(4)
-    for rel, expected_digest in manifest.items():
-        file_url = f"{base_url}/{rel}"
-        target_path = out_root / rel
-        try:
-            r = requests.get(file_url, timeout=30, stream=True)
-            r.raise_for_status()
-            target_path.parent.mkdir(parents=True, exist_ok=True)
-            with target_path.open("wb") as f:
-                for chunk in r.iter_content(chunk_size=65536):
-                    if chunk:
-                        f.write(chunk)
-            actual_digest = sha256_file(target_path)
-            if actual_digest != expected_digest:
-                print(f"Hash mismatch for {rel}: expected {expected_digest}, got {actual_digest}", file=sys.stderr)
-                target_path.unlink(missing_ok=True)
-                sys.exit(5)
-        except requests.RequestException as e:
-            print(f"Fetch failed for {rel}: {e}", file=sys.stderr)
-            sys.exit(6)
-        except OSError as e:
-            print(f"Write/OS error for {rel}: {e}", file=sys.stderr)
-            sys.exit(7)
+
+    jobs = {}
+    for rel, entry in manifest.items():
+        target = (out_root / rel).resolve()
+        if out_root not in target.parents:
+            print(f"Manifest path escapes output dir: {rel}", file=sys.stderr)
+            sys.exit(4)
+        if isinstance(entry, str):
+            entry = {"sha256": entry}
+        if not isinstance(entry, dict) or "sha256" not in entry:
+            print(f"Bad manifest entry for {rel}", file=sys.stderr)
+            sys.exit(4)
+        jobs[rel] = (target, entry)
+
+    store = cdc.ChunkStore(os.environ.get("ARTIFACT_CHUNKS", out_root / ".chunks"))
+    stats = {"fetched": 0, "skipped": 0, "downloaded": 0, "total": 0}
+
+    def run(rel, target, entry):
+        if entry.get("chunks"):
+            try:
+                return fetch_delta(session, base_url, target, entry, store)
+            except Unsupported:
+                pass
+        if entry.get("encoding") in compress.available() and entry.get("encoded_sha256"):
+            try:
+                return fetch_encoded(session, f"{base_url}/{rel}", target, entry)
+            except Unsupported:
+                pass
+        result = fetch(session, f"{base_url}/{rel}", target, entry["sha256"], entry.get("size"))
+        return result, target.stat().st_size
+
+    pool = ThreadPoolExecutor(max_workers=args.jobs)
+    futures = {pool.submit(run, rel, *job): rel for rel, job in jobs.items()}
+    try:
+        for f in as_completed(futures):
+            result, downloaded = f.result()
+            stats[result] += 1
+            if result == "fetched":
+                stats["downloaded"] += downloaded
+            stats["total"] += jobs[futures[f]][0].stat().st_size
+    except Failed as e:
+        pool.shutdown(wait=True, cancel_futures=True)
+        print(e, file=sys.stderr)
+        sys.exit(e.code)
+    except OSError as e:
+        pool.shutdown(wait=True, cancel_futures=True)
+        print(f"Write/OS error for {futures[f]}: {e}", file=sys.stderr)
+        sys.exit(7)
+    pool.shutdown()
+    if any(entry.get("chunks") for _, entry in jobs.values()):
+        store.prune({sha for _, entry in jobs.values() for sha, _ in entry.get("chunks", ())})
+    print(f"downloaded {stats['downloaded']:,} bytes for {stats['total']:,}", file=sys.stderr)
+    print(f"{stats['fetched']} fetched, {stats['skipped']} already up to date", file=sys.stderr)
     sys.exit(0)
 
 if __name__ == "__main__":
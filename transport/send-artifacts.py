@@ -1,11 +1,115 @@
 #!/usr/bin/env python3
+"""
+Upload an artifact set to a receiver, streaming.
+
+Each file is hashed while it is sent (one pass over the data), at most
+--jobs files are open at once, and files go up in parts of
+ARTIFACT_PART_MB so an interrupted transfer resumes from the last byte the
+receiver has, including across runs (upload ids are kept in ARTIFACT_STATE).
+manifest.json ({name: sha256}) is sent last, once every file has been
+accepted, so a receiver never publishes a half-uploaded set.
+
+Protocol, relative to <target-url>:
+  POST /uploads {"name", "size"}            → {"id"}
+  PUT  /uploads/<id>?offset=N  <bytes>      → {"offset"}   (409 + {"offset"} if N is wrong)
+  GET  /uploads/<id>                        → {"offset"}
+  POST /uploads/<id>/complete {"sha256"}    → 409 if the digest doesn't match
+  PUT  /manifest.json
+Receivers without /uploads get the old single multipart POST.
+ARTIFACT_TOKEN, if set, is sent as a bearer token (north's /artifacts/<set>
+takes uploads only with the token it was configured with).
+
+--delta (for sets that change by a few bytes between pushes): files are
+split into content-defined chunks (cdc.py), the receiver is asked which
+chunk digests it lacks, and only those are sent. Manifest entries then
+carry {"sha256", "size", "chunks": [[sha256, length], ...]}. Chunk lists
+of unchanged files are cached in ARTIFACT_CHUNKS, so they aren't re-read.
+  GET  /capabilities                        → {"delta": true, "encodings": [...]}
+  POST /chunks/missing {"chunks": [...]}    → {"missing": [...]}
+  PUT  /chunks/<sha256>  <bytes>
+
+--compress (default auto, or ARTIFACT_COMPRESS): whole-file uploads are
+compressed per file with the best encoding both sides support (zstd, else
+gzip), skipping already-compressed formats and files a sampled test shows
+won't shrink (compress.py). The upload is opened with {"encoding"}, parts
+carry the encoded stream, and the manifest entry records both digests:
+{"sha256", "size", "encoding", "encoded_sha256", "encoded_size"}.
+"""
+import argparse
 import hashlib
 import json
 import os
 import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import requests
 
+import cdc
+import compress
+
+PART_SIZE = int(float(os.environ.get("ARTIFACT_PART_MB", "64")) * 1024 * 1024)
+BLOCK = 1024 * 1024
+RETRIES = int(os.environ.get("ARTIFACT_RETRIES", "5"))
+STATE_FILE = Path(os.environ.get("ARTIFACT_STATE", Path.home() / ".cache" / "ohc" / "send-artifacts.json"))
+CHUNK_DIR = Path(os.environ.get("ARTIFACT_CHUNKS", Path.home() / ".cache" / "ohc" / "chunks"))
+TOKEN = os.environ.get("ARTIFACT_TOKEN", "")
+AUTH = {"Authorization": f"Bearer {TOKEN}"} if TOKEN else {}
+
+
+class Legacy(Exception):
+    """Receiver has no /uploads endpoint."""
+
+
+class UploadState:
+    """Upload ids of unfinished files, so a rerun can resume them."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.lock = threading.Lock()
+        try:
+            self.data = json.loads(path.read_text())
+        except (OSError, ValueError):
+            self.data = {}
+
+    def get(self, key):
+        with self.lock:
+            return self.data.get(key)
+
+    def set(self, key, value):
+        with self.lock:
+            if value is None:
+                self.data.pop(key, None)
+            else:
+                self.data[key] = value
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = self.path.with_suffix(".tmp")
+                tmp.write_text(json.dumps(self.data))
+                os.replace(tmp, self.path)
+            except OSError:
+                pass  # resuming across runs is best effort
+
+
+class HashingReader:
+    """File-like view of f[start:end] that feeds every byte read into h."""
+
+    def __init__(self, f, start: int, end: int, h):
+        f.seek(start)
+        self.f, self.left, self.h = f, end - start, h
+
+    def __len__(self):
+        return self.left
+
+    def read(self, n=-1):
+        n = self.left if n is None or n < 0 else min(n, self.left)
+        block = self.f.read(n)
+        self.left -= len(block)
+        self.h.update(block)
+        return block
+
+
 def sha256_file(path: Path) -> str:
     h = hashlib.sha256()
     with path.open("rb") as f:
@@ -13,25 +117,297 @@ def sha256_file(path: Path) -> str:
             h.update(block)
     return h.hexdigest()
 
-def main():
-    if len(sys.argv) < 3:
-        print("Usage: send-artifacts.py <target-url> <file1> [<file2> ...]", file=sys.stderr)
-        sys.exit(2)
-    url = sys.argv[1]
-    files = [Path(f) for f in sys.argv[2:]]
+
+def hash_range(f, start: int, end: int, h):
+    f.seek(start)
+    while start < end:
+        block = f.read(min(BLOCK, end - start))
+        if not block:
+            raise OSError("file shrank during upload")
+        h.update(block)
+        start += len(block)
+
+
+def server_offset(session, url: str):
+    r = session.get(url, timeout=30)
+    if r.status_code == 404:
+        return None
+    r.raise_for_status()
+    return int(r.json()["offset"])
+
+
+def open_upload(session, base: str, state: UploadState, key: str, meta: dict):
+    """(upload url, bytes the receiver already has), resuming an earlier upload of the same file if possible."""
+    upload_id, offset = state.get(key), 0
+    if upload_id:
+        offset = server_offset(session, f"{base}/uploads/{upload_id}")
+        if offset is None:
+            upload_id, offset = None, 0
+    if not upload_id:
+        r = session.post(f"{base}/uploads", json=meta, timeout=30)
+        if r.status_code in (404, 405):
+            raise Legacy()
+        r.raise_for_status()
+        upload_id = r.json()["id"]
+        state.set(key, upload_id)
+    return f"{base}/uploads/{upload_id}", offset
+
+
+def upload(session, base: str, path: Path, state: UploadState) -> str:
+    st = path.stat()
+    key = f"{base}|{path.resolve()}|{st.st_size}|{st.st_mtime_ns}"
+    url, offset = open_upload(session, base, state, key, {"name": path.name, "size": st.st_size})
+
+    h = hashlib.sha256()
+    failures = 0
+    with path.open("rb") as f:
+        hash_range(f, 0, offset, h)  # already on the receiver from an earlier run
+        while offset < st.st_size:
+            end = min(st.st_size, offset + PART_SIZE)
+            mark = h.copy()
+            try:
+                r = session.put(url, params={"offset": offset}, data=HashingReader(f, offset, end, h),
+                                headers={"Content-Type": "application/octet-stream"}, timeout=(10, 120))
+                r.raise_for_status()
+                offset, failures = end, 0
+            except requests.RequestException:
+                failures += 1
+                if failures > RETRIES:
+                    raise
+                time.sleep(min(30, 2 ** failures))
+                got = server_offset(session, url)
+                if got is None:
+                    raise
+                # Pick the hash back up at whatever the receiver actually has.
+                if got >= offset:
+                    h = mark
+                    hash_range(f, offset, got, h)
+                else:
+                    h = hashlib.sha256()
+                    hash_range(f, 0, got, h)
+                offset = got
+
+    digest = h.hexdigest()
+    r = session.post(f"{url}/complete", json={"sha256": digest}, timeout=120)
+    r.raise_for_status()
+    state.set(key, None)
+    return digest
+
+
+class EncodingReader:
+    """The compressed stream of a file, produced as it is read; hashes raw and encoded bytes."""
+
+    def __init__(self, path: Path, encoding: str, level: int):
+        self.f = path.open("rb")
+        self.c = compress.compressor(encoding, level)
+        self.raw, self.encoded = hashlib.sha256(), hashlib.sha256()
+        self.buf, self.pos, self.eof = b"", 0, False
+
+    def _fill(self, n: int):
+        while len(self.buf) < n and not self.eof:
+            block = self.f.read(BLOCK)
+            self.raw.update(block)
+            if block:
+                self.buf += self.c.compress(block)
+            else:
+                self.buf += self.c.flush()
+                self.eof = True
+
+    def read(self, n: int) -> bytes:
+        self._fill(n)
+        out, self.buf = self.buf[:n], self.buf[n:]
+        self.encoded.update(out)
+        self.pos += len(out)
+        return out
+
+    @property
+    def done(self) -> bool:
+        self._fill(1)
+        return not self.buf
+
+    def part(self, size: int):
+        """Generator over the next size encoded bytes (sent chunked: the length isn't known up front)."""
+        left = size
+        while left:
+            block = self.read(min(BLOCK, left))
+            if not block:
+                return
+            left -= len(block)
+            yield block
+
+    def close(self):
+        self.f.close()
+
+
+def upload_encoded(session, base: str, path: Path, state: UploadState, encoding: str, level: int) -> dict:
+    """Upload path compressed; offsets and parts refer to the encoded stream."""
+    st = path.stat()
+    key = f"{base}|{path.resolve()}|{st.st_size}|{st.st_mtime_ns}|{encoding}:{level}"
+    url, offset = open_upload(session, base, state, key,
+                              {"name": path.name, "size": st.st_size, "encoding": encoding})
+    failures = 0
+    while True:
+        # Compression is deterministic, so resuming means re-encoding up to the
+        # receiver's offset locally and sending from there.
+        stream = EncodingReader(path, encoding, level)
+        try:
+            while stream.pos < offset:
+                if not stream.read(min(BLOCK, offset - stream.pos)):
+                    raise OSError(f"{path} changed during upload")
+            while not stream.done:
+                r = session.put(url, params={"offset": offset}, data=stream.part(PART_SIZE),
+                                headers={"Content-Type": "application/octet-stream"}, timeout=(10, 120))
+                r.raise_for_status()
+                offset, failures = stream.pos, 0
+            break
+        except requests.RequestException:
+            failures += 1
+            if failures > RETRIES:
+                raise
+            time.sleep(min(30, 2 ** failures))
+            offset = server_offset(session, url)
+            if offset is None:
+                raise
+        finally:
+            stream.close()
+
+    entry = {"sha256": stream.raw.hexdigest(), "size": st.st_size, "encoding": encoding,
+             "encoded_sha256": stream.encoded.hexdigest(), "encoded_size": stream.pos}
+    r = session.post(f"{url}/complete", json=entry, timeout=120)
+    r.raise_for_status()
+    state.set(key, None)
+    return entry
+
+
+def with_retries(call):
+    for attempt in range(RETRIES + 1):
+        try:
+            r = call()
+            if r.status_code < 500:
+                r.raise_for_status()
+                return r
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == RETRIES:
+                raise
+        time.sleep(min(30, 2 ** (attempt + 1)))
+    r.raise_for_status()
+
+
+def capabilities(session, base: str) -> dict:
+    try:
+        r = session.get(f"{base}/capabilities", timeout=30)
+        return r.json() if r.status_code == 200 else {}
+    except (requests.RequestException, ValueError):
+        return {}
+
+
+def upload_delta(session, base: str, path: Path, store: cdc.ChunkStore):
+    """Send the chunks of path the receiver lacks; returns (manifest entry, bytes sent)."""
+    digest, chunks = store.recipe(path)
+    wanted = list(dict.fromkeys(c[0] for c in chunks))
+    r = with_retries(lambda: session.post(f"{base}/chunks/missing", json={"chunks": wanted}, timeout=60))
+    missing = set(r.json()["missing"])
+    sent = 0
+    with path.open("rb") as f:
+        for sha, offset, length in chunks:
+            if sha not in missing:
+                continue
+            f.seek(offset)
+            data = f.read(length)
+            if hashlib.sha256(data).hexdigest() != sha:
+                raise OSError(f"{path} changed during upload")
+            with_retries(lambda: session.put(f"{base}/chunks/{sha}", data=data,
+                                             headers={"Content-Type": "application/octet-stream"},
+                                             timeout=(10, 120)))
+            missing.discard(sha)
+            sent += length
+    size = sum(c[2] for c in chunks)
+    return {"sha256": digest, "size": size, "chunks": [[sha, length] for sha, _, length in chunks]}, sent
+
+
+def send_legacy(url: str, files):
     manifest = {}
     payload = {}
     try:
         for p in files:
-            if not p.is_file():
-                print(f"Not a file: {p}", file=sys.stderr)
-                sys.exit(1)
-            digest = sha256_file(p)
-            manifest[p.name] = digest
+            manifest[p.name] = sha256_file(p)
             payload[p.name] = p.open("rb")
         payload["manifest.json"] = json.dumps(manifest, sort_keys=True).encode("utf-8")
-        r = requests.post(url, files=payload, timeout=30)
+        r = requests.post(url, files=payload, headers=AUTH, timeout=30)
+        r.raise_for_status()
+    finally:
+        for f in payload.values():
+            if hasattr(f, "close"):
+                f.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(usage="send-artifacts.py [--jobs N] [--delta] [--compress MODE] <target-url> <file1> [<file2> ...]")
+    ap.add_argument("url")
+    ap.add_argument("files", nargs="+", type=Path)
+    ap.add_argument("--jobs", type=int, default=int(os.environ.get("ARTIFACT_JOBS", "4")),
+                    help="files uploaded (and open) at once")
+    ap.add_argument("--delta", action="store_true", help="send only the chunks the receiver lacks")
+    ap.add_argument("--compress", choices=["auto", "zstd", "gzip", "none"],
+                    default=os.environ.get("ARTIFACT_COMPRESS", "auto"),
+                    help="per-file compression of whole-file uploads (auto: best both sides support)")
+    args = ap.parse_args()
+    base = args.url.rstrip("/")
+    files = args.files
+    for p in files:
+        if not p.is_file():
+            print(f"Not a file: {p}", file=sys.stderr)
+            sys.exit(1)
+    if len({p.name for p in files}) != len(files):
+        print("Duplicate file names in artifact set", file=sys.stderr)
+        sys.exit(1)
+
+    session = requests.Session()
+    session.headers.update(AUTH)
+    session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=args.jobs))
+    session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=args.jobs))
+    state = UploadState(STATE_FILE)
+    caps = capabilities(session, base)
+    delta = args.delta
+    if delta and not caps.get("delta"):
+        print("Receiver doesn't support delta transfers; sending whole files", file=sys.stderr)
+        delta = False
+    accepted = caps.get("encodings", []) if args.compress == "auto" else [args.compress]
+    if args.compress not in ("auto", "none") and args.compress not in caps.get("encodings", []):
+        print(f"Receiver doesn't accept {args.compress}; sending uncompressed", file=sys.stderr)
+        accepted = []
+
+    def send_file(p):
+        choice = compress.choose(p, accepted)
+        if choice:
+            return upload_encoded(session, base, p, state, *choice)
+        return upload(session, base, p, state)
+    try:
+        with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+            if delta:
+                store = cdc.ChunkStore(CHUNK_DIR)
+                results = list(pool.map(lambda p: upload_delta(session, base, p, store), files))
+                digests = [entry for entry, _ in results]
+                total, sent = sum(e["size"] for e in digests), sum(n for _, n in results)
+                print(f"delta: sent {sent:,} of {total:,} bytes", file=sys.stderr)
+            else:
+                digests = list(pool.map(send_file, files))
+                encoded = [d for d in digests if isinstance(d, dict)]
+                if encoded:
+                    raw, wire = sum(d["size"] for d in encoded), sum(d["encoded_size"] for d in encoded)
+                    print(f"compressed {len(encoded)} of {len(files)} files: {raw:,} → {wire:,} bytes",
+                          file=sys.stderr)
+        manifest = {p.name: d for p, d in zip(files, digests)}
+        r = session.put(f"{base}/manifest.json", data=json.dumps(manifest, sort_keys=True).encode("utf-8"),
+                        headers={"Content-Type": "application/json"}, timeout=30)
         r.raise_for_status()
+    except Legacy:
+        print("Receiver has no /uploads endpoint; sending one multipart POST", file=sys.stderr)
+        try:
+            send_legacy(args.url, files)
+        except (requests.RequestException, OSError) as e:
+            print(f"Transport failed: {e}", file=sys.stderr)
+            sys.exit(3)
     except (requests.RequestException, OSError) as e:
         print(f"Transport failed: {e}", file=sys.stderr)
         sys.exit(3)